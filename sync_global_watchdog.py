@@ -1,4 +1,5 @@
 from tapiriik.database import db, close_connections
+from tapiriik.sync.lease import SyncLease
 from datetime import datetime, timedelta
 # I resisted calling this file sync_watchdog_watchdog.py, but that's what it is.
 # Normally a watchdog process runs on each server and detects hung/crashed
@@ -6,6 +7,7 @@ from datetime import datetime, timedelta
 # up. Except, if the entire server goes down, the watchdog no longer runs and
 # users get stuck. So, we need a watchdog for the watchdogs. A separate process
 # reschedules users left stranded by a failed server/process.
+# (unless there's Redis, in which case their leases run out and the scheduler takes care of them - this just tidies up after the host)
 
 SERVER_WATCHDOG_TIMEOUT = timedelta(minutes=5)
 
@@ -14,7 +16,8 @@ print("Global sync watchdog run at %s" % datetime.now())
 for host_record in db.sync_watchdogs.find():
     if datetime.utcnow() - host_record["Timestamp"] > SERVER_WATCHDOG_TIMEOUT:
         print("Releasing users held by %s (last check-in %s)" % (host_record["Host"], host_record["Timestamp"]))
-        db.users.update({"SynchronizationHost": host_record["Host"]}, {"$unset": {"SynchronizationWorker": True}}, multi=True)
+        if not SyncLease.Enabled():
+            db.users.update({"SynchronizationHost": host_record["Host"]}, {"$unset": {"SynchronizationWorker": True}}, multi=True)
         db.sync_workers.remove({"Host": host_record["Host"]}, multi=True)
         db.sync_watchdogs.remove({"_id": host_record["_id"]})
 
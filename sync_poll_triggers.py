@@ -1,4 +1,4 @@
-from tapiriik.database import db, close_connections
+from tapiriik.database import db, redis, close_connections
 from tapiriik.requests_lib import patch_requests_source_address
 from tapiriik.settings import RABBITMQ_BROKER_URL, MONGO_HOST, MONGO_FULL_WRITE_CONCERN
 from tapiriik import settings
@@ -17,7 +17,7 @@ class _celeryConfig:
     CELERY_ROUTES = {
         "sync_poll_triggers.trigger_poll": {"queue": "tapiriik-poll"}
     }
-    CELERYD_CONCURRENCY = 1 # Otherwise the GC rate limiting breaks since file locking is per-process.
+    CELERYD_CONCURRENCY = 4 if redis else 1 # The GC rate limiting only holds across processes when it's kept in Redis
     CELERYD_PREFETCH_MULTIPLIER = 1 # The message queue could use some exercise.
 
 celery_app = Celery('sync_poll_triggers', broker=RABBITMQ_BROKER_URL)
@@ -30,6 +30,7 @@ def celery_shutdown():
 @celery_app.task(acks_late=True)
 def trigger_poll(service_id, index):
     from tapiriik.auth import User
+    from tapiriik.sync.schedule import SyncSchedule
     print("Polling %s-%d" % (service_id, index))
     svc = Service.FromID(service_id)
     affected_connection_external_ids = svc.PollPartialSyncTrigger(index)
@@ -44,7 +45,8 @@ def trigger_poll(service_id, index):
     trigger_users_query = User.PaidUserMongoQuery()
     trigger_users_query.update({"ConnectedServices.ID": {"$in": affected_connection_ids}})
     trigger_users_query.update({"Config.suppress_auto_sync": {"$ne": True}})
-    db.users.update(trigger_users_query, {"$set": {"NextSynchronization": datetime.utcnow()}}, multi=True) # It would be nicer to use the Sync.Schedule... method, but I want to cleanly do this in bulk
+    db.users.update(trigger_users_query, {"$set": {"NextSynchronization": datetime.utcnow(), "NextSyncLane": "triggered"}}, multi=True) # It would be nicer to use the Sync.Schedule... method, but I want to cleanly do this in bulk
+    SyncSchedule.NotifyMatching(trigger_users_query, datetime.utcnow())
 
     db.poll_stats.insert({"Service": service_id, "Index": index, "Timestamp": datetime.utcnow(), "TriggerCount": len(affected_connection_external_ids)})
 
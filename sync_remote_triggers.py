@@ -1,4 +1,4 @@
-from tapiriik.database import db, close_connections
+from tapiriik.database import db, redis, close_connections
 from tapiriik.settings import RABBITMQ_BROKER_URL, MONGO_FULL_WRITE_CONCERN
 from datetime import datetime
 from celery import Celery
@@ -8,7 +8,7 @@ class _celeryConfig:
     CELERY_ROUTES = {
         "sync_remote_triggers.trigger_remote": {"queue": "tapiriik-remote-trigger"}
     }
-    CELERYD_CONCURRENCY = 1 # Otherwise the GC rate limiting breaks since file locking is per-process.
+    CELERYD_CONCURRENCY = 4 if redis else 1 # The GC rate limiting only holds across processes when it's kept in Redis
     CELERYD_PREFETCH_MULTIPLIER = 1 # The message queue could use some exercise.
 
 celery_app = Celery('sync_remote_triggers', broker=RABBITMQ_BROKER_URL)
@@ -21,6 +21,7 @@ def celery_shutdown():
 @celery_app.task(acks_late=True)
 def trigger_remote(service_id, affected_connection_external_ids):
     from tapiriik.auth import User
+    from tapiriik.sync.schedule import SyncSchedule
     from tapiriik.services import Service
     svc = Service.FromID(service_id)
     db.connections.update({"Service": svc.ID, "ExternalID": {"$in": affected_connection_external_ids}}, {"$set":{"TriggerPartialSync": True, "TriggerPartialSyncTimestamp": datetime.utcnow()}}, multi=True, w=MONGO_FULL_WRITE_CONCERN)
@@ -29,4 +30,5 @@ def trigger_remote(service_id, affected_connection_external_ids):
     trigger_users_query = User.PaidUserMongoQuery()
     trigger_users_query.update({"ConnectedServices.ID": {"$in": affected_connection_ids}})
     trigger_users_query.update({"Config.suppress_auto_sync": {"$ne": True}})
-    db.users.update(trigger_users_query, {"$set": {"NextSynchronization": datetime.utcnow()}}, multi=True) # It would be nicer to use the Sync.Schedule... method, but I want to cleanly do this in bulk
+    db.users.update(trigger_users_query, {"$set": {"NextSynchronization": datetime.utcnow(), "NextSyncLane": "triggered"}}, multi=True) # It would be nicer to use the Sync.Schedule... method, but I want to cleanly do this in bulk
+    SyncSchedule.NotifyMatching(trigger_users_query, datetime.utcnow())
@@ -1,16 +1,120 @@
 from tapiriik.database import db
 from tapiriik.sync import Sync
-from datetime import datetime
+from tapiriik.sync.schedule import SyncSchedule
+from tapiriik.sync.budget import ApiBudget
+from tapiriik.sync.lease import SyncLease
+from tapiriik.sync.metrics import SyncMetrics
+from tapiriik.settings import RABBITMQ_BROKER_URL, SYNC_SCHEDULE_BATCH_SIZE, SYNC_SCHEDULE_RECONCILE_INTERVAL, SYNC_BUDGET_PLAN_INTERVAL
+from datetime import datetime, timedelta
 from pymongo.read_preferences import ReadPreference
 import kombu
+import socket
 import time
 import uuid
 
 Sync.InitializeWorkerBindings()
+# Both schedulers range over this - poll_schedule for who's due, SyncSchedule.Reconcile for who's due before it next runs, and ApiBudget.Forecast for who'll be due per service
+db.users.ensure_index([("NextSynchronization", 1), ("ConnectedServices.Service", 1)])
 
-producer = kombu.Producer(Sync._channel, Sync._exchange)
+class BatchPublisher:
+    # The shared MQ connection waits for the broker to confirm each message before sending the next - which adds up, when there are thousands of users due at once.
+    # This still gets every message confirmed, but sends a whole batch before waiting on them.
+    ConfirmTimeout = 30 # Seconds - it's given this long a few times over before the batch is written off
+    ConfirmAttempts = 3
 
-while True:
+    def __init__(self):
+        self._connection = kombu.Connection(RABBITMQ_BROKER_URL)
+        self._channel = self._connection.channel()
+        self._channel.confirm_select()
+        self._channel.events["basic_ack"].add(self._confirm)
+        self._channel.events["basic_nack"].add(self._nack)
+        self._producer = kombu.Producer(self._channel, kombu.Exchange("tapiriik-users", type="direct"))
+        self._deliveryTag = 0
+        self._unconfirmed = set()
+        self._nacked = 0
+
+    def _confirm(self, delivery_tag, multiple):
+        if multiple:
+            self._unconfirmed = set(x for x in self._unconfirmed if x > delivery_tag)
+        else:
+            self._unconfirmed.discard(delivery_tag)
+
+    def _nack(self, delivery_tag, multiple):
+        self._nacked += 1
+        self._confirm(delivery_tag, multiple)
+
+    def Publish(self, users, generation):
+        # True once the broker has confirmed every message - False if it rejected any, or never got back to us about them
+        self._nacked = 0
+        for user in users:
+            self._producer.publish({"user_id": str(user["_id"]), "generation": generation}, routing_key=Sync.QueueRoutingKey(user))
+            self._deliveryTag += 1
+            self._unconfirmed.add(self._deliveryTag)
+        for attempt in range(BatchPublisher.ConfirmAttempts):
+            try:
+                while len(self._unconfirmed):
+                    self._connection.drain_events(timeout=BatchPublisher.ConfirmTimeout)
+                break
+            except socket.timeout:
+                print("Still waiting on %d confirms at %s" % (len(self._unconfirmed), datetime.utcnow()))
+        if len(self._unconfirmed) or self._nacked:
+            print("Broker rejected %d and didn't confirm %d of %d messages at %s" % (self._nacked, len(self._unconfirmed), len(users), datetime.utcnow()))
+            # Any confirms that do turn up for these later don't matter any more
+            self._unconfirmed = set()
+            return False
+        return True
+
+publisher = BatchPublisher()
+budget = ApiBudget()
+next_plan = datetime.utcnow()
+metrics = SyncMetrics()
+next_metrics = datetime.utcnow()
+
+def dispatch(users, generation):
+    global next_plan
+    if datetime.utcnow() >= next_plan:
+        budget.Plan()
+        next_plan = datetime.utcnow() + timedelta(seconds=SYNC_BUDGET_PLAN_INTERVAL)
+    users, deferred = budget.Pace(users)
+    SyncSchedule.Release(deferred, generation)
+    published = []
+    for idx in range(0, len(users), SYNC_SCHEDULE_BATCH_SIZE):
+        batch = users[idx:idx + SYNC_SCHEDULE_BATCH_SIZE]
+        if publisher.Publish(batch, generation):
+            published += batch
+        else:
+            # Just this batch goes back in the schedule for another try shortly, rather than leaving them marked as queued when they may not be
+            # If any of their messages did make it, the workers will find the generation's moved on and skip them
+            SyncSchedule.Release([(x, datetime.utcnow() + Sync.MinimumSyncInterval) for x in batch], generation)
+            metrics.Count("publish_failures", len(batch))
+    users = published
+    ApiBudget.Dispatched(users)
+    metrics.Count("scheduled", len(users))
+    metrics.Count("budget_deferred", len(deferred))
+    return len(users), len(deferred)
+
+def record_metrics(oldest_due):
+    # How far behind the schedule is, and how deep the queues are - at most once a minute, since it asks the broker
+    global next_metrics
+    if oldest_due and oldest_due < datetime.utcnow():
+        metrics.Observe("enqueue_wait", (datetime.utcnow() - oldest_due).total_seconds())
+    if datetime.utcnow() < next_metrics:
+        return
+    for lane, depth in Sync.QueueDepths().items():
+        metrics.Gauge("queue.%s" % lane, depth)
+    metrics.Flush()
+    next_metrics = datetime.utcnow() + timedelta(minutes=1)
+
+def reap_leases():
+    # Users whose syncs died go straight back in the queue, to be picked up on this same pass
+    if SyncLease.Enabled():
+        reaped = SyncLease.Reap()
+        if reaped:
+            print("Requeued %d users with expired leases at %s" % (reaped, datetime.utcnow()))
+
+def poll_schedule():
+    # What we do without the Redis index - just look for anyone due, every second
+    reap_leases()
     generation = str(uuid.uuid4())
     queueing_at = datetime.utcnow()
     users = list(db.users.with_options(read_preference=ReadPreference.PRIMARY).find(
@@ -20,15 +124,49 @@ while True:
                 },
                 {
                     "_id": True,
-                    "SynchronizationHostRestriction": True
+                    "SynchronizationHostRestriction": True,
+                    "NextSyncLane": True,
+                    "NextSyncIsExhaustive": True,
+                    "ConnectedServices.Service": True,
+                    "NextSynchronization": True
                 }
             ))
     scheduled_ids = [x["_id"] for x in users]
     print("Found %d users at %s" % (len(scheduled_ids), datetime.utcnow()))
     db.users.update({"_id": {"$in": scheduled_ids}}, {"$set": {"QueuedAt": queueing_at, "QueuedGeneration": generation}, "$unset": {"NextSynchronization": True}}, multi=True)
     print("Marked %d users as queued at %s" % (len(scheduled_ids), datetime.utcnow()))
-    for user in users:
-        producer.publish({"user_id": str(user["_id"]), "generation": generation}, routing_key=user["SynchronizationHostRestriction"] if "SynchronizationHostRestriction" in user and user["SynchronizationHostRestriction"] else "")
-    print("Scheduled %d users at %s" % (len(scheduled_ids), datetime.utcnow()))
+    dispatched, deferred = dispatch(users, generation)
+    print("Scheduled %d users (%d deferred by API budget) at %s" % (dispatched, deferred, datetime.utcnow()))
+    record_metrics(min(x["NextSynchronization"] for x in users) if len(users) else None)
 
     time.sleep(1)
+
+next_reconcile = datetime.utcnow()
+
+def indexed_schedule():
+    global next_reconcile
+    if datetime.utcnow() >= next_reconcile:
+        print("Reconciled %d users at %s" % (SyncSchedule.Reconcile(), datetime.utcnow()))
+        next_reconcile = datetime.utcnow() + timedelta(seconds=SYNC_SCHEDULE_RECONCILE_INTERVAL)
+
+    reap_leases()
+    record_metrics(SyncSchedule.NextDue())
+    while True:
+        users, generation = SyncSchedule.ClaimDue(SYNC_SCHEDULE_BATCH_SIZE)
+        if generation is None:
+            break # Nobody else due
+        dispatched, deferred = dispatch(users, generation)
+        print("Scheduled %d users (%d deferred by API budget) at %s" % (dispatched, deferred, datetime.utcnow()))
+
+    # Sleep until the next user is due or lease expires (or someone new is scheduled sooner than that)
+    wake_at = next_reconcile
+    for next_due in (SyncSchedule.NextDue(), SyncLease.NextExpiry()):
+        if next_due and next_due < wake_at:
+            wake_at = next_due
+    SyncSchedule.Wait((wake_at - datetime.utcnow()).total_seconds())
+
+while True:
+    if SyncSchedule.Enabled():
+        indexed_schedule()
+    else:
+        poll_schedule()
@@ -1,5 +1,6 @@
 from tapiriik.database import db, close_connections
 from tapiriik.sync import SyncStep
+from tapiriik.sync.lease import SyncLease
 import os
 import signal
 import socket
@@ -7,6 +8,10 @@ from datetime import timedelta, datetime
 
 print("Sync watchdog run at %s" % datetime.now())
 
+# With Redis, hung syncs are killed by their own worker, and the scheduler requeues users from dead ones (see SyncLease)
+# So all that's left here is clearing out the records of dead workers
+leases = SyncLease.Enabled()
+
 host = socket.gethostname()
 
 for worker in db.sync_workers.find({"Host": host}):
@@ -24,16 +29,24 @@ for worker in db.sync_workers.find({"Host": host}):
     else:
         timeout = timedelta(minutes=10)  # But everything else shouldn't
 
-    if alive and worker["Heartbeat"] < datetime.utcnow() - timeout:
+    if alive and not leases and worker["Heartbeat"] < datetime.utcnow() - timeout:
         print("%s timed out" % worker)
+        if "SyncProcess" in worker and worker["SyncProcess"] != worker["Process"]:
+            # Don't leave a forked sync running on its own
+            try:
+                os.kill(worker["SyncProcess"], signal.SIGKILL)
+            except os.error:
+                pass
         os.kill(worker["Process"], signal.SIGKILL)
         alive = False
 
     # Clear it from the database if it's not alive.
     if not alive:
         db.sync_workers.remove({"_id": worker["_id"]})
+        if leases:
+            continue
         # Unlock users attached to it.
-        db.users.update({"SynchronizationWorker": worker["Process"], "SynchronizationHost": host}, {"$unset":{"SynchronizationWorker": True}}, multi=True)
+        db.users.update({"SynchronizationWorker": {"$in": [worker["Process"], worker.get("SyncProcess", worker["Process"])]}, "SynchronizationHost": host}, {"$unset":{"SynchronizationWorker": True}}, multi=True)
 
 db.sync_watchdogs.update({"Host": host}, {"Host": host, "Timestamp": datetime.utcnow()}, upsert=True)
 
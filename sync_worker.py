@@ -7,22 +7,23 @@ def worker_message(state):
 
 worker_message("booting")
 
-from tapiriik.requests_lib import patch_requests_with_default_timeout, patch_requests_source_address
+from tapiriik.requests_lib import patch_requests_with_default_timeout, patch_requests_source_address, patch_requests_tracing
 from tapiriik import settings
-from tapiriik.database import db, close_connections
+from tapiriik.database import db, close_connections, CommandMonitor
 from pymongo import ReturnDocument
 import sys
 import subprocess
 import socket
 
-RecycleInterval = 2 # Time spent rebooting workers < time spent wrangling Python memory management.
+RecycleInterval = 25 # Workers also recycle themselves once they pass SYNC_WORKER_MEMORY_TARGET_MB, since time spent rebooting workers < time spent wrangling Python memory management.
 
 oldCwd = os.getcwd()
 WorkerVersion = subprocess.Popen(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, cwd=os.path.dirname(__file__)).communicate()[0].strip()
 os.chdir(oldCwd)
 
 def sync_heartbeat(state, user=None):
-    db.sync_workers.update({"_id": heartbeat_rec_id}, {"$set": {"Heartbeat": datetime.utcnow(), "State": state, "User": user}})
+    # SyncProcess differs from Process when syncs run in a forked child (SYNC_WORKER_FORK_PER_USER)
+    db.sync_workers.update({"_id": heartbeat_rec_id}, {"$set": {"Heartbeat": datetime.utcnow(), "State": state, "User": user, "SyncProcess": os.getpid()}})
 
 worker_message("initialized")
 
@@ -65,14 +66,29 @@ print(" %d -> Index %s\n -> Interface %s" % (os.getpid(), settings.WORKER_INDEX,
 # We defer including the main body of the application till here so the settings aren't captured before we've set them up.
 # The better way would be to defer initializing services until they're requested, but it's 10:30 and this will work just as well.
 from tapiriik.sync import Sync
+from tapiriik.services.cpu_budget import CPUBudget
+from tapiriik.services.tracing import SyncTrace
 
 Sync.InitializeWorkerBindings()
 
+# Requests and DB round-trips count towards whichever sync made them
+patch_requests_tracing(SyncTrace.Count)
+if CommandMonitor:
+    CommandMonitor.Callback = SyncTrace.CountCommand
+
+cpu_limit = CPUBudget.Configure()
+print(" -> CPU limit %s" % ("%.1f%%" % cpu_limit if cpu_limit else "none"))
+
 sync_heartbeat("ready")
 
 worker_message("ready")
 
-Sync.PerformGlobalSync(heartbeat_callback=sync_heartbeat, version=WorkerVersion, max_users=RecycleInterval)
+if settings.SYNC_WORKER_FORK_PER_USER:
+    # Each user is synced in a forked child that takes its memory with it - so there's no need to recycle this process
+    Sync.PerformGlobalSync(heartbeat_callback=sync_heartbeat, version=WorkerVersion, fork_per_user=True)
+else:
+    # The heartbeat record is per-process, so with concurrent syncs it shows whichever sync reported last
+    Sync.PerformGlobalSync(heartbeat_callback=sync_heartbeat, version=WorkerVersion, max_users=RecycleInterval * settings.SYNC_WORKER_CONCURRENT_USERS, concurrent_users=settings.SYNC_WORKER_CONCURRENT_USERS)
 
 worker_message("shutting down cleanly")
 db.sync_workers.remove({"_id": heartbeat_rec_id})
@@ -3,6 +3,27 @@ from tapiriik.settings import MONGO_HOST, MONGO_REPLICA_SET, MONGO_CLIENT_OPTION
 
 # MongoDB
 
+# Lets sync tracing count round-trips - pymongo only has the hooks from 3.1, and they have to be in place before the client's created
+try:
+	from pymongo import monitoring
+except ImportError:
+	CommandMonitor = None
+else:
+	class CommandMonitor(monitoring.CommandListener):
+		Callback = None # (command name, seconds)
+
+		def started(self, event):
+			pass
+
+		def succeeded(self, event):
+			if CommandMonitor.Callback:
+				CommandMonitor.Callback(event.command_name, event.duration_micros / 1000000)
+
+		def failed(self, event):
+			self.succeeded(event)
+
+	monitoring.register(CommandMonitor())
+
 client_class = MongoClient if not MONGO_REPLICA_SET else MongoReplicaSetClient
 if MONGO_REPLICA_SET:
 	MONGO_CLIENT_OPTIONS["replicaSet"] = MONGO_REPLICA_SET
@@ -12,8 +33,6 @@ _connection = client_class(host=MONGO_HOST, **MONGO_CLIENT_OPTIONS)
 db = _connection["tapiriik"]
 cachedb = _connection["tapiriik_cache"]
 tzdb = _connection["tapiriik_tz"]
-# The main db currently has an unfortunate lock contention rate
-ratelimit = _connection["tapiriik_ratelimit"]
 
 # Redis
 if REDIS_HOST:
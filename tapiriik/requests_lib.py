@@ -40,3 +40,19 @@ def patch_requests_user_agent(user_agent):
 		kwargs["headers"] = headers
 		return old_request(*args, **kwargs)
 	requests.Session.request = new_request
+
+def patch_requests_tracing(count):
+	# count(name, value) - for sync tracing's tally of requests & bytes
+	import requests
+	old_send = requests.Session.send
+	def new_send(self, request, **kwargs):
+		count("http.requests", 1)
+		if request.body:
+			count("http.bytes_sent", len(request.body))
+		response = old_send(self, request, **kwargs)
+		if "Content-Length" in response.headers:
+			count("http.bytes_received", int(response.headers["Content-Length"]))
+		elif not kwargs.get("stream"):
+			count("http.bytes_received", len(response.content))
+		return response
+	requests.Session.send = new_send
@@ -314,10 +314,17 @@ class BeginnerTriathleteService(ServiceBase):
 
         return activity
 
+    def PrerenderFormats(self, serviceRecord, activity):
+        return ["fit"]
+
     def UploadActivity(self, serviceRecord, activity):
         # Upload the workout as a .FIT file
         session = self._prepare_request(self._getUserToken(serviceRecord))
-        uploaddata = FITIO.Dump(activity)
+        if "fit" in activity.PrerenderedFormats:
+            logger.debug("Using prerendered FIT")
+            uploaddata = activity.PrerenderedFormats["fit"]
+        else:
+            uploaddata = FITIO.Dump(activity)
         files = {"deviceFile": ("tap-sync-" + str(os.getpid()) + "-" + activity.UID + ".fit", uploaddata)}
         response = session.post(self._deviceUploadUrl, files=files)
 
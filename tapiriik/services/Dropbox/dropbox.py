@@ -5,6 +5,7 @@ from tapiriik.services.interchange import ActivityType, UploadedActivity
 from tapiriik.services.exception_tools import strip_context
 from tapiriik.services.gpx import GPXIO
 from tapiriik.services.tcx import TCXIO
+from tapiriik.services.fit import FITIO
 from tapiriik.database import cachedb, redis
 from dropbox import client, rest, session
 from django.core.urlresolvers import reverse
@@ -147,7 +148,7 @@ class DropboxService(ServiceBase):
                 curDirs.append(file["path"])
                 self._folderRecurse(structCache, dbcl, file["path"])
             else:
-                if not file["path"].lower().endswith(".gpx") and not file["path"].lower().endswith(".tcx"):
+                if not file["path"].lower().endswith((".gpx", ".tcx", ".fit")):
                     continue  # another kind of file
                 existingRecord["Files"].append({"Rev": file["rev"], "Path": file["path"]})
         structCache[:] = (x for x in structCache if x["Path"] in curDirs or x not in children)  # delete ones that don't exist
@@ -158,7 +159,8 @@ class DropboxService(ServiceBase):
                 return act
         return None
 
-    def _getActivity(self, serviceRecord, dbcl, path):
+    def _getActivity(self, serviceRecord, dbcl, path, summary_only=False):
+        # summary_only is for the listing - which only needs the start/end times and the TZ, not every waypoint
         activityData = None
 
         try:
@@ -172,11 +174,13 @@ class DropboxService(ServiceBase):
 
         try:
             if path.lower().endswith(".tcx"):
-                act = TCXIO.Parse(activityData)
+                act = TCXIO.Parse(activityData, summary_only=summary_only)
+            elif path.lower().endswith(".fit"):
+                act = FITIO.Parse(activityData)
             else:
-                act = GPXIO.Parse(activityData)
+                act = GPXIO.Parse(activityData, summary_only=summary_only)
         except ValueError as e:
-            raise APIExcludeActivity("Invalid GPX/TCX " + str(e), activity_id=path, user_exception=UserException(UserExceptionType.Corrupt))
+            raise APIExcludeActivity("Invalid GPX/TCX/FIT " + str(e), activity_id=path, user_exception=UserException(UserExceptionType.Corrupt))
         except lxml.etree.XMLSyntaxError as e:
             raise APIExcludeActivity("LXML parse error " + str(e), activity_id=path, user_exception=UserException(UserExceptionType.Corrupt))
         return act, metadata["rev"]
@@ -233,7 +237,7 @@ class DropboxService(ServiceBase):
                     logger.debug("Retrieving %s (%s)" % (path, "outdated meta cache" if existing else "not in meta cache"))
                     # get the full activity
                     try:
-                        act, rev = self._getActivity(svcRec, dbcl, path)
+                        act, rev = self._getActivity(svcRec, dbcl, path, summary_only=True)
                     except APIExcludeActivity as e:
                         logger.info("Encountered APIExcludeActivity %s" % str(e))
                         exclusions.append(strip_context(e))
@@ -255,7 +259,7 @@ class DropboxService(ServiceBase):
                             dbcl.file_move(path, path.replace(".tcx", ".tcx.summary-data"))
                         continue # DON'T include in listing - it'll be regenerated
                     del act.Laps
-                    act.Laps = []  # Yeah, I'll process the activity twice, but at this point CPU time is more plentiful than RAM.
+                    act.Laps = []  # The whole thing's parsed again (properly) when it's downloaded.
                     cache["Activities"][hashedRelPath] = {"Rev": rev, "UID": act.UID, "StartTime": act.StartTime.strftime("%H:%M:%S %d %m %Y %z"), "EndTime": act.EndTime.strftime("%H:%M:%S %d %m %Y %z")}
                 tagRes = self._tagActivity(relPath)
                 act.ServiceData = {"Path": path, "Tagged":tagRes is not None}
@@ -315,6 +319,9 @@ class DropboxService(ServiceBase):
         name = re.sub(r"^([\W_])|([\W_])$", "", name) # To deal with trailing-seperator weirdness (repeated seperator handled by prev regexp)
         return name
 
+    def PrerenderFormats(self, serviceRecord, activity):
+        return ["tcx" if serviceRecord.GetConfiguration()["Format"] == "tcx" else "gpx"]
+
     def UploadActivity(self, serviceRecord, activity):
         format = serviceRecord.GetConfiguration()["Format"]
         if format == "tcx":
@@ -26,6 +26,7 @@ class EndomondoService(ServiceBase):
     UserActivityURL = "http://www.endomondo.com/workouts/{1}/{0}"
 
     PartialSyncRequiresTrigger = True
+    MaximumSyncInterval = timedelta(hours=24)
     AuthenticationNoFrame = True
 
     ConfigurationDefaults = {
@@ -8,6 +8,7 @@ from tapiriik.services.tcx import TCXIO
 from tapiriik.services.gpx import GPXIO
 from tapiriik.services.fit import FITIO
 from tapiriik.services.sessioncache import SessionCache
+from tapiriik.services.ratelimiting import RateLimit
 from tapiriik.services.devices import DeviceIdentifier, DeviceIdentifierType, Device
 from tapiriik.database import cachedb, db
 
@@ -22,7 +23,7 @@ import time
 import json
 import re
 import random
-import tempfile
+import socket
 import json
 from urllib.parse import urlencode
 logger = logging.getLogger(__name__)
@@ -40,6 +41,8 @@ class GarminConnectService(ServiceBase):
     # a) create a reasonable schema to allow for these updates.
     # b) write a query to reset the counters in the existing schema.
     DownloadRetryCount = 6
+    # Every request goes through _rate_limit anyways, there's no point in listing more than one at a time
+    ListingConcurrencyLimit = 1
 
     ConfigurationDefaults = {
         "WatchUserKey": None,
@@ -126,31 +129,10 @@ class GarminConnectService(ServiceBase):
             cachedb.gc_type_hierarchy.insert({"Hierarchy": rawHierarchy})
         else:
             self._activityHierarchy = json.loads(cachedHierarchy["Hierarchy"])["dictionary"]
-        rate_lock_path = tempfile.gettempdir() + "/gc_rate.%s.lock" % HTTP_SOURCE_ADDR
-        # Ensure the rate lock file exists (...the easy way)
-        open(rate_lock_path, "a").close()
-        self._rate_lock = open(rate_lock_path, "r+")
 
     def _rate_limit(self):
-        import fcntl, struct, time
-        min_period = 1  # I appear to been banned from Garmin Connect while determining this.
-        fcntl.flock(self._rate_lock,fcntl.LOCK_EX)
-        try:
-            self._rate_lock.seek(0)
-            last_req_start = self._rate_lock.read()
-            if not last_req_start:
-                last_req_start = 0
-            else:
-                last_req_start = float(last_req_start)
-
-            wait_time = max(0, min_period - (time.time() - last_req_start))
-            time.sleep(wait_time)
-
-            self._rate_lock.seek(0)
-            self._rate_lock.write(str(time.time()))
-            self._rate_lock.flush()
-        finally:
-            fcntl.flock(self._rate_lock,fcntl.LOCK_UN)
+        # One request per second per outgoing address - I appear to been banned from Garmin Connect while determining this.
+        RateLimit.Acquire("gc:%s:%s" % (socket.gethostname(), HTTP_SOURCE_ADDR), [(timedelta(seconds=1), 1)])
 
     def _request_with_reauth(self, serviceRecord, req_lambda):
         for i in range(self._reauthAttempts + 1):
@@ -529,9 +511,16 @@ class GarminConnectService(ServiceBase):
 
         return activity
 
+    def PrerenderFormats(self, serviceRecord, activity):
+        return ["fit"]
+
     def UploadActivity(self, serviceRecord, activity):
         #/proxy/upload-service-1.1/json/upload/.fit
-        fit_file = FITIO.Dump(activity)
+        if "fit" in activity.PrerenderedFormats:
+            logger.debug("Using prerendered FIT")
+            fit_file = activity.PrerenderedFormats["fit"]
+        else:
+            fit_file = FITIO.Dump(activity)
         files = {"data": ("tap-sync-" + str(os.getpid()) + "-" + activity.UID + ".fit", fit_file)}
 
         res = self._request_with_reauth(serviceRecord, lambda session: session.post("https://connect.garmin.com/proxy/upload-service-1.1/json/upload/.fit", files=files))
@@ -3,6 +3,7 @@ from tapiriik.services.service_base import ServiceAuthenticationType, ServiceBas
 from tapiriik.services.interchange import UploadedActivity, ActivityType, ActivityStatistic, ActivityStatisticUnit, Waypoint, Location, Lap
 from tapiriik.services.api import APIException, APIWarning, UserException, UserExceptionType
 from tapiriik.services.sessioncache import SessionCache
+from tapiriik.services.ratelimiting import RateLimit
 from tapiriik.payments import ExternalPaymentProvider
 
 from django.core.urlresolvers import reverse
@@ -11,7 +12,7 @@ import requests
 import logging
 import time
 import json
-import tempfile
+import socket
 logger = logging.getLogger(__name__)
 
 class MotivatoService(ServiceBase):
@@ -20,6 +21,7 @@ class MotivatoService(ServiceBase):
     DisplayAbbreviation = "MOT"
     AuthenticationType = ServiceAuthenticationType.UsernamePassword
     RequiresExtendedAuthorizationDetails = True
+    ListingConcurrencyLimit = 1 # Similarly rate limited to one request/sec
 
     _activityMappings={
         ActivityType.Running: 1,
@@ -59,12 +61,6 @@ class MotivatoService(ServiceBase):
 
     _urlRoot = "http://motivato.pl"
 
-    def __init__(self):
-        rate_lock_path = tempfile.gettempdir() + "/m_rate.%s.lock" % HTTP_SOURCE_ADDR
-        # Ensure the rate lock file exists (...the easy way)
-        open(rate_lock_path, "a").close()
-        self._rate_lock = open(rate_lock_path, "r+")
-
     def WebInit(self):
         self.UserAuthorizationURL = WEB_ROOT + reverse("auth_simple", kwargs={"service": self.ID})
 
@@ -348,29 +344,8 @@ class MotivatoService(ServiceBase):
         return session
 
     def _rate_limit(self):
-        import fcntl, time
-        min_period = 1
-        print("Waiting for lock")
-        fcntl.flock(self._rate_lock,fcntl.LOCK_EX)
-        try:
-            print("Have lock")
-            self._rate_lock.seek(0)
-            last_req_start = self._rate_lock.read()
-            if not last_req_start:
-                last_req_start = 0
-            else:
-                last_req_start = float(last_req_start)
-
-            wait_time = max(0, min_period - (time.time() - last_req_start))
-            time.sleep(wait_time)
-
-            self._rate_lock.seek(0)
-            self._rate_lock.write(str(time.time()))
-            self._rate_lock.flush()
-
-            print("Rate limited for %f" % wait_time)
-        finally:
-            fcntl.flock(self._rate_lock,fcntl.LOCK_UN)
+        # One request per second per outgoing address
+        RateLimit.Acquire("motivato:%s:%s" % (socket.gethostname(), HTTP_SOURCE_ADDR), [(timedelta(seconds=1), 1)])
 
     def DeleteCachedData(self, serviceRecord):
         # nothing cached...
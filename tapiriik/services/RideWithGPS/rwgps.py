@@ -192,10 +192,17 @@ class RideWithGPSService(ServiceBase):
 
         return activity
 
+    def PrerenderFormats(self, serviceRecord, activity):
+        return ["fit"]
+
     def UploadActivity(self, serviceRecord, activity):
         # https://ridewithgps.com/trips.json
 
-        fit_file = FITIO.Dump(activity)
+        if "fit" in activity.PrerenderedFormats:
+            logger.debug("Using prerendered FIT")
+            fit_file = activity.PrerenderedFormats["fit"]
+        else:
+            fit_file = FITIO.Dump(activity)
         files = {"data_file": ("tap-sync-" + str(os.getpid()) + "-" + activity.UID + ".fit", fit_file)}
         params = {}
         params['trip[name]'] = activity.Name
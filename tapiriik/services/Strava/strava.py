@@ -5,6 +5,7 @@ from tapiriik.database import cachedb
 from tapiriik.services.interchange import UploadedActivity, ActivityType, ActivityStatistic, ActivityStatisticUnit, Waypoint, WaypointType, Location, Lap
 from tapiriik.services.api import APIException, UserException, UserExceptionType, APIExcludeActivity
 from tapiriik.services.fit import FITIO
+from tapiriik.services.ratelimiting import ApiUsage
 
 from django.core.urlresolvers import reverse
 from datetime import datetime, timedelta
@@ -29,6 +30,7 @@ class StravaService(ServiceBase):
     UserActivityURL = "http://app.strava.com/activities/{1}"
     AuthenticationNoFrame = True  # They don't prevent the iframe, it just looks really ugly.
     PartialSyncRequiresTrigger = True
+    MaximumSyncInterval = timedelta(hours=24)
     LastUpload = None
 
     SupportsHR = SupportsCadence = SupportsTemp = SupportsPower = True
@@ -81,6 +83,10 @@ class StravaService(ServiceBase):
     SupportedActivities = list(_activityTypeMappings.keys())
 
     GlobalRateLimits = STRAVA_RATE_LIMITS
+    # Every 15 minutes on the quarter-hour, and daily at midnight UTC
+    GlobalRateLimitsAligned = True
+    # The rate limits apply to our API key as a whole
+    ListingConcurrencyLimit = 2
 
     def UserUploadedActivityURL(self, uploadId):
         return "https://www.strava.com/activities/%d" % uploadId
@@ -107,6 +113,8 @@ class StravaService(ServiceBase):
 
         authorizationData = {"OAuthToken": data["access_token"]}
         # Retrieve the user ID, meh.
+        # Counted, but never held back - a user waiting on the OAuth redirect is worth more than any sync
+        ApiUsage.Record(self.ID)
         id_resp = requests.get("https://www.strava.com/api/v3/athlete", headers=self._apiHeaders(ServiceRecord({"Authorization": authorizationData})))
         return (id_resp.json()["id"], authorizationData)
 
@@ -123,6 +131,7 @@ class StravaService(ServiceBase):
             if before is not None and before < 0:
                 break # Caused by activities that "happened" before the epoch. We generally don't care about those activities...
             logger.debug("Req with before=" + str(before) + "/" + str(earliestDate))
+            self._globalRateLimit()
             resp = requests.get("https://www.strava.com/api/v3/athletes/" + str(svcRecord.ExternalID) + "/activities", headers=self._apiHeaders(svcRecord), params={"before": before})
             if resp.status_code == 401:
                 raise APIException("No authorization to retrieve activity list", block=True, user_exception=UserException(UserExceptionType.Authorization, intervention_required=True))
@@ -212,6 +221,7 @@ class StravaService(ServiceBase):
             return activity
         activityID = activity.ServiceData["ActivityID"]
 
+        self._globalRateLimit()
         streamdata = requests.get("https://www.strava.com/api/v3/activities/" + str(activityID) + "/streams/time,altitude,heartrate,cadence,watts,temp,moving,latlng,distance,velocity_smooth", headers=self._apiHeaders(svcRecord))
         if streamdata.status_code == 401:
             raise APIException("No authorization to download activity", block=True, user_exception=UserException(UserExceptionType.Authorization, intervention_required=True))
@@ -294,6 +304,9 @@ class StravaService(ServiceBase):
 
         return activity
 
+    def PrerenderFormats(self, serviceRecord, activity):
+        return ["fit_drop_pauses"]
+
     def UploadActivity(self, serviceRecord, activity):
         logger.info("Activity tz " + str(activity.TZ) + " dt tz " + str(activity.StartTime.tzinfo) + " starttime " + str(activity.StartTime))
 
@@ -314,14 +327,14 @@ class StravaService(ServiceBase):
                     "activity_type": self._activityTypeMappings[activity.Type],
                     "private": 1 if activity.Private else 0}
 
-            if "fit" in activity.PrerenderedFormats:
+            if "fit_drop_pauses" in activity.PrerenderedFormats:
                 logger.debug("Using prerendered FIT")
-                fitData = activity.PrerenderedFormats["fit"]
+                fitData = activity.PrerenderedFormats["fit_drop_pauses"]
             else:
-                # TODO: put the fit back into PrerenderedFormats once there's more RAM to go around and there's a possibility of it actually being used.
                 fitData = FITIO.Dump(activity, drop_pauses=True)
             files = {"file":("tap-sync-" + activity.UID + "-" + str(os.getpid()) + ("-" + source_svc if source_svc else "") + ".fit", fitData)}
 
+            self._globalRateLimit()
             response = requests.post("https://www.strava.com/api/v3/uploads", data=req, files=files, headers=self._apiHeaders(serviceRecord))
             if response.status_code != 201:
                 if response.status_code == 401:
@@ -336,6 +349,7 @@ class StravaService(ServiceBase):
             upload_poll_wait = 8 # The mode of processing times
             while not response.json()["activity_id"]:
                 time.sleep(upload_poll_wait)
+                self._globalRateLimit()
                 response = requests.get("https://www.strava.com/api/v3/uploads/%s" % upload_id, headers=self._apiHeaders(serviceRecord))
                 logger.debug("Waiting for upload - status %s id %s" % (response.json()["status"], response.json()["activity_id"]))
                 if response.json()["error"]:
@@ -358,6 +372,7 @@ class StravaService(ServiceBase):
                     "elapsed_time": round((activity.EndTime - activity.StartTime).total_seconds())
                 }
             headers = self._apiHeaders(serviceRecord)
+            self._globalRateLimit()
             response = requests.post("https://www.strava.com/api/v3/activities", data=req, headers=headers)
             # FFR this method returns the same dict as the activity listing, as REST services are wont to do.
             if response.status_code != 201:
@@ -375,5 +390,6 @@ class StravaService(ServiceBase):
 
     def DeleteActivity(self, serviceRecord, uploadId):
         headers = self._apiHeaders(serviceRecord)
+        self._globalRateLimit()
         del_res = requests.delete("https://www.strava.com/api/v3/activities/%d" % uploadId, headers=headers)
         del_res.raise_for_status()
@@ -169,8 +169,15 @@ class TrainingPeaksService(ServiceBase):
 
         return activities, exclusions
 
+    def PrerenderFormats(self, svcRecord, activity):
+        return ["pwx"]
+
     def UploadActivity(self, svcRecord, activity):
-        pwxdata = PWXIO.Dump(activity)
+        if "pwx" in activity.PrerenderedFormats:
+            logger.debug("Using prerendered PWX")
+            pwxdata = activity.PrerenderedFormats["pwx"]
+        else:
+            pwxdata = PWXIO.Dump(activity)
         params = self._authData(svcRecord)
         resp = requests.post("https://www.trainingpeaks.com/TPWebServices/EasyFileUpload.ashx", params=params, data=pwxdata.encode("UTF-8"))
         if resp.text != "OK":
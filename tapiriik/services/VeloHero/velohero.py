@@ -245,6 +245,30 @@ class VeloHeroService(ServiceBase):
         return activity
 
 
+    def _uploadFormat(self, activity):
+        has_location = has_distance = has_speed = False
+
+        for lap in activity.Laps:
+            for wp in lap.Waypoints:
+                if wp.Location and wp.Location.Latitude and wp.Location.Longitude:
+                    has_location = True
+                if wp.Distance:
+                    has_distance = True
+                if wp.Speed:
+                    has_speed = True
+
+        if has_location and has_distance and has_speed:
+            return "fit"
+        elif has_location and has_distance:
+            return "tcx"
+        elif has_location:
+            return "gpx"
+        else:
+            return "fit"
+
+    def PrerenderFormats(self, serviceRecord, activity):
+        return [self._uploadFormat(activity)]
+
     def UploadActivity(self, serviceRecord, activity):
         """
         POST a Multipart-Encoded File
@@ -259,28 +283,15 @@ class VeloHeroService(ServiceBase):
         Maximum file size per file is 16 MB.
         """
         
-        has_location = has_distance = has_speed = False
-
-        for lap in activity.Laps:
-            for wp in lap.Waypoints:
-                if wp.Location and wp.Location.Latitude and wp.Location.Longitude:
-                    has_location = True
-                if wp.Distance:
-                    has_distance = True
-                if wp.Speed:
-                    has_speed = True
-
-        if has_location and has_distance and has_speed:
-            format = "fit"
-            data = FITIO.Dump(activity)
-        elif has_location and has_distance:
-            format = "tcx"
+        format = self._uploadFormat(activity)
+        if format in activity.PrerenderedFormats:
+            logger.debug("Using prerendered %s" % format.upper())
+            data = activity.PrerenderedFormats[format]
+        elif format == "tcx":
             data = TCXIO.Dump(activity)
-        elif has_location:
-            format = "gpx"
+        elif format == "gpx":
             data = GPXIO.Dump(activity)
         else:
-            format = "fit"
             data = FITIO.Dump(activity)
 
         # Upload
@@ -0,0 +1,69 @@
+from tapiriik.settings import SYNC_WORKER_CPU_LIMIT, SYNC_WORKERS_PER_HOST
+import os
+import time
+
+class CPUBudget:
+    # Keeps a sync worker to SYNC_WORKER_CPU_LIMIT percent of a CPU - from the inside, where sync_cpulimit used to SIGSTOP/SIGCONT it from the outside.
+    # The CPU-heavy bits (parsing, dumping, stats) call Yield every so often, which sleeps off however much CPU time they've run over their share by.
+    # So a worker only ever stops at one of those points, for a bounded time, and keeps track of how long it spent doing so.
+
+    Window = 5 # Seconds - how long a burst can run ahead of the limit, and how far back idle time counts against it
+    MaxSleep = 1 # Seconds - the most any one Yield will sleep
+    CheckInterval = 64 # Yields between actually looking at the clocks, since they're called inside some tight loops
+
+    _limit = None
+    _calls = 0
+    _windowStart = None
+    _windowCPU = None
+    ThrottledTime = 0 # Seconds spent asleep in Yield, all told
+
+    def AvailableCPUs():
+        # What the container's actually allowed, not how many cores the host has
+        try:
+            # cgroup v2
+            quota, period = open("/sys/fs/cgroup/cpu.max").read().split()
+            if quota != "max":
+                return int(quota) / int(period)
+        except (IOError, ValueError):
+            pass
+        try:
+            # cgroup v1
+            quota = int(open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read())
+            if quota > 0:
+                return quota / int(open("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read())
+        except (IOError, ValueError):
+            pass
+        return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    def Configure(limit=SYNC_WORKER_CPU_LIMIT):
+        # limit is percent of a CPU, "auto" for an even split of the host's between SYNC_WORKERS_PER_HOST workers, or None for no limit at all
+        if limit == "auto":
+            limit = CPUBudget.AvailableCPUs() * 100 / SYNC_WORKERS_PER_HOST if SYNC_WORKERS_PER_HOST else None
+        CPUBudget._limit = limit / 100 if limit else None
+        CPUBudget._windowStart = time.monotonic()
+        CPUBudget._windowCPU = time.process_time()
+        return limit
+
+    def Yield():
+        if not CPUBudget._limit:
+            return
+        CPUBudget._calls += 1
+        if CPUBudget._calls % CPUBudget.CheckInterval:
+            return
+        elapsed = time.monotonic() - CPUBudget._windowStart
+        used = time.process_time() - CPUBudget._windowCPU
+        # How long it should have taken to use that much CPU, at the limit
+        owed = used / CPUBudget._limit - elapsed
+        slept = 0
+        if owed > 0:
+            slept = min(owed, CPUBudget.MaxSleep)
+            time.sleep(slept)
+            CPUBudget.ThrottledTime += slept
+        if elapsed > CPUBudget.Window:
+            # Start afresh, but carry over whatever's still owed
+            CPUBudget._windowStart = time.monotonic()
+            CPUBudget._windowCPU = time.process_time() - max(0, owed - slept) * CPUBudget._limit
+
+    def Usage():
+        # (CPU seconds, seconds throttled) for this process and any children it's waited on, so far - for working out what a sync cost
+        return time.process_time() + sum(getattr(os.times(), x) for x in ("children_user", "children_system")), CPUBudget.ThrottledTime
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
-from .interchange import WaypointType, ActivityStatisticUnit, ActivityType, LapIntensity, LapTriggerMethod
-from .devices import DeviceIdentifier, DeviceIdentifierType
+from .interchange import WaypointType, Activity, ActivityStatistic, ActivityStatistics, ActivityStatisticUnit, ActivityType, Waypoint, Location, Lap, LapIntensity, LapTriggerMethod
+from .devices import DeviceIdentifier, DeviceIdentifierType, Device
+from .cpu_budget import CPUBudget
+from .tracing import SyncTrace
 import struct
 import sys
 import pytz
@@ -19,6 +21,7 @@ class FITEvent:
 class FITEventType:
 	Start = 0
 	Stop = 1
+	StopAll = 4
 
 # It's not a coincidence that these enums match the ones in interchange perfectly
 class FITLapIntensity:
@@ -57,6 +60,12 @@ class FITMessageDataType:
 		self.PackFormat = packFormat
 		self.Formatter = formatter
 		self.InvalidValue = invalid
+		# What fits in the field - anything outside it gets written as the invalid value
+		if packFormat and packFormat in "bBhHiIqQ":
+			bits = size * 8
+			self.Range = (-2 ** (bits - 1), 2 ** (bits - 1) - 1) if packFormat.islower() else (0, 2 ** bits - 1)
+		else:
+			self.Range = None
 
 class FITMessageTemplate:
 	def __init__(self, name, number, *args, fields=None):
@@ -86,46 +95,36 @@ class FITMessageGenerator:
 		self._messageTemplates = {}
 		self._definitions = {}
 		self._result = []
-		# All our convience functions for preparing the field types to be packed.
+		self._definitionLookup = {}
+		self._lastTimestamp = None
+		# All our convience functions for preparing the field types to be packed - None never makes it this far, that's always the type's invalid value.
+		# Whatever they return is rounded to fit integer fields.
 		def stringFormatter(input):
 			raise Exception("Not implemented")
+		fitEpoch = datetime(hour=0, minute=0, month=12, day=31, year=1989)
+		fitEpochUTC = pytz.utc.localize(fitEpoch)
 		def dateTimeFormatter(input):
 			# UINT32
 			# Seconds since UTC 00:00 Dec 31 1989. If <0x10000000 = system time
-			if input is None:
-				return struct.pack("<I", 0xFFFFFFFF)
-			delta = round((input - datetime(hour=0, minute=0, month=12, day=31, year=1989)).total_seconds())
-			return struct.pack("<I", delta)
+			return (input - (fitEpochUTC if input.tzinfo else fitEpoch)).total_seconds()
 		def msecFormatter(input):
 			# UINT32
-			if input is None:
-				return struct.pack("<I", 0xFFFFFFFF)
-			return struct.pack("<I", round((input if type(input) is not timedelta else input.total_seconds()) * 1000))
+			return (input if type(input) is not timedelta else input.total_seconds()) * 1000
 		def mmPerSecFormatter(input):
-			# UINT16
-			if input is None:
-				return struct.pack("<H", 0xFFFF)
-			return struct.pack("<H", round(input * 1000))
+			# UINT16, or UINT32 for enhanced_speed
+			return input * 1000
 		def cmFormatter(input):
 			# UINT32
-			if input is None:
-				return struct.pack("<I", 0xFFFFFFFF)
-			return struct.pack("<I", round(input * 100))
+			return input * 100
 		def altitudeFormatter(input):
-			# UINT16
-			if input is None:
-				return struct.pack("<H", 0xFFFF)
-			return struct.pack("<H", round((input + 500) * 5)) # Increments of 1/5, offset from -500m :S
+			# UINT16, or UINT32 for enhanced_altitude
+			return (input + 500) * 5 # Increments of 1/5, offset from -500m :S
 		def semicirclesFormatter(input):
 			# SINT32
-			if input is None:
-				return struct.pack("<i", 0x7FFFFFFF) # FIT-defined invalid value
-			return struct.pack("<i", round(input * (2 ** 31 / 180)))
+			return input * (2 ** 31 / 180)
 		def versionFormatter(input):
 			# UINT16
-			if input is None:
-				return struct.pack("<H", 0xFFFF)
-			return struct.pack("<H", round(input * 100))
+			return input * 100
 
 
 		def defType(name, *args, **kwargs):
@@ -149,15 +148,20 @@ class FITMessageGenerator:
 		defType("uint16z", 0x0B, 2, "H", 0x00)
 		defType("uint32z", 0x0C, 4, "I", 0x00)
 		defType("byte", 0x0D, 1, "B", 0xFF) # This isn't totally correct, docs say "an array of bytes"
+		defType("sint64", 0x8E, 8, "q", 0x7FFFFFFFFFFFFFFF)
+		defType("uint64", 0x8F, 8, "Q", 0xFFFFFFFFFFFFFFFF)
+		defType("uint64z", 0x90, 8, "Q", 0x0)
 
 		# Not strictly FIT fields, but convenient.
-		defType("date_time", 0x86, 4, None, 0xFFFFFFFF, formatter=dateTimeFormatter)
-		defType("duration_msec", 0x86, 4, None, 0xFFFFFFFF, formatter=msecFormatter)
-		defType("distance_cm", 0x86, 4, None, 0xFFFFFFFF, formatter=cmFormatter)
-		defType("mmPerSec", 0x84, 2, None, 0xFFFF, formatter=mmPerSecFormatter)
-		defType("semicircles", 0x85, 4, None, 0x7FFFFFFF, formatter=semicirclesFormatter)
-		defType("altitude", 0x84, 2, None, 0xFFFF, formatter=altitudeFormatter)
-		defType("version", 0x84, 2, None, 0xFFFF, formatter=versionFormatter)
+		defType("date_time", 0x86, 4, "I", 0xFFFFFFFF, formatter=dateTimeFormatter)
+		defType("duration_msec", 0x86, 4, "I", 0xFFFFFFFF, formatter=msecFormatter)
+		defType("distance_cm", 0x86, 4, "I", 0xFFFFFFFF, formatter=cmFormatter)
+		defType("mmPerSec", 0x84, 2, "H", 0xFFFF, formatter=mmPerSecFormatter)
+		defType("semicircles", 0x85, 4, "i", 0x7FFFFFFF, formatter=semicirclesFormatter) # FIT-defined invalid value
+		defType("altitude", 0x84, 2, "H", 0xFFFF, formatter=altitudeFormatter)
+		defType("enhanced_altitude", 0x86, 4, "I", 0xFFFFFFFF, formatter=altitudeFormatter)
+		defType("enhanced_mmPerSec", 0x86, 4, "I", 0xFFFFFFFF, formatter=mmPerSecFormatter)
+		defType("version", 0x84, 2, "H", 0xFFFF, formatter=versionFormatter)
 
 		def defMsg(name, *args):
 			self._messageTemplates[name] = FITMessageTemplate(name, *args)
@@ -252,6 +256,8 @@ class FITMessageGenerator:
 			7, "power", "uint16",
 			13, "temperature", "sint8",
 			33, "calories", "uint16",
+			73, "enhanced_speed", "enhanced_mmPerSec",
+			78, "enhanced_altitude", "enhanced_altitude"
 			)
 
 		defMsg("event", 21,
@@ -269,6 +275,15 @@ class FITMessageGenerator:
 			5, "software_version", "version"
 			)
 
+		# For reading developer fields
+		defMsg("field_description", 206,
+			0, "developer_data_index", "uint8",
+			1, "field_definition_number", "uint8",
+			2, "fit_base_type_id", "uint8",
+			3, "field_name", "string",
+			8, "units", "string"
+			)
+
 	def _write(self, contents):
 		self._result.append(contents)
 
@@ -294,71 +309,233 @@ class FITMessageGenerator:
 				field_type = self._types[field["Type"]]
 				pack_tuple += (field["Number"], field_type.Size, field_type.TypeField)
 				local_fields[field_name] = field
-		self._definitions[local_no] = FITMessageTemplate(global_message.Name, local_no, local_fields)
+		if local_no in self._definitions:
+			# Redefining a local message type - whatever was there before will need defining afresh if it's used again
+			replaced = self._definitions[local_no]
+			del self._definitionLookup[(replaced.Name, frozenset(replaced.FieldNameSet))]
+		definition = FITMessageTemplate(global_message.Name, local_no, local_fields)
+		# Worked out once here, rather than for every field of every message
+		definition.FieldTypes = [self._types[local_fields[x]["Type"]] for x in definition.FieldNameList]
+		definition.Struct = struct.Struct("<B" + "".join(x.PackFormat for x in definition.FieldTypes))
+		self._definitions[local_no] = definition
+		self._definitionLookup[(global_message.Name, frozenset(field_names))] = definition
 		self._write(struct.pack("<BBBHB" + ("BBB" * field_count), *pack_tuple))
-		return self._definitions[local_no]
+		return definition
 
+	def _getDefinition(self, name, field_names):
+		# Are these fields covered by an existing local message type?
+		# If not, create a new local message type with these fields
+		key = (name, frozenset(field_names))
+		if key not in self._definitionLookup:
+			self._defineMessage(len(self._definitions), self._messageTemplates[name], key[1])
+		return self._definitionLookup[key]
+
+	def _packColumn(self, field_name, field_type, values):
+		invalid = field_type.InvalidValue
+		formatter = field_type.Formatter
+		packed = []
+		try:
+			if field_type.Range:
+				low, high = field_type.Range
+				for value in values:
+					if value is None:
+						packed.append(invalid)
+						continue
+					result = round(formatter(value) if formatter else value)
+					packed.append(result if low <= result <= high else invalid)
+			else:
+				for value in values:
+					packed.append(invalid if value is None else (formatter(value) if formatter else value))
+		except Exception as e:
+			raise Exception("Failed packing %s=%s - %s" % (field_name, value, e))
+		return packed
 
 	def GenerateMessage(self, name, **kwargs):
-		globalDefn = self._messageTemplates[name]
-
-		# Create a subset of the global message's fields
-		localFieldNamesSet = set()
-		for fieldName in kwargs:
-			localFieldNamesSet.add(fieldName)
-
-		# I'll look at this later
-		compressTS = False
+		self.GenerateMessages(name, dict((k, [v]) for k, v in kwargs.items()))
+
+	def GenerateMessages(self, name, columns, compress_timestamps=False):
+		# A run of messages with the same fields in one go - columns being {field name: [values...]}, like FITMessageDecoder produces.
+		# With compress_timestamps, those within 31s of the last timestamp written get theirs put in the record header instead of a field of their own.
+		compressed_definition = None
+		if compress_timestamps and "timestamp" in columns and len(columns) > 1:
+			compressed_fields = frozenset(columns.keys()) - set(["timestamp"])
+			compressed_definition = self._definitionLookup.get((name, compressed_fields))
+			if not compressed_definition or compressed_definition.Number > 3:
+				# Only local message types 0-3 can be used with compressed timestamps - so if they're taken, 3 gets redefined
+				compressed_definition = self._defineMessage(min(len(self._definitions), 3), self._messageTemplates[name], compressed_fields)
+			compressed_header = 0x80 | (compressed_definition.Number << 5)
+			compressed_pack = compressed_definition.Struct.pack
+
+		# (after the compressed definition, in case that took this one's place)
+		definition = self._getDefinition(name, columns.keys())
+		rows = zip(*[self._packColumn(field_name, field_type, columns[field_name]) for field_name, field_type in zip(definition.FieldNameList, definition.FieldTypes)])
+		pack = definition.Struct.pack
+		if "timestamp" not in columns:
+			self._write(b"".join(pack(definition.Number, *row) for row in rows))
+			return
+
+		timestamp_idx = definition.FieldNameList.index("timestamp")
+		invalid = self._types["date_time"].InvalidValue
+		last_timestamp = self._lastTimestamp
+		result = []
+		for row in rows:
+			timestamp = row[timestamp_idx]
+			if compressed_definition and last_timestamp is not None and timestamp != invalid and 0 <= timestamp - last_timestamp < 32:
+				result.append(compressed_pack(compressed_header | (timestamp & 0x1F), *(row[:timestamp_idx] + row[timestamp_idx + 1:])))
+			else:
+				result.append(pack(definition.Number, *row))
+			if timestamp != invalid:
+				last_timestamp = timestamp
+		self._lastTimestamp = last_timestamp
+		self._write(b"".join(result))
+
+
+class FITMessageDecoder:
+	# The reverse of FITMessageGenerator, working from the same templates - anything they don't name is skipped over.
+	# Runs of consecutive messages of the same local type (i.e. the records, for the most part) are unpacked in one go, and come out as columns - {field name: [values...]}.
+
+	_epoch = datetime(hour=0, minute=0, month=12, day=31, year=1989, tzinfo=pytz.utc)
+
+	# The inverse of FITMessageGenerator's formatters
+	_valueDecoders = {
+		"date_time": lambda x: FITMessageDecoder._epoch + timedelta(seconds=x),
+		"duration_msec": lambda x: x / 1000,
+		"distance_cm": lambda x: x / 100,
+		"mmPerSec": lambda x: x / 1000,
+		"enhanced_mmPerSec": lambda x: x / 1000,
+		"semicircles": lambda x: x * (180 / 2 ** 31),
+		"altitude": lambda x: x / 5 - 500,
+		"enhanced_altitude": lambda x: x / 5 - 500,
+		"version": lambda x: x / 100,
+	}
 
-		# Are these fields covered by an existing local message type?
-		active_definition = None
-		for defn_n in self._definitions:
-			defn = self._definitions[defn_n]
-			if defn.Name == name:
-				if defn.FieldNameSet == localFieldNamesSet:
-					active_definition = defn
+	_timestampField = 253
 
-		# If not, create a new local message type with these fields
-		if not active_definition:
-			active_definition_no = len(self._definitions)
-			active_definition = self._defineMessage(active_definition_no, globalDefn, localFieldNamesSet)
-
-		if compressTS and active_definition.Number > 3:
-			raise Exception("Can't use compressed timestamp when local message number > 3")
-
-		messageHeader = 0
-		if compressTS:
-			messageHeader = messageHeader | (1 << 7)
-			tsOffsetVal = -1 # TODO
-			messageHeader = messageHeader | (active_definition.Number << 4)
-		else:
-			messageHeader = messageHeader | active_definition.Number
-
-		packResult = [struct.pack("<B", messageHeader)]
-		for field_name in active_definition.FieldNameList:
-			field = active_definition.Fields[field_name]
-			field_type = self._types[field["Type"]]
-			try:
-				if field_type.Formatter:
-					result = field_type.Formatter(kwargs[field_name])
+	def __init__(self):
+		generator = FITMessageGenerator()
+		# Base type number -> the type, for those that can be unpacked directly (the rest are just conveniences built on these)
+		self._baseTypes = dict((x.TypeField & 0x1F, x) for x in generator._types.values() if not x.Formatter or x.Name == "string")
+		# Global message number -> (name, {field number: (field name, type)})
+		self._templates = dict((x.Number, (x.Name, dict((field["Number"], (field["Name"], generator._types[field["Type"]])) for field in x.Fields.values()))) for x in generator._messageTemplates.values())
+
+	def _fieldLayout(self, size, base_type, name, field_type):
+		# Returns the struct format to unpack the field with, and (if it's wanted) how to turn the value into something useful
+		base = self._baseTypes.get(base_type & 0x1F)
+		if name is None or base is None:
+			return "%dx" % size, None
+		if base.Name == "string":
+			return "%ds" % size, (name, None, lambda x: x.split(b"\0", 1)[0].decode("utf-8", "replace") or None)
+		if base.Size != size:
+			return "%dx" % size, None # Arrays - nothing we use comes in those
+		convert = FITMessageDecoder._valueDecoders.get(field_type.Name) if field_type else None
+		return base.PackFormat, (name, base.InvalidValue if base.PackFormat not in "fd" else None, convert)
+
+	def _define(self, arch, global_no, fields, developer_fields, developer_types):
+		name, template = self._templates.get(global_no, (None, {}))
+		formats = [">B" if arch else "<B"] # The record header comes first
+		columns = []
+		for number, size, base_type in fields:
+			field_name, field_type = template.get(number, (None, None))
+			if not name and number == FITMessageDecoder._timestampField:
+				field_name = "timestamp" # Messages we don't know still count towards compressed timestamps
+			fmt, column = self._fieldLayout(size, base_type, field_name, field_type)
+			formats.append(fmt)
+			if column:
+				columns.append((len(formats) - 1, number) + column)
+		for number, size, developer_index in developer_fields:
+			field_name, field_type = developer_types.get((developer_index, number), (None, None))
+			fmt, column = self._fieldLayout(size, field_type.TypeField if field_type else 0, field_name if name else None, None)
+			formats.append(fmt)
+			if column:
+				columns.append((len(formats) - 1, None) + column)
+		# Skipped fields don't produce values, so the column indices need adjusting to match what's actually unpacked
+		unpacked = [idx for idx, fmt in enumerate(formats) if not fmt.endswith("x")]
+		columns = [(unpacked.index(idx), number, field_name, invalid, convert) for idx, number, field_name, invalid, convert in columns]
+		return _FITDefinition(name, struct.Struct("".join(formats)), columns)
+
+	def Decode(self, data):
+		# Yields (message name, columns, count) for each run of messages - the data being the records between the file's header and CRC
+		# Nothing about the file's kept on the decoder, so the one can be shared between threads
+		definitions = {}
+		developer_types = {} # (developer data index, field number) -> (field name, type), from the field_description messages seen so far
+		last_timestamp = None
+		pos = 0
+		end = len(data)
+		while pos < end:
+			header = data[pos]
+			if header & 0x80:
+				# Compressed timestamp header
+				local_no = (header >> 5) & 0x3
+				same_run = lambda x: x & 0xE0 == header & 0xE0
+			elif header & 0x40:
+				# Definition message
+				local_no = header & 0xF
+				arch = data[pos + 2]
+				global_no = struct.unpack(">H" if arch else "<H", data[pos + 3:pos + 5])[0]
+				field_count = data[pos + 5]
+				fields = [tuple(data[pos + 6 + x * 3:pos + 9 + x * 3]) for x in range(field_count)]
+				pos += 6 + field_count * 3
+				developer_fields = []
+				if header & 0x20:
+					developer_count = data[pos]
+					developer_fields = [tuple(data[pos + 1 + x * 3:pos + 4 + x * 3]) for x in range(developer_count)]
+					pos += 1 + developer_count * 3
+				definitions[local_no] = self._define(arch, global_no, fields, developer_fields, developer_types)
+				continue
+			else:
+				local_no = header & 0xF
+				same_run = lambda x: x == header
+
+			if local_no not in definitions:
+				raise ValueError("FIT message with undefined local type %d" % local_no)
+			definition = definitions[local_no]
+			step = definition.Struct.size
+			run_end = pos + step
+			while run_end < end and same_run(data[run_end]):
+				run_end += step
+			if run_end > end:
+				raise ValueError("Truncated FIT message")
+			rows = list(zip(*[definition.Struct.unpack_from(data, x) for x in range(pos, run_end, step)]))
+			count = (run_end - pos) // step
+			pos = run_end
+
+			columns = {}
+			for idx, number, field_name, invalid, convert in definition.Columns:
+				values = rows[idx]
+				if number == FITMessageDecoder._timestampField:
+					last_timestamp = next((x for x in reversed(values) if x != invalid), last_timestamp)
+				if invalid is None:
+					values = [convert(x) for x in values] if convert else [None if x != x else x for x in values] # Strings sort themselves out, floats are invalid when NaN
+				elif convert:
+					values = [None if x == invalid else convert(x) for x in values]
 				else:
-					sanitized_value = kwargs[field_name]
-					if sanitized_value is None:
-						result = struct.pack("<" + field_type.PackFormat, field_type.InvalidValue)
-					else:
-						if field_type.PackFormat in ["B","b", "H", "h", "I", "i"]:
-							sanitized_value = round(sanitized_value)
-						try:
-							result = struct.pack("<" + field_type.PackFormat, sanitized_value)
-						except struct.error as e: # I guess more specific exception types were too much to ask for.
-							if "<=" in str(e) or "out of range" in str(e):
-								result = struct.pack("<" + field_type.PackFormat, field_type.InvalidValue)
-							else:
-								raise
-			except Exception as e:
-				raise Exception("Failed packing %s=%s - %s" % (field_name, kwargs[field_name], e))
-			packResult.append(result)
-		self._write(b''.join(packResult))
+					values = [None if x == invalid else x for x in values]
+				columns[field_name] = values
+			if header & 0x80:
+				if last_timestamp is None:
+					raise ValueError("FIT compressed timestamp without a reference timestamp")
+				timestamps = []
+				for record_header in rows[0]:
+					last_timestamp += ((record_header & 0x1F) - (last_timestamp & 0x1F)) & 0x1F
+					timestamps.append(FITMessageDecoder._epoch + timedelta(seconds=last_timestamp))
+				columns["timestamp"] = timestamps
+
+			if not definition.Name:
+				continue
+			if definition.Name == "field_description":
+				try:
+					for developer_index, number, base_type, field_name in zip(columns["developer_data_index"], columns["field_definition_number"], columns["fit_base_type_id"], columns["field_name"]):
+						if field_name and base_type is not None and base_type & 0x1F in self._baseTypes:
+							developer_types[(developer_index, number)] = (field_name, self._baseTypes[base_type & 0x1F])
+				except (KeyError, IndexError) as e:
+					raise ValueError("Malformed FIT field description - missing %s" % e)
+			yield definition.Name, columns, count
+
+class _FITDefinition:
+	def __init__(self, name, struct, columns):
+		self.Name = name
+		self.Struct = struct
+		self.Columns = columns # (index in the unpacked values, field number, field name, invalid value, converter)
 
 
 class FITIO:
@@ -374,16 +551,18 @@ class FITIO:
 	_subSportMap = {
 		# ActivityType.MountainBiking: 8 there's an issue with cadence upload and this type with GC, so...
 	}
+	def _crcTableEntry(byte):
+		# FIT's CRC is CRC-16 with the (reversed) 0xA001 polynomial - the SDK does it a nibble at a time, but a byte at a time is half the work
+		crc = byte
+		for x in range(8):
+			crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+		return crc
+	_crcTable = list(map(_crcTableEntry, range(256)))
+
 	def _calculateCRC(bytestring, crc=0):
-		crc_table = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401, 0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+		crc_table = FITIO._crcTable
 		for byte in bytestring:
-			tmp = crc_table[crc & 0xF]
-			crc = (crc >> 4) & 0x0FFF
-			crc = crc ^ tmp ^ crc_table[byte & 0xF]
-
-			tmp = crc_table[crc & 0xF]
-			crc = (crc >> 4) & 0x0FFF
-			crc = crc ^ tmp ^ crc_table[(byte >> 4) & 0xF]
+			crc = (crc >> 8) ^ crc_table[(crc ^ byte) & 0xFF]
 		return crc
 
 	def _generateHeader(dataLength):
@@ -394,10 +573,170 @@ class FITIO:
 		tag = ".FIT"
 		return struct.pack("<BBHI4s", header_len, protocolVer, profileVer, dataLength, tag.encode("ASCII"))
 
-	def Parse(raw_file):
-		raise Exception("Not implemented")
+	_sportParseMap = {
+		0: ActivityType.Other,
+		1: ActivityType.Running,
+		2: ActivityType.Cycling,
+		4: ActivityType.Elliptical,
+		5: ActivityType.Swimming,
+	}
 
-	def Dump(act, drop_pauses=False):
+	_decoder = None
+
+	def _parseStats(stats, message, idx, run_cadence):
+		# The inverse of Dump's _mapStat-ing, for laps and sessions alike
+		def value(field):
+			return message[field][idx] if field in message else None
+		stats.MovingTime.update(ActivityStatistic(ActivityStatisticUnit.Seconds, value=value("total_moving_time")))
+		stats.TimerTime.update(ActivityStatistic(ActivityStatisticUnit.Seconds, value=value("total_timer_time")))
+		stats.Distance.update(ActivityStatistic(ActivityStatisticUnit.Meters, value=value("total_distance")))
+		stats.Energy.update(ActivityStatistic(ActivityStatisticUnit.Kilocalories, value=value("total_calories")))
+		stats.Speed.update(ActivityStatistic(ActivityStatisticUnit.MetersPerSecond, avg=value("avg_speed"), max=value("max_speed")))
+		stats.HR.update(ActivityStatistic(ActivityStatisticUnit.BeatsPerMinute, avg=value("avg_heart_rate"), max=value("max_heart_rate")))
+		if run_cadence:
+			stats.RunCadence.update(ActivityStatistic(ActivityStatisticUnit.StepsPerMinute, avg=value("avg_cadence"), max=value("max_cadence")))
+		else:
+			stats.Cadence.update(ActivityStatistic(ActivityStatisticUnit.RevolutionsPerMinute, avg=value("avg_cadence"), max=value("max_cadence")))
+		stats.Power.update(ActivityStatistic(ActivityStatisticUnit.Watts, avg=value("avg_power"), max=value("max_power")))
+		stats.Elevation.update(ActivityStatistic(ActivityStatisticUnit.Meters, avg=value("avg_altitude"), max=value("max_altitude"), min=value("min_altitude"), gain=value("total_ascent"), loss=value("total_descent")))
+		stats.Temperature.update(ActivityStatistic(ActivityStatisticUnit.DegreesCelcius, avg=value("avg_temperature"), max=value("max_temperature")))
+
+	@SyncTrace.Traced("parse")
+	def Parse(raw_file, activity=None):
+		if len(raw_file) < 12 or raw_file[8:12] != b".FIT":
+			raise ValueError("Not a FIT file")
+		header_len = raw_file[0]
+		data_len = struct.unpack("<I", raw_file[4:8])[0]
+		data = memoryview(raw_file)[header_len:header_len + data_len]
+		if len(data) < data_len:
+			raise ValueError("Truncated FIT file")
+
+		if not FITIO._decoder:
+			FITIO._decoder = FITMessageDecoder()
+
+		act = activity if activity else Activity()
+		act.GPS = False
+		sessions = []
+		lap_messages = []
+		pending_waypoints = []
+		in_pause = False
+		resumed = False
+		try:
+			for name, message, count in FITIO._decoder.Decode(data):
+				if name == "record":
+					CPUBudget.Yield()
+					timestamps = message.get("timestamp", [None] * count)
+					lats = message.get("position_lat", [None] * count)
+					lngs = message.get("position_long", [None] * count)
+					# The enhanced fields take over where the originals run out of range
+					alts = [x if x is not None else y for x, y in zip(message["enhanced_altitude"], message.get("altitude", [None] * count))] if "enhanced_altitude" in message else message.get("altitude", [None] * count)
+					speeds = [x if x is not None else y for x, y in zip(message["enhanced_speed"], message.get("speed", [None] * count))] if "enhanced_speed" in message else message.get("speed", [None] * count)
+					for timestamp, lat, lng, alt, hr, cadence, distance, speed, power, temp, calories in zip(timestamps, lats, lngs, alts, message.get("heart_rate", [None] * count), message.get("cadence", [None] * count), message.get("distance", [None] * count), speeds, message.get("power", [None] * count), message.get("temperature", [None] * count), message.get("calories", [None] * count)):
+						if timestamp is None:
+							continue # Can't do anything with these
+						wp = Waypoint(timestamp, hr=hr, cadence=cadence, distance=distance, speed=speed, power=power, temp=temp, calories=calories)
+						if lat is not None and lng is not None:
+							wp.Location = Location(lat, lng, alt)
+							act.GPS = True
+						elif alt is not None:
+							wp.Location = Location(None, None, alt)
+						if in_pause:
+							wp.Type = WaypointType.Pause
+						elif resumed:
+							wp.Type = WaypointType.Resume
+							resumed = False
+						pending_waypoints.append(wp)
+				elif name == "event":
+					for event, event_type in zip(message.get("event", [None] * count), message.get("event_type", [None] * count)):
+						if event != FITEvent.Timer:
+							continue
+						if event_type == FITEventType.Start and in_pause:
+							in_pause = False
+							resumed = True
+						elif event_type in (FITEventType.Stop, FITEventType.StopAll):
+							in_pause = True
+				elif name == "lap":
+					for idx in range(count):
+						lap = Lap(startTime=message.get("start_time", [None] * count)[idx], endTime=message.get("timestamp", [None] * count)[idx])
+						if message.get("intensity", [None] * count)[idx] in (LapIntensity.Active, LapIntensity.Rest, LapIntensity.Warmup, LapIntensity.Cooldown):
+							lap.Intensity = message["intensity"][idx] # The enums match
+						if message.get("lap_trigger", [None] * count)[idx] in range(LapTriggerMethod.FitnessEquipment + 1):
+							lap.Trigger = message["lap_trigger"][idx]
+						lap.Waypoints = pending_waypoints
+						pending_waypoints = []
+						lap_messages.append((lap, message, idx))
+						act.Laps.append(lap)
+				elif name == "session":
+					sessions += [(message, idx) for idx in range(count)]
+				elif name == "activity":
+					local_timestamp = message.get("local_timestamp", [None])[0]
+					timestamp = message.get("timestamp", [None])[0]
+					if local_timestamp and timestamp:
+						# local_timestamp went through the same conversion as a UTC time - the difference is the UTC offset
+						act.FallbackTZ = pytz.FixedOffset(round((local_timestamp - timestamp).total_seconds() / 60))
+				elif name == "file_id":
+					if message.get("type", [None])[0] not in (None, FITFileType.Activity):
+						raise ValueError("FIT file is not an activity")
+				elif name == "device_info":
+					for idx in range(count):
+						if message.get("device_index", [None] * count)[idx] == 0 and message.get("manufacturer", [None] * count)[idx] is not None:
+							devId = DeviceIdentifier.FindMatchingIdentifierOfType(DeviceIdentifierType.FIT, {"Manufacturer": message["manufacturer"][idx], "Product": message.get("product", [None] * count)[idx]})
+							if devId:
+								version = message.get("software_version", [None] * count)[idx]
+								serial = message.get("serial_number", [None] * count)[idx]
+								act.Device = Device(devId, serial, verMaj=int(version) if version is not None else None, verMin=round(version * 100) % 100 if version is not None else None)
+		except (struct.error, IndexError) as e:
+			raise ValueError("Corrupt FIT file - %s" % e)
+
+		session, session_idx = sessions[0] if len(sessions) else ({}, 0)
+		sport = session.get("sport", [None])[session_idx] if session else None
+		if not act.Type or act.Type == ActivityType.Other:
+			act.Type = FITIO._sportParseMap.get(sport, ActivityType.Other)
+		run_cadence = act.Type in [ActivityType.Running, ActivityType.Walking, ActivityType.Hiking]
+
+		if pending_waypoints:
+			# Records after the last lap message - give them a lap of their own
+			lap = Lap(startTime=pending_waypoints[0].Timestamp, endTime=pending_waypoints[-1].Timestamp, waypointList=pending_waypoints)
+			act.Laps.append(lap)
+		for lap, message, idx in lap_messages:
+			FITIO._parseStats(lap.Stats, message, idx, run_cadence=run_cadence)
+		for lap in act.Laps:
+			if run_cadence:
+				for wp in lap.Waypoints:
+					wp.RunCadence, wp.Cadence = wp.Cadence, None
+			if lap.StartTime is None:
+				lap.StartTime = lap.Waypoints[0].Timestamp if len(lap.Waypoints) else session.get("start_time", [None])[session_idx] if session else None
+			if lap.EndTime is None:
+				lap.EndTime = lap.Waypoints[-1].Timestamp if len(lap.Waypoints) else lap.StartTime
+
+		if session:
+			FITIO._parseStats(act.Stats, session, session_idx, run_cadence=run_cadence)
+		act.StartTime = act.Laps[0].StartTime if len(act.Laps) else (session.get("start_time", [None])[session_idx] if session else None)
+		act.EndTime = act.Laps[-1].EndTime if len(act.Laps) else (session.get("timestamp", [None])[session_idx] if session else None)
+		if act.StartTime is None:
+			raise ValueError("FIT file has no start time")
+
+		if act.CountTotalWaypoints():
+			act.Stationary = False
+			act.GetFlatWaypoints()[0].Type = WaypointType.Start
+			act.GetFlatWaypoints()[-1].Type = WaypointType.End
+		else:
+			act.Stationary = True
+		if len(act.Laps) == 1:
+			act.Laps[0].Stats.update(act.Stats) # The session's authorative
+			act.Stats = act.Laps[0].Stats
+		elif len(act.Laps):
+			sum_stats = ActivityStatistics() # Blank
+			for lap in act.Laps:
+				sum_stats.sumWith(lap.Stats)
+			sum_stats.update(act.Stats)
+			act.Stats = sum_stats
+
+		act.CalculateUID()
+		return act
+
+	@SyncTrace.Traced("dump")
+	def Dump(act, drop_pauses=False, compress_timestamps=False):
 		def toUtc(ts):
 			if ts.tzinfo:
 				return ts.astimezone(pytz.utc).replace(tzinfo=None)
@@ -479,40 +818,45 @@ class FITIO:
 		_mapStat(session_stats, "avg_temperature", act.Stats.Temperature.asUnits(ActivityStatisticUnit.DegreesCelcius).Average)
 		_mapStat(session_stats, "max_temperature", act.Stats.Temperature.asUnits(ActivityStatisticUnit.DegreesCelcius).Max)
 
+		# Every record gets the same fields, whether or not that waypoint has a value for each - so they can be packed in bulk
+		record_fields = [
+			("timestamp", lambda wp: wp.Timestamp if wp.Timestamp.tzinfo else toUtc(wp.Timestamp)), # toUtc's only there to complain about naive ones
+			("position_lat", lambda wp: wp.Location.Latitude if wp.Location else None),
+			("position_long", lambda wp: wp.Location.Longitude if wp.Location else None),
+			("altitude", lambda wp: wp.Location.Altitude if wp.Location else None),
+			("heart_rate", lambda wp: wp.HR),
+			("cadence", lambda wp: wp.Cadence if wp.Cadence is not None else wp.RunCadence),
+			("power", lambda wp: wp.Power),
+			("temperature", lambda wp: wp.Temp),
+			("calories", lambda wp: wp.Calories),
+			("distance", lambda wp: wp.Distance),
+			("speed", lambda wp: wp.Speed),
+		]
+		all_waypoints = act.GetFlatWaypoints()
+		record_fields = [(name, getter) for name, getter in record_fields if name == "timestamp" or any(getter(wp) is not None for wp in all_waypoints)]
+		def _generateRecords(waypoints):
+			if len(waypoints):
+				fmg.GenerateMessages("record", dict((name, [getter(wp) for wp in waypoints]) for name, getter in record_fields), compress_timestamps=compress_timestamps)
+
 		inPause = False
 		for lap in act.Laps:
+			records = [] # The waypoints since the last event
 			for wp in lap.Waypoints:
+				CPUBudget.Yield()
 				if wp.Type == WaypointType.Resume and inPause:
+					_generateRecords(records)
+					records = []
 					fmg.GenerateMessage("event", timestamp=toUtc(wp.Timestamp), event=FITEvent.Timer, event_type=FITEventType.Start)
 					inPause = False
 				elif wp.Type == WaypointType.Pause and not inPause:
+					_generateRecords(records)
+					records = []
 					fmg.GenerateMessage("event", timestamp=toUtc(wp.Timestamp), event=FITEvent.Timer, event_type=FITEventType.Stop)
 					inPause = True
 				if inPause and drop_pauses:
 					continue
-
-				rec_contents = {"timestamp": toUtc(wp.Timestamp)}
-				if wp.Location:
-					rec_contents.update({"position_lat": wp.Location.Latitude, "position_long": wp.Location.Longitude})
-					if wp.Location.Altitude is not None:
-						rec_contents.update({"altitude": wp.Location.Altitude})
-				if wp.HR is not None:
-					rec_contents.update({"heart_rate": wp.HR})
-				if wp.RunCadence is not None:
-					rec_contents.update({"cadence": wp.RunCadence})
-				if wp.Cadence is not None:
-					rec_contents.update({"cadence": wp.Cadence})
-				if wp.Power is not None:
-					rec_contents.update({"power": wp.Power})
-				if wp.Temp is not None:
-					rec_contents.update({"temperature": wp.Temp})
-				if wp.Calories is not None:
-					rec_contents.update({"calories": wp.Calories})
-				if wp.Distance is not None:
-					rec_contents.update({"distance": wp.Distance})
-				if wp.Speed is not None:
-					rec_contents.update({"speed": wp.Speed})
-				fmg.GenerateMessage("record", **rec_contents)
+				records.append(wp)
+			_generateRecords(records)
 			# Man, I love copy + paste and multi-cursor editing
 			# But seriously, I'm betting that, some time down the road, a stat will pop up in X but not in Y, so I won't feel so bad about the C&P abuse
 			lap_stats = {}
@@ -1,10 +1,12 @@
 from lxml import etree
 from pytz import UTC
-import copy
-import dateutil.parser
+import io
 from datetime import datetime
 from .interchange import WaypointType, Activity, Waypoint, Location, Lap, ActivityStatistic, ActivityStatisticUnit
 from .statistic_calculator import ActivityStatisticCalculator
+from .cpu_budget import CPUBudget
+from .tracing import SyncTrace
+from .timestamps import parse_timestamp
 
 class GPXIO:
     Namespaces = {
@@ -14,84 +16,95 @@ class GPXIO:
         "gpxext": "http://www.garmin.com/xmlschemas/GpxExtensions/v3"
     }
 
-    def Parse(gpxData, suppress_validity_errors=False, activity=None):
-        ns = copy.deepcopy(GPXIO.Namespaces)
-        ns["gpx"] = ns[None]
-        del ns[None]
+    # The only elements Parse needs to hear about - whatever version of the schema they're from
+    _streamedTags = ["{*}gpx", "{*}metadata", "{*}trk", "{*}trkseg", "{*}trkpt"]
+
+    @SyncTrace.Traced("parse")
+    def Parse(gpxData, suppress_validity_errors=False, activity=None, summary_only=False):
+        # Streams through the file, building each lap up as it goes and throwing away the XML behind it.
+        # With summary_only, the laps get only their start/end times, and the activity only its first waypoint (for the TZ lookup) - and no distance.
+        #  Every point's timestamp is still read, since the start/end (hence the UID) are the earliest/latest, and the listing has to agree with the download.
         act = Activity() if not activity else activity
 
         act.GPS = True # All valid GPX files have GPS data
 
-        try:
-            root = etree.XML(gpxData)
-        except:
-            root = etree.fromstring(gpxData)
-
-        # GPSBabel produces files with the GPX/1/0 schema - I have no clue what's new in /1
-        # So, blindly accept whatever we're given!
-        ns["gpx"] = root.nsmap[None]
+        if isinstance(gpxData, str):
+            gpxData = gpxData.encode("utf-8")
+
+        root = None
+        gpx = None
+        xtrk = None # Only the first track is read
+        xtrkseg = None
+        lap = None
+        lapStartTime = None
+        lapEndTime = None
+        pointCount = 0
+        startTime = None
+        endTime = None
 
-        xmeta = root.find("gpx:metadata", namespaces=ns)
-        if xmeta is not None:
-            xname = xmeta.find("gpx:name", namespaces=ns)
-            if xname is not None:
-                act.Name = xname.text
-        xtrk = root.find("gpx:trk", namespaces=ns)
+        for event, elem in etree.iterparse(io.BytesIO(gpxData), events=("start", "end"), tag=GPXIO._streamedTags):
+            if root is None:
+                root = elem
+                while root.getparent() is not None:
+                    root = root.getparent()
+                # GPSBabel produces files with the GPX/1/0 schema - I have no clue what's new in /1
+                # So, blindly accept whatever we're given!
+                gpx = "{%s}" % root.nsmap[None]
+            tag = elem.tag
+            if event == "start":
+                if tag == gpx + "trk" and xtrk is None and elem.getparent() is root:
+                    xtrk = elem
+                elif tag == gpx + "trkseg" and xtrk is not None and elem.getparent() is xtrk:
+                    xtrkseg = elem
+                    lap = Lap()
+                    lapStartTime = None
+                    lapEndTime = None
+                continue
+
+            if tag == gpx + "trkpt":
+                if xtrkseg is not None and elem.getparent() is xtrkseg:
+                    CPUBudget.Yield()
+                    if not summary_only or not pointCount:
+                        wp = GPXIO._parseTrackpoint(elem, gpx)
+                        lap.Waypoints.append(wp)
+                        timestamp = wp.Timestamp
+                    else:
+                        timeEl = elem.find(gpx + "time")
+                        if timeEl is None:
+                            raise ValueError("Trackpoint without timestamp")
+                        timestamp = parse_timestamp(timeEl.text)
+                    pointCount += 1
+                    lapStartTime = lapStartTime if lapStartTime is not None else timestamp
+                    lapEndTime = timestamp
+                    if startTime is None or timestamp < startTime:
+                        startTime = timestamp
+                    if endTime is None or timestamp > endTime:
+                        endTime = timestamp
+                # Done with it - and with the ones before it
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+            elif elem is xtrkseg:
+                act.Laps.append(lap)
+                if lapStartTime is None and not suppress_validity_errors:
+                    raise ValueError("Track segment without points")
+                elif lapStartTime is not None:
+                    lap.StartTime = lapStartTime
+                    lap.EndTime = lapEndTime
+                xtrkseg = None
+                elem.clear()
+            elif tag == gpx + "metadata" and elem.getparent() is root:
+                xname = elem.find(gpx + "name")
+                if xname is not None:
+                    act.Name = xname.text
 
         if xtrk is None:
             raise ValueError("Invalid GPX")
 
-        xtrksegs = xtrk.findall("gpx:trkseg", namespaces=ns)
-        startTime = None
-        endTime = None
-
-        for xtrkseg in xtrksegs:
-            lap = Lap()
-            for xtrkpt in xtrkseg.findall("gpx:trkpt", namespaces=ns):
-                wp = Waypoint()
-
-                wp.Timestamp = dateutil.parser.parse(xtrkpt.find("gpx:time", namespaces=ns).text)
-                wp.Timestamp.replace(tzinfo=UTC)
-                if startTime is None or wp.Timestamp < startTime:
-                    startTime = wp.Timestamp
-                if endTime is None or wp.Timestamp > endTime:
-                    endTime = wp.Timestamp
-
-                wp.Location = Location(float(xtrkpt.attrib["lat"]), float(xtrkpt.attrib["lon"]), None)
-                eleEl = xtrkpt.find("gpx:ele", namespaces=ns)
-                if eleEl is not None:
-                    wp.Location.Altitude = float(eleEl.text)
-                extEl = xtrkpt.find("gpx:extensions", namespaces=ns)
-                if extEl is not None:
-                    gpxtpxExtEl = extEl.find("gpxtpx:TrackPointExtension", namespaces=ns)
-                    if gpxtpxExtEl is not None:
-                        hrEl = gpxtpxExtEl.find("gpxtpx:hr", namespaces=ns)
-                        if hrEl is not None:
-                            wp.HR = float(hrEl.text)
-                        cadEl = gpxtpxExtEl.find("gpxtpx:cad", namespaces=ns)
-                        if cadEl is not None:
-                            wp.Cadence = float(cadEl.text)
-                        tempEl = gpxtpxExtEl.find("gpxtpx:atemp", namespaces=ns)
-                        if tempEl is not None:
-                            wp.Temp = float(tempEl.text)
-                    gpxdataHR = extEl.find("gpxdata:hr", namespaces=ns)
-                    if gpxdataHR is not None:
-                        wp.HR = float(gpxdataHR.text)
-                    gpxdataCadence = extEl.find("gpxdata:cadence", namespaces=ns)
-                    if gpxdataCadence is not None:
-                        wp.Cadence = float(gpxdataCadence.text)
-                lap.Waypoints.append(wp)
-            act.Laps.append(lap)
-            if not len(lap.Waypoints) and not suppress_validity_errors:
-                raise ValueError("Track segment without points")
-            elif len(lap.Waypoints):
-                lap.StartTime = lap.Waypoints[0].Timestamp
-                lap.EndTime = lap.Waypoints[-1].Timestamp
-
         if not len(act.Laps) and not suppress_validity_errors:
             raise ValueError("File with no track segments")
 
-        if act.CountTotalWaypoints():
+        if pointCount and not summary_only:
             act.GetFlatWaypoints()[0].Type = WaypointType.Start
             act.GetFlatWaypoints()[-1].Type = WaypointType.End
             act.Stats.Distance = ActivityStatistic(ActivityStatisticUnit.Meters, value=ActivityStatisticCalculator.CalculateDistance(act))
@@ -108,6 +121,41 @@ class GPXIO:
         act.CalculateUID()
         return act
 
+    def _parseTrackpoint(xtrkpt, gpx):
+        wp = Waypoint()
+        timeEl = xtrkpt.find(gpx + "time")
+        if timeEl is None:
+            raise ValueError("Trackpoint without timestamp")
+        wp.Timestamp = parse_timestamp(timeEl.text)
+
+        wp.Location = Location(float(xtrkpt.attrib["lat"]), float(xtrkpt.attrib["lon"]), None)
+        eleEl = xtrkpt.find(gpx + "ele")
+        if eleEl is not None:
+            wp.Location.Altitude = float(eleEl.text)
+        extEl = xtrkpt.find(gpx + "extensions")
+        if extEl is not None:
+            gpxtpx = "{%s}" % GPXIO.Namespaces["gpxtpx"]
+            gpxdata = "{%s}" % GPXIO.Namespaces["gpxdata"]
+            gpxtpxExtEl = extEl.find(gpxtpx + "TrackPointExtension")
+            if gpxtpxExtEl is not None:
+                hrEl = gpxtpxExtEl.find(gpxtpx + "hr")
+                if hrEl is not None:
+                    wp.HR = float(hrEl.text)
+                cadEl = gpxtpxExtEl.find(gpxtpx + "cad")
+                if cadEl is not None:
+                    wp.Cadence = float(cadEl.text)
+                tempEl = gpxtpxExtEl.find(gpxtpx + "atemp")
+                if tempEl is not None:
+                    wp.Temp = float(tempEl.text)
+            gpxdataHR = extEl.find(gpxdata + "hr")
+            if gpxdataHR is not None:
+                wp.HR = float(gpxdataHR.text)
+            gpxdataCadence = extEl.find(gpxdata + "cadence")
+            if gpxdataCadence is not None:
+                wp.Cadence = float(gpxdataCadence.text)
+        return wp
+
+    @SyncTrace.Traced("dump")
     def Dump(activity):
         GPXTPX = "{" + GPXIO.Namespaces["gpxtpx"] + "}"
         root = etree.Element("gpx", nsmap=GPXIO.Namespaces)
@@ -124,6 +172,7 @@ class GPXIO:
         for lap in activity.Laps:
             trkseg = etree.SubElement(trk, "trkseg")
             for wp in lap.Waypoints:
+                CPUBudget.Yield()
                 if wp.Location is None or wp.Location.Latitude is None or wp.Location.Longitude is None:
                     continue  # drop the point
                 if wp.Type == WaypointType.Pause:
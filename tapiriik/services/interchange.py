@@ -1,6 +1,7 @@
 from datetime import timedelta, datetime
 from tapiriik.database import cachedb
 from tapiriik.database.tz import TZLookup
+from .tracing import SyncTrace
 import hashlib
 import pytz
 
@@ -91,13 +92,11 @@ class Activity:
         return [wp for waypoints in [x.Waypoints for x in self.Laps] for wp in waypoints]
 
     def GetFirstWaypointWithLocation(self):
-        loc_wp = None
         for lap in self.Laps:
             for wp in lap.Waypoints:
                 if wp.Location is not None and wp.Location.Latitude is not None and wp.Location.Longitude is not None:
-                    loc_wp = wp.Location
-                    break
-        return loc_wp
+                    return wp.Location
+        return None
 
     def DefineTZ(self):
         """ run localize() on all contained dates to tag them with the activity TZ (doesn't change values) """
@@ -154,6 +153,7 @@ class Activity:
             self.TZ = pytz.timezone(cachedTzData["TZ"])
         return self.TZ
 
+    @SyncTrace.Traced("tz")
     def EnsureTZ(self, recalculate=False):
         self.CalculateTZ(recalculate=recalculate)
         if self.StartTime.tzinfo is None:
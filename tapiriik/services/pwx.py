@@ -3,6 +3,8 @@ import copy
 import dateutil.parser
 from datetime import timedelta
 from .interchange import WaypointType, ActivityType, Activity, Waypoint, Location, Lap, ActivityStatistic, ActivityStatisticUnit
+from .cpu_budget import CPUBudget
+from .tracing import SyncTrace
 
 class PWXIO:
     Namespaces = {
@@ -33,6 +35,7 @@ class PWXIO:
         ActivityType.Other: "Other",
     }
 
+    @SyncTrace.Traced("parse")
     def Parse(pwxData, activity=None):
         ns = copy.deepcopy(PWXIO.Namespaces)
         ns["pwx"] = ns[None]
@@ -139,6 +142,7 @@ class PWXIO:
 
         currentLapIdx = 0
         for xsample in xsamples:
+            CPUBudget.Yield()
             wp = Waypoint()
             wp.Timestamp = activity.StartTime + timedelta(seconds=float(xsample.find("pwx:timeoffset", namespaces=ns).text))
 
@@ -190,6 +194,7 @@ class PWXIO:
                 activity.EndTime = flatWp[-1].Timestamp
         return activity
 
+    @SyncTrace.Traced("dump")
     def Dump(activity):
         xroot = etree.Element("pwx", nsmap=PWXIO.Namespaces)
 
@@ -261,6 +266,7 @@ class PWXIO:
             _writeSummaryData(xsegment, lap, time_ref=activity.StartTime)
 
         for wp in activity.GetFlatWaypoints():
+            CPUBudget.Yield()
             xsample = etree.SubElement(xworkout, "sample")
             etree.SubElement(xsample, "timeoffset").text = str((wp.Timestamp - activity.StartTime).total_seconds())
 
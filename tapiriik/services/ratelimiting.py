@@ -1,33 +1,142 @@
-from tapiriik.database import ratelimit as rl_db
-from pymongo.read_preferences import ReadPreference
+from tapiriik.database import redis
 from datetime import datetime, timedelta
-import math
+import threading
+import time
 
 class RateLimitExceededException(Exception):
 	pass
 
+class _LocalWindows:
+	# Only good within this process - for tests, and setups without Redis
+	def __init__(self, clock=time.time):
+		self._lock = threading.Lock()
+		self._clock = clock
+		self._logs = {}
+
+	def Take(self, windows, count=1, peek=False):
+		# windows is [(key, max-count, timespan in seconds),...] - logs count requests against each if they all have room, otherwise returns how long until they would
+		# With peek, nothing's logged either way
+		now = self._clock()
+		with self._lock:
+			wait = 0
+			for key, capacity, span in windows:
+				log = self._logs.setdefault(key, [])
+				while len(log) and log[0] <= now - span:
+					log.pop(0)
+				excess = len(log) + min(count, capacity) - capacity
+				if excess > 0:
+					# Room once the excess-th oldest has aged out
+					wait = max(wait, log[excess - 1] + span - now)
+			if wait > 0 or peek:
+				return wait
+			for key, capacity, span in windows:
+				self._logs[key] += [now] * min(count, capacity)
+			return 0
+
+class _RedisWindows:
+	# The same thing as _LocalWindows, done atomically in Redis so every worker on every host shares the logs - each is a ZSET of request times
+	# The server's clock is used throughout, so the hosts' clocks don't need to agree
+	_script = """
+	if redis.replicate_commands then redis.replicate_commands() end
+	local time = redis.call("TIME")
+	local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+	local count = tonumber(ARGV[1])
+	local peek = ARGV[2] == "1"
+	local wait = 0
+	for i, key in ipairs(KEYS) do
+		local capacity = tonumber(ARGV[i * 2 + 1])
+		local span = tonumber(ARGV[i * 2 + 2])
+		redis.call("ZREMRANGEBYSCORE", key, "-inf", tostring(now - span))
+		local excess = redis.call("ZCARD", key) + math.min(count, capacity) - capacity
+		if excess > 0 then
+			local oldest = redis.call("ZRANGE", key, excess - 1, excess - 1, "WITHSCORES")
+			wait = math.max(wait, tonumber(oldest[2]) + span - now)
+		end
+	end
+	if wait > 0 or peek then
+		return tostring(wait)
+	end
+	for i, key in ipairs(KEYS) do
+		local capacity = tonumber(ARGV[i * 2 + 1])
+		local span = tonumber(ARGV[i * 2 + 2])
+		-- Members need to be unique, even for requests logged in the same microsecond
+		local seq = redis.call("INCRBY", key .. ":seq", math.min(count, capacity))
+		for j = 1, math.min(count, capacity) do
+			redis.call("ZADD", key, tostring(now), tostring(seq - j))
+		end
+		-- Once everything in it has aged out, it may as well not exist
+		redis.call("PEXPIRE", key, math.ceil(span * 1000) + 1000)
+		redis.call("PEXPIRE", key .. ":seq", math.ceil(span * 1000) + 1000)
+	end
+	return "0"
+	"""
+
+	def __init__(self, redis):
+		self._take = redis.register_script(self._script)
+
+	def Take(self, windows, count=1, peek=False):
+		args = [count, "1" if peek else "0"]
+		for key, capacity, span in windows:
+			args += [capacity, repr(span)]
+		return float(self._take(keys=[x[0] for x in windows], args=args))
+
 class RateLimit:
-	def Limit(key):
-		current_limits = rl_db.limits.find({"Key": key}, {"Max": 1, "Count": 1})
-		for limit in current_limits:
-			if limit["Max"] < limit["Count"]:
-				# We can't continue without exceeding this limit
-				# Don't want to halt the synchronization worker to wait for 15min-1 hour
-				# So...
-				raise RateLimitExceededException()
-		rl_db.limits.update({"Key": key}, {"$inc": {"Count": 1}}, multi=True)
+	# Sliding-window logs, one per (key, timespan) - the time of every request in the last timespan is kept, and a request is only let through if there've been fewer than max-count.
+	# So the limit holds over any timespan-long stretch, not just between window boundaries - there's no burst at the start of one on top of the tail of the last.
+	# Keys are whatever needs limiting: a service's API key (its ID, via ServiceBase._globalRateLimit), an account, a source address...
 
-	def Refresh(key, limits):
+	Backend = _RedisWindows(redis) if redis else _LocalWindows()
+
+	def _windows(key, limits):
 		# Limits is in format [(timespan, max-count),...]
-		# The windows are anchored at midnight
-		# The timespan is used to uniquely identify limit instances between runs
-		midnight = datetime.combine(datetime.utcnow().date(), datetime.min.time())
-		time_since_midnight = (datetime.utcnow() - midnight)
-
-		rl_db.limits.remove({"Key": key, "Expires": {"$lt": datetime.utcnow()}})
-		current_limits = list(rl_db.limits.with_options(read_preference=ReadPreference.PRIMARY).find({"Key": key}, {"Duration": 1}))
-		missing_limits = [x for x in limits if x[0].total_seconds() not in [limit["Duration"] for limit in current_limits]]
-		for limit in missing_limits:
-			window_start = midnight + timedelta(seconds=math.floor(time_since_midnight.total_seconds()/limit[0].total_seconds()) * limit[0].total_seconds())
-			window_end = window_start + limit[0]
-			rl_db.limits.insert({"Key": key, "Count": 0, "Duration": limit[0].total_seconds(), "Max": limit[1], "Expires": window_end})
+		return [("ratelimit-log:%s:%d" % (key, limit[0].total_seconds()), limit[1], limit[0].total_seconds()) for limit in limits]
+
+	def Acquire(key, limits, timeout=None):
+		# Blocks until a request can be made within all the limits, as long as that's less than timeout seconds away (None = however long it takes)
+		# If it isn't, raises RateLimitExceededException right away rather than sleeping on it
+		if not len(limits):
+			return
+		windows = RateLimit._windows(key, limits)
+		deadline = time.time() + timeout if timeout is not None else None
+		while True:
+			wait = RateLimit.Backend.Take(windows)
+			if wait <= 0:
+				return
+			if deadline is not None and time.time() + wait > deadline:
+				raise RateLimitExceededException()
+			time.sleep(wait)
+
+	def Wait(key, limits, count=1):
+		# How many seconds until count requests could be made (without actually making them)
+		if not len(limits):
+			return 0
+		return RateLimit.Backend.Take(RateLimit._windows(key, limits), count=count, peek=True)
+
+	def Limit(key, limits):
+		# Don't want to halt the synchronization worker to wait for 15min-1 hour
+		# So, this never waits
+		RateLimit.Acquire(key, limits, timeout=0)
+
+class ApiUsage:
+	# Hourly tallies of the requests made against each service's global rate limits, for the sync scheduler's budgeting (tapiriik.sync.budget)
+	# Only kept in Redis - there's nothing to add up across processes otherwise
+
+	def _key(kind, service_id, hour):
+		return "api-%s:%s:%s" % (kind, service_id, hour.strftime("%Y%m%d%H"))
+
+	def Record(service_id, kind="usage", count=1):
+		if not redis:
+			return
+		key = ApiUsage._key(kind, service_id, datetime.utcnow())
+		pipeline = redis.pipeline()
+		pipeline.incrby(key, count)
+		pipeline.expire(key, 60 * 60 * 48)
+		pipeline.execute()
+
+	def Total(service_id, hours=1, kind="usage"):
+		# Over the last however many hours, counting this one
+		if not redis:
+			return 0
+		now = datetime.utcnow()
+		counts = redis.mget([ApiUsage._key(kind, service_id, now - timedelta(hours=x)) for x in range(hours)])
+		return sum(int(x) for x in counts if x)
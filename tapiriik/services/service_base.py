@@ -1,5 +1,7 @@
-from tapiriik.services.ratelimiting import RateLimit, RateLimitExceededException
+from tapiriik.services.ratelimiting import RateLimit, RateLimitExceededException, ApiUsage
 from tapiriik.services.api import ServiceException, UserExceptionType, UserException
+import math
+import time
 
 class ServiceAuthenticationType:
     OAuth = "oauth"
@@ -54,6 +56,9 @@ class ServiceBase:
     PartialSyncTriggerPollInterval = None
     # How many times to call the polling method per interval (this is for the multiple_index kwarg)
     PartialSyncTriggerPollMultiple = 1
+    # How far apart periodic syncs can be stretched for quiet users (None = Sync.MaximumSyncInterval)
+    # Services that tell us when there's something new can afford to be checked on less often
+    MaximumSyncInterval = None
 
     # How many times should we try each operation on an activity before giving up?
     # (only ever tries once per sync run - so ~1 hour interval on average)
@@ -63,6 +68,12 @@ class ServiceBase:
     # Global rate limiting options
     # For when there's a limit on the API key itself
     GlobalRateLimits = []
+    # Whether the provider counts those in fixed windows that reset at multiples of each timespan since the epoch (i.e. on the quarter-hour, at midnight UTC...)
+    GlobalRateLimitsAligned = False
+
+    # How many activity listings may be retrieved from this service at once within a single worker process (None = no limit)
+    # Listings are retrieved concurrently during synchronization, so this keeps the per-process rate limiting sane
+    ListingConcurrencyLimit = None
 
     @property
     def PartialSyncTriggerRequiresPolling(self):
@@ -105,6 +116,10 @@ class ServiceBase:
     def UploadActivity(self, serviceRecord, activity):
         raise NotImplementedError
 
+    # Formats UploadActivity will take from activity.PrerenderedFormats if they're there (see tapiriik.sync.prerender) - so they're only rendered once for all the destinations using them
+    def PrerenderFormats(self, serviceRecord, activity):
+        return []
+
     def DeleteActivity(self, serviceRecord, uploadId):
         raise NotImplementedError
 
@@ -145,9 +160,31 @@ class ServiceBase:
     def ConfigurationUpdating(self, serviceRecord, newConfig, oldConfig):
         pass
 
+    def GlobalRateLimitWait(self, requests=1):
+        # Seconds until the global rate limits would allow this many requests
+        return RateLimit.Wait(self.ID, self.GlobalRateLimits, count=requests)
+
+    def GlobalRateLimitReset(self, requests=1):
+        # Seconds until it's worth trying this many requests again, once rate limited - our own count says when there'll be room (GlobalRateLimitWait),
+        #  but if the provider's windows are aligned, it won't have reset before the end of the one that's full, either
+        # (which, if it was the provider that turned us away rather than our count, is taken to be the shortest)
+        wait = self.GlobalRateLimitWait(requests)
+        if not self.GlobalRateLimitsAligned or not len(self.GlobalRateLimits):
+            return wait
+        full = [limit for limit in self.GlobalRateLimits if RateLimit.Wait(self.ID, [limit], count=requests)] or [min(self.GlobalRateLimits)]
+        now = time.time()
+        for span, count in full:
+            span = span.total_seconds()
+            wait = max(wait, math.floor(now / span + 1) * span - now)
+        return wait
+
     def _globalRateLimit(self):
+        # Call before each request that counts against GlobalRateLimits
+        if not len(self.GlobalRateLimits):
+            return
         try:
-            RateLimit.Limit(self.ID)
+            RateLimit.Limit(self.ID, self.GlobalRateLimits)
         except RateLimitExceededException:
             raise ServiceException("Global rate limit reached", user_exception=UserException(UserExceptionType.RateLimited))
+        ApiUsage.Record(self.ID)
 
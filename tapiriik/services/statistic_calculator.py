@@ -1,5 +1,6 @@
 from datetime import timedelta
 from .interchange import WaypointType
+from .cpu_budget import CPUBudget
 
 class ActivityStatisticCalculator:
     ImplicitPauseTime = timedelta(minutes=1, seconds=5)
@@ -18,6 +19,7 @@ class ActivityStatisticCalculator:
             endWpt = flatWaypoints[-1]
 
         for x in range(flatWaypoints.index(startWpt), flatWaypoints.index(endWpt) + 1):
+            CPUBudget.Yield()
             timeDelta = flatWaypoints[x].Timestamp - lastTimestamp if lastTimestamp else None
             lastTimestamp = flatWaypoints[x].Timestamp
 
@@ -1,10 +1,13 @@
 from lxml import etree
 from pytz import UTC
 import copy
-import dateutil.parser
+import io
 from datetime import timedelta
 from .interchange import WaypointType, Activity, ActivityStatistic, ActivityStatistics, ActivityStatisticUnit, ActivityType, Waypoint, Location, Lap, LapIntensity, LapTriggerMethod
 from .devices import DeviceIdentifier, DeviceIdentifierType, Device
+from .cpu_budget import CPUBudget
+from .tracing import SyncTrace
+from .timestamps import parse_timestamp
 
 
 class TCXIO:
@@ -17,213 +20,141 @@ class TCXIO:
         "xsi": "http://www.w3.org/2001/XMLSchema-instance"
     }
 
-    def Parse(tcxData, act=None):
+    # Fully-qualified tags, for comparing against while streaming
+    _tcx = "{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}"
+    _tpx = "{http://www.garmin.com/xmlschemas/ActivityExtension/v2}"
+
+    # The only elements Parse needs to hear about - the rest are read from these once they're complete
+    _streamedTags = [_tcx + "Activities", _tcx + "Activity", _tcx + "Lap", _tcx + "Track", _tcx + "Trackpoint", _tcx + "Author"]
+
+    def _isTopLevel(elem):
+        return elem.getparent() is not None and elem.getparent().getparent() is None
+
+    def _parseNamespaces():
         ns = copy.deepcopy(TCXIO.Namespaces)
         ns["tcx"] = ns[None]
         del ns[None]
+        return ns
+
+    @SyncTrace.Traced("parse")
+    def Parse(tcxData, act=None, summary_only=False):
+        # Streams through the file, building each lap up as it goes and throwing away the XML behind it - multi-hour files used to cost tens of MB as a full tree.
+        # With summary_only, the laps get their stats and start/end times but no waypoints (besides the first, and the first with a location, for the TZ lookup) - which is all a listing needs.
+        ns = TCXIO._parseNamespaces()
+        tcx = TCXIO._tcx
 
         act = act if act else Activity()
 
         act.GPS = False
 
-        try:
-            root = etree.XML(tcxData)
-        except:
-            root = etree.fromstring(tcxData)
+        if isinstance(tcxData, str):
+            tcxData = tcxData.encode("utf-8")
+
+        xacts = None
+        xact = None # Only the first activity in the file is read
+        xlap = None
+        lap = None
+        xtrkseg = None
+        lapTrackSeen = False
+        lastTimestamp = None
+        trackpointCount = 0
+        locatedWaypointKept = False
+        for event, elem in etree.iterparse(io.BytesIO(tcxData), events=("start", "end"), tag=TCXIO._streamedTags):
+            tag = elem.tag
+            if event == "start":
+                if tag == tcx + "Activities" and TCXIO._isTopLevel(elem):
+                    xacts = elem
+                elif tag == tcx + "Activity" and xact is None and xacts is not None and elem.getparent() is xacts:
+                    xact = elem
+                    if not act.Type or act.Type == ActivityType.Other:
+                        if xact.attrib["Sport"] == "Biking":
+                            act.Type = ActivityType.Cycling
+                        elif xact.attrib["Sport"] == "Running":
+                            act.Type = ActivityType.Running
+                elif tag == tcx + "Lap" and xact is not None and elem.getparent() is xact:
+                    xlap = elem
+                    lap = Lap()
+                    act.Laps.append(lap)
+                    lap.StartTime = parse_timestamp(xlap.attrib["StartTime"])
+                    lapTrackSeen = False
+                    lastTimestamp = None
+                elif tag == tcx + "Track" and xlap is not None and elem.getparent() is xlap and not lapTrackSeen:
+                    # Only the first - not sure what to make of laps with more than one
+                    xtrkseg = elem
+                continue
 
+            if tag == tcx + "Trackpoint":
+                if xtrkseg is not None and elem.getparent() is xtrkseg:
+                    CPUBudget.Yield()
+                    trackpointCount += 1
+                    if not summary_only or (not locatedWaypointKept and (trackpointCount == 1 or elem.find(tcx + "Position") is not None)):
+                        wp = TCXIO._parseTrackpoint(elem)
+                        if wp.Location and wp.Location.Latitude is not None:
+                            act.GPS = True
+                            locatedWaypointKept = True
+                        lap.Waypoints.append(wp)
+                        lastTimestamp = wp.Timestamp
+                    else:
+                        tsEl = elem.find(tcx + "Time")
+                        if tsEl is None:
+                            raise ValueError("Trackpoint without timestamp")
+                        lastTimestamp = tsEl.text
+                        if not act.GPS and elem.find(tcx + "Position") is not None:
+                            act.GPS = True
+                # Done with it - and with the ones before it
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+            elif tag == tcx + "Track":
+                if elem is xtrkseg:
+                    xtrkseg = None
+                    lapTrackSeen = True
+                elem.clear()
+            elif elem is xlap:
+                TCXIO._parseLap(xlap, lap, ns)
+                if lastTimestamp is not None:
+                    lap.EndTime = lastTimestamp if not isinstance(lastTimestamp, str) else parse_timestamp(lastTimestamp)
+                xlap = None
+                elem.clear()
+            elif elem is xact:
+                xnotes = xact.find("tcx:Notes", namespaces=ns)
+                if xnotes is not None and xnotes.text:
+                    xnotes_lines = xnotes.text.splitlines()
+                    act.Name = xnotes_lines[0]
+                    if len(xnotes_lines) > 1:
+                        act.Notes = '\n'.join(xnotes_lines[1:])
+
+                xcreator = xact.find("tcx:Creator", namespaces=ns)
+                if xcreator is not None and xcreator.attrib["{" + TCXIO.Namespaces["xsi"] + "}type"] == "Device_t":
+                    devId = DeviceIdentifier.FindMatchingIdentifierOfType(DeviceIdentifierType.TCX, {"ProductID": int(xcreator.find("tcx:ProductID", namespaces=ns).text)}) # Who knows if this is unique in the TCX ecosystem? We'll find out!
+                    xver = xcreator.find("tcx:Version", namespaces=ns)
+                    verMaj = None
+                    verMin = None
+                    if xver is not None:
+                        verMaj = int(xver.find("tcx:VersionMajor", namespaces=ns).text)
+                        verMin = int(xver.find("tcx:VersionMinor", namespaces=ns).text)
+                    act.Device = Device(devId, int(xcreator.find("tcx:UnitId", namespaces=ns).text), verMaj=verMaj, verMin=verMin) # ID vs Id: ???
+                elem.clear()
+            elif tag == tcx + "Author" and TCXIO._isTopLevel(elem):
+                xauthorname = elem.find("tcx:Name", namespaces=ns)
+                if xauthorname is not None:
+                    if xauthorname.text == "tapiriik":
+                        act.OriginatedFromTapiriik = True
 
-        xacts = root.find("tcx:Activities", namespaces=ns)
         if xacts is None:
             raise ValueError("No activities element in TCX")
 
-        xact = xacts.find("tcx:Activity", namespaces=ns)
         if xact is None:
             raise ValueError("No activity element in TCX")
 
-        xauthor = root.find("tcx:Author", namespaces=ns)
-        if xauthor is not None:
-            xauthorname = xauthor.find("tcx:Name", namespaces=ns)
-            if xauthorname is not None:
-                if xauthorname.text == "tapiriik":
-                    act.OriginatedFromTapiriik = True
-
-        if not act.Type or act.Type == ActivityType.Other:
-            if xact.attrib["Sport"] == "Biking":
-                act.Type = ActivityType.Cycling
-            elif xact.attrib["Sport"] == "Running":
-                act.Type = ActivityType.Running
-
-        xnotes = xact.find("tcx:Notes", namespaces=ns)
-        if xnotes is not None and xnotes.text:
-            xnotes_lines = xnotes.text.splitlines()
-            act.Name = xnotes_lines[0]
-            if len(xnotes_lines) > 1:
-                act.Notes = '\n'.join(xnotes_lines[1:])
-
-        xcreator = xact.find("tcx:Creator", namespaces=ns)
-        if xcreator is not None and xcreator.attrib["{" + TCXIO.Namespaces["xsi"] + "}type"] == "Device_t":
-            devId = DeviceIdentifier.FindMatchingIdentifierOfType(DeviceIdentifierType.TCX, {"ProductID": int(xcreator.find("tcx:ProductID", namespaces=ns).text)}) # Who knows if this is unique in the TCX ecosystem? We'll find out!
-            xver = xcreator.find("tcx:Version", namespaces=ns)
-            verMaj = None
-            verMin = None
-            if xver is not None:
-                verMaj = int(xver.find("tcx:VersionMajor", namespaces=ns).text)
-                verMin = int(xver.find("tcx:VersionMinor", namespaces=ns).text)
-            act.Device = Device(devId, int(xcreator.find("tcx:UnitId", namespaces=ns).text), verMaj=verMaj, verMin=verMin) # ID vs Id: ???
-
-        xlaps = xact.findall("tcx:Lap", namespaces=ns)
-        startTime = None
-        endTime = None
-        for xlap in xlaps:
-
-            lap = Lap()
-            act.Laps.append(lap)
-
-            lap.StartTime = dateutil.parser.parse(xlap.attrib["StartTime"])
-            totalTimeEL = xlap.find("tcx:TotalTimeSeconds", namespaces=ns)
-            if totalTimeEL is None:
-                raise ValueError("Missing lap TotalTimeSeconds")
-            lap.Stats.TimerTime = ActivityStatistic(ActivityStatisticUnit.Seconds, float(totalTimeEL.text))
-
-            lap.EndTime = lap.StartTime + timedelta(seconds=float(totalTimeEL.text))
-
-            distEl = xlap.find("tcx:DistanceMeters", namespaces=ns)
-            energyEl = xlap.find("tcx:Calories", namespaces=ns)
-            triggerEl = xlap.find("tcx:TriggerMethod", namespaces=ns)
-            intensityEl = xlap.find("tcx:Intensity", namespaces=ns)
-
-            # Some applications slack off and omit these, despite the fact that they're required in the spec.
-            # I will, however, require lap distance, because, seriously.
-            if distEl is None:
-                raise ValueError("Missing lap DistanceMeters")
-
-            lap.Stats.Distance = ActivityStatistic(ActivityStatisticUnit.Meters, float(distEl.text))
-            if energyEl is not None and energyEl.text:
-                lap.Stats.Energy = ActivityStatistic(ActivityStatisticUnit.Kilocalories, float(energyEl.text))
-                if lap.Stats.Energy.Value == 0:
-                    lap.Stats.Energy.Value = None # It's dumb to make this required, but I digress.
-
-            if intensityEl is not None:
-                lap.Intensity = LapIntensity.Active if intensityEl.text == "Active" else LapIntensity.Rest
-            else:
-                lap.Intensity = LapIntensity.Active
-
-            if triggerEl is not None:
-                lap.Trigger = ({
-                    "Manual": LapTriggerMethod.Manual,
-                    "Distance": LapTriggerMethod.Distance,
-                    "Location": LapTriggerMethod.PositionMarked,
-                    "Time": LapTriggerMethod.Time,
-                    "HeartRate": LapTriggerMethod.Manual # I guess - no equivalent in FIT
-                    })[triggerEl.text]
-            else:
-                lap.Trigger = LapTriggerMethod.Manual # One would presume
-
-            maxSpdEl = xlap.find("tcx:MaximumSpeed", namespaces=ns)
-            if maxSpdEl is not None:
-                lap.Stats.Speed = ActivityStatistic(ActivityStatisticUnit.MetersPerSecond, max=float(maxSpdEl.text))
-
-            avgHREl = xlap.find("tcx:AverageHeartRateBpm", namespaces=ns)
-            if avgHREl is not None:
-                lap.Stats.HR = ActivityStatistic(ActivityStatisticUnit.BeatsPerMinute, avg=float(avgHREl.find("tcx:Value", namespaces=ns).text))
-
-            maxHREl = xlap.find("tcx:MaximumHeartRateBpm", namespaces=ns)
-            if maxHREl is not None:
-                lap.Stats.HR.update(ActivityStatistic(ActivityStatisticUnit.BeatsPerMinute, max=float(maxHREl.find("tcx:Value", namespaces=ns).text)))
-
-            # WF fills these in with invalid values.
-            lap.Stats.HR.Max = lap.Stats.HR.Max if lap.Stats.HR.Max and lap.Stats.HR.Max > 10 else None
-            lap.Stats.HR.Average = lap.Stats.HR.Average if lap.Stats.HR.Average and lap.Stats.HR.Average > 10 else None
-
-            cadEl = xlap.find("tcx:Cadence", namespaces=ns)
-            if cadEl is not None:
-                lap.Stats.Cadence = ActivityStatistic(ActivityStatisticUnit.RevolutionsPerMinute, avg=float(cadEl.text))
-
-            extsEl = xlap.find("tcx:Extensions", namespaces=ns)
-            if extsEl is not None:
-                lxEls = extsEl.findall("tpx:LX", namespaces=ns)
-                for lxEl in lxEls:
-                    avgSpeedEl = lxEl.find("tpx:AvgSpeed", namespaces=ns)
-                    if avgSpeedEl is not None:
-                        lap.Stats.Speed.update(ActivityStatistic(ActivityStatisticUnit.MetersPerSecond, avg=float(avgSpeedEl.text)))
-                    maxBikeCadEl = lxEl.find("tpx:MaxBikeCadence", namespaces=ns)
-                    if maxBikeCadEl is not None:
-                        lap.Stats.Cadence.update(ActivityStatistic(ActivityStatisticUnit.RevolutionsPerMinute, max=float(maxBikeCadEl.text)))
-                    maxPowerEl = lxEl.find("tpx:MaxWatts", namespaces=ns)
-                    if maxPowerEl is not None:
-                        lap.Stats.Power.update(ActivityStatistic(ActivityStatisticUnit.Watts, max=float(maxPowerEl.text)))
-                    avgPowerEl = lxEl.find("tpx:AvgWatts", namespaces=ns)
-                    if avgPowerEl is not None:
-                        lap.Stats.Power.update(ActivityStatistic(ActivityStatisticUnit.Watts, avg=float(avgPowerEl.text)))
-                    maxRunCadEl = lxEl.find("tpx:MaxRunCadence", namespaces=ns)
-                    if maxRunCadEl is not None:
-                        lap.Stats.RunCadence.update(ActivityStatistic(ActivityStatisticUnit.StepsPerMinute, max=float(maxRunCadEl.text)))
-                    avgRunCadEl = lxEl.find("tpx:AvgRunCadence", namespaces=ns)
-                    if avgRunCadEl is not None:
-                        lap.Stats.RunCadence.update(ActivityStatistic(ActivityStatisticUnit.StepsPerMinute, avg=float(avgRunCadEl.text)))
-                    stepsEl = lxEl.find("tpx:Steps", namespaces=ns)
-                    if stepsEl is not None:
-                        lap.Stats.Strides.update(ActivityStatistic(ActivityStatisticUnit.Strides, value=float(stepsEl.text)))
-
-            xtrkseg = xlap.find("tcx:Track", namespaces=ns)
-            if xtrkseg is None:
-                # Some TCX files have laps with no track - not sure if it's valid or not.
-                continue
-            for xtrkpt in xtrkseg.findall("tcx:Trackpoint", namespaces=ns):
-                wp = Waypoint()
-                tsEl = xtrkpt.find("tcx:Time", namespaces=ns)
-                if tsEl is None:
-                    raise ValueError("Trackpoint without timestamp")
-                wp.Timestamp = dateutil.parser.parse(tsEl.text)
-                wp.Timestamp.replace(tzinfo=UTC)
-                if startTime is None or wp.Timestamp < startTime:
-                    startTime = wp.Timestamp
-                if endTime is None or wp.Timestamp > endTime:
-                    endTime = wp.Timestamp
-                xpos = xtrkpt.find("tcx:Position", namespaces=ns)
-                if xpos is not None:
-                    act.GPS = True
-                    wp.Location = Location(float(xpos.find("tcx:LatitudeDegrees", namespaces=ns).text), float(xpos.find("tcx:LongitudeDegrees", namespaces=ns).text), None)
-                eleEl = xtrkpt.find("tcx:AltitudeMeters", namespaces=ns)
-                if eleEl is not None:
-                    wp.Location = wp.Location if wp.Location else Location(None, None, None)
-                    wp.Location.Altitude = float(eleEl.text)
-                distEl = xtrkpt.find("tcx:DistanceMeters", namespaces=ns)
-                if distEl is not None:
-                    wp.Distance = float(distEl.text)
-
-                hrEl = xtrkpt.find("tcx:HeartRateBpm", namespaces=ns)
-                if hrEl is not None:
-                    wp.HR = float(hrEl.find("tcx:Value", namespaces=ns).text)
-                cadEl = xtrkpt.find("tcx:Cadence", namespaces=ns)
-                if cadEl is not None:
-                    wp.Cadence = float(cadEl.text)
-                extsEl = xtrkpt.find("tcx:Extensions", namespaces=ns)
-                if extsEl is not None:
-                    tpxEl = extsEl.find("tpx:TPX", namespaces=ns)
-                    if tpxEl is not None:
-                        powerEl = tpxEl.find("tpx:Watts", namespaces=ns)
-                        if powerEl is not None:
-                            wp.Power = float(powerEl.text)
-                        speedEl = tpxEl.find("tpx:Speed", namespaces=ns)
-                        if speedEl is not None:
-                            wp.Speed = float(speedEl.text)
-                        runCadEl = tpxEl.find("tpx:RunCadence", namespaces=ns)
-                        if runCadEl is not None:
-                            wp.RunCadence = float(runCadEl.text)
-                lap.Waypoints.append(wp)
-                xtrkpt.clear()
-                del xtrkpt
-            if len(lap.Waypoints):
-                lap.EndTime = lap.Waypoints[-1].Timestamp
-
         act.StartTime = act.Laps[0].StartTime if len(act.Laps) else act.StartTime
         act.EndTime = act.Laps[-1].EndTime if len(act.Laps) else act.EndTime
 
-        if act.CountTotalWaypoints():
+        if trackpointCount:
             act.Stationary = False
-            act.GetFlatWaypoints()[0].Type = WaypointType.Start
-            act.GetFlatWaypoints()[-1].Type = WaypointType.End
+            if not summary_only:
+                act.GetFlatWaypoints()[0].Type = WaypointType.Start
+                act.GetFlatWaypoints()[-1].Type = WaypointType.End
         else:
             act.Stationary = True
         if len(act.Laps) == 1:
@@ -239,6 +170,133 @@ class TCXIO:
         act.CalculateUID()
         return act
 
+    def _parseTrackpoint(xtrkpt):
+        # Called for every trackpoint - so it goes through the children just the once, rather than find()ing each in turn
+        tcx = TCXIO._tcx
+        tpx = TCXIO._tpx
+        wp = Waypoint()
+        for child in xtrkpt:
+            tag = child.tag
+            if tag == tcx + "Time":
+                wp.Timestamp = parse_timestamp(child.text)
+            elif tag == tcx + "Position":
+                lat = lng = None
+                for coord in child:
+                    if coord.tag == tcx + "LatitudeDegrees":
+                        lat = float(coord.text)
+                    elif coord.tag == tcx + "LongitudeDegrees":
+                        lng = float(coord.text)
+                wp.Location = Location(lat, lng, wp.Location.Altitude if wp.Location else None)
+            elif tag == tcx + "AltitudeMeters":
+                wp.Location = wp.Location if wp.Location else Location(None, None, None)
+                wp.Location.Altitude = float(child.text)
+            elif tag == tcx + "DistanceMeters":
+                wp.Distance = float(child.text)
+            elif tag == tcx + "HeartRateBpm":
+                wp.HR = float(child.find(tcx + "Value").text)
+            elif tag == tcx + "Cadence":
+                wp.Cadence = float(child.text)
+            elif tag == tcx + "Extensions":
+                tpxEl = child.find(tpx + "TPX")
+                if tpxEl is not None:
+                    for ext in tpxEl:
+                        if ext.tag == tpx + "Watts":
+                            wp.Power = float(ext.text)
+                        elif ext.tag == tpx + "Speed":
+                            wp.Speed = float(ext.text)
+                        elif ext.tag == tpx + "RunCadence":
+                            wp.RunCadence = float(ext.text)
+        if wp.Timestamp is None:
+            raise ValueError("Trackpoint without timestamp")
+        return wp
+
+    def _parseLap(xlap, lap, ns):
+        totalTimeEL = xlap.find("tcx:TotalTimeSeconds", namespaces=ns)
+        if totalTimeEL is None:
+            raise ValueError("Missing lap TotalTimeSeconds")
+        lap.Stats.TimerTime = ActivityStatistic(ActivityStatisticUnit.Seconds, float(totalTimeEL.text))
+
+        lap.EndTime = lap.StartTime + timedelta(seconds=float(totalTimeEL.text))
+
+        distEl = xlap.find("tcx:DistanceMeters", namespaces=ns)
+        energyEl = xlap.find("tcx:Calories", namespaces=ns)
+        triggerEl = xlap.find("tcx:TriggerMethod", namespaces=ns)
+        intensityEl = xlap.find("tcx:Intensity", namespaces=ns)
+
+        # Some applications slack off and omit these, despite the fact that they're required in the spec.
+        # I will, however, require lap distance, because, seriously.
+        if distEl is None:
+            raise ValueError("Missing lap DistanceMeters")
+
+        lap.Stats.Distance = ActivityStatistic(ActivityStatisticUnit.Meters, float(distEl.text))
+        if energyEl is not None and energyEl.text:
+            lap.Stats.Energy = ActivityStatistic(ActivityStatisticUnit.Kilocalories, float(energyEl.text))
+            if lap.Stats.Energy.Value == 0:
+                lap.Stats.Energy.Value = None # It's dumb to make this required, but I digress.
+
+        if intensityEl is not None:
+            lap.Intensity = LapIntensity.Active if intensityEl.text == "Active" else LapIntensity.Rest
+        else:
+            lap.Intensity = LapIntensity.Active
+
+        if triggerEl is not None:
+            lap.Trigger = ({
+                "Manual": LapTriggerMethod.Manual,
+                "Distance": LapTriggerMethod.Distance,
+                "Location": LapTriggerMethod.PositionMarked,
+                "Time": LapTriggerMethod.Time,
+                "HeartRate": LapTriggerMethod.Manual # I guess - no equivalent in FIT
+                })[triggerEl.text]
+        else:
+            lap.Trigger = LapTriggerMethod.Manual # One would presume
+
+        maxSpdEl = xlap.find("tcx:MaximumSpeed", namespaces=ns)
+        if maxSpdEl is not None:
+            lap.Stats.Speed = ActivityStatistic(ActivityStatisticUnit.MetersPerSecond, max=float(maxSpdEl.text))
+
+        avgHREl = xlap.find("tcx:AverageHeartRateBpm", namespaces=ns)
+        if avgHREl is not None:
+            lap.Stats.HR = ActivityStatistic(ActivityStatisticUnit.BeatsPerMinute, avg=float(avgHREl.find("tcx:Value", namespaces=ns).text))
+
+        maxHREl = xlap.find("tcx:MaximumHeartRateBpm", namespaces=ns)
+        if maxHREl is not None:
+            lap.Stats.HR.update(ActivityStatistic(ActivityStatisticUnit.BeatsPerMinute, max=float(maxHREl.find("tcx:Value", namespaces=ns).text)))
+
+        # WF fills these in with invalid values.
+        lap.Stats.HR.Max = lap.Stats.HR.Max if lap.Stats.HR.Max and lap.Stats.HR.Max > 10 else None
+        lap.Stats.HR.Average = lap.Stats.HR.Average if lap.Stats.HR.Average and lap.Stats.HR.Average > 10 else None
+
+        cadEl = xlap.find("tcx:Cadence", namespaces=ns)
+        if cadEl is not None:
+            lap.Stats.Cadence = ActivityStatistic(ActivityStatisticUnit.RevolutionsPerMinute, avg=float(cadEl.text))
+
+        extsEl = xlap.find("tcx:Extensions", namespaces=ns)
+        if extsEl is not None:
+            lxEls = extsEl.findall("tpx:LX", namespaces=ns)
+            for lxEl in lxEls:
+                avgSpeedEl = lxEl.find("tpx:AvgSpeed", namespaces=ns)
+                if avgSpeedEl is not None:
+                    lap.Stats.Speed.update(ActivityStatistic(ActivityStatisticUnit.MetersPerSecond, avg=float(avgSpeedEl.text)))
+                maxBikeCadEl = lxEl.find("tpx:MaxBikeCadence", namespaces=ns)
+                if maxBikeCadEl is not None:
+                    lap.Stats.Cadence.update(ActivityStatistic(ActivityStatisticUnit.RevolutionsPerMinute, max=float(maxBikeCadEl.text)))
+                maxPowerEl = lxEl.find("tpx:MaxWatts", namespaces=ns)
+                if maxPowerEl is not None:
+                    lap.Stats.Power.update(ActivityStatistic(ActivityStatisticUnit.Watts, max=float(maxPowerEl.text)))
+                avgPowerEl = lxEl.find("tpx:AvgWatts", namespaces=ns)
+                if avgPowerEl is not None:
+                    lap.Stats.Power.update(ActivityStatistic(ActivityStatisticUnit.Watts, avg=float(avgPowerEl.text)))
+                maxRunCadEl = lxEl.find("tpx:MaxRunCadence", namespaces=ns)
+                if maxRunCadEl is not None:
+                    lap.Stats.RunCadence.update(ActivityStatistic(ActivityStatisticUnit.StepsPerMinute, max=float(maxRunCadEl.text)))
+                avgRunCadEl = lxEl.find("tpx:AvgRunCadence", namespaces=ns)
+                if avgRunCadEl is not None:
+                    lap.Stats.RunCadence.update(ActivityStatistic(ActivityStatisticUnit.StepsPerMinute, avg=float(avgRunCadEl.text)))
+                stepsEl = lxEl.find("tpx:Steps", namespaces=ns)
+                if stepsEl is not None:
+                    lap.Stats.Strides.update(ActivityStatistic(ActivityStatisticUnit.Strides, value=float(stepsEl.text)))
+
+    @SyncTrace.Traced("dump")
     def Dump(activity):
 
         root = etree.Element("TrainingCenterDatabase", nsmap=TCXIO.Namespaces)
@@ -325,6 +383,7 @@ class TCXIO:
             xlap = xlaps[activity.Laps.index(lap)]
             track = None
             for wp in lap.Waypoints:
+                CPUBudget.Yield()
                 if wp.Type == WaypointType.Pause:
                     if inPause:
                         continue  # this used to be an exception, but I don't think that was merited
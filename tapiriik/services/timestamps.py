@@ -0,0 +1,24 @@
+from datetime import datetime
+import dateutil.parser
+import pytz
+import re
+
+# What just about every GPX/TCX file has in it - e.g. 2014-03-21T09:15:02Z, 2014-03-21T09:15:02.250+01:00
+_iso8601 = re.compile(r"^\s*(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d+))?(Z|[+-]\d\d:?\d\d)?\s*$")
+
+def parse_timestamp(text):
+    # dateutil works out the format afresh for every timestamp, which adds up over a few thousand trackpoints - so those in the usual format skip it
+    match = _iso8601.match(text)
+    if not match:
+        return dateutil.parser.parse(text)
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    try:
+        timestamp = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), int(fraction[:6].ljust(6, "0")) if fraction else 0)
+    except ValueError:
+        return dateutil.parser.parse(text) # Leap seconds, 24:00:00 and the like
+    if offset == "Z":
+        return timestamp.replace(tzinfo=pytz.utc)
+    elif offset:
+        minutes = int(offset[1:3]) * 60 + int(offset[-2:])
+        return timestamp.replace(tzinfo=pytz.FixedOffset(-minutes if offset[0] == "-" else minutes))
+    return timestamp
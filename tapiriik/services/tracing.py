@@ -0,0 +1,111 @@
+from functools import wraps
+import threading
+import json
+import os
+import time
+
+_current = threading.local()
+
+class SyncTrace:
+    # Where a sync's time went - spans for each step (listing, downloading, parsing, TZ lookup, dumping, uploading...) by service and activity,
+    #  plus counts of the HTTP requests and DB round-trips made along the way.
+    # The trace is Activate'd on whichever threads are working on the sync, so anything below (the services' parsers, etc.) can add spans via SyncTrace.Span without it being passed around -
+    #  and spans that don't say which service/activity they're for are put down to whatever span they're inside, e.g. parsing during a download.
+    # Outside of a sync, all of it does nothing.
+
+    MaxSpans = 10000 # Past this they're only counted, so a huge exhaustive sync doesn't turn into a huge trace
+
+    def __init__(self):
+        self.Spans = []
+        self.Counters = {}
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+    def Activate(self):
+        _current.trace = self
+        _current.spans = []
+
+    def Deactivate():
+        _current.trace = None
+        _current.spans = []
+
+    def Current():
+        return getattr(_current, "trace", None)
+
+    def Span(name, service=None, activity=None):
+        # with SyncTrace.Span("upload", service=svc.ID, activity=activity.UID): ...
+        trace = SyncTrace.Current()
+        return _Span(trace, name, service, activity) if trace else _nullSpan
+
+    def Traced(name):
+        # Decorator for the same
+        def decorator(fn):
+            @wraps(fn)
+            def traced(*args, **kwargs):
+                with SyncTrace.Span(name):
+                    return fn(*args, **kwargs)
+            return traced
+        return decorator
+
+    def Count(name, value=1):
+        trace = SyncTrace.Current()
+        if trace:
+            with trace._lock:
+                trace.Counters[name] = trace.Counters.get(name, 0) + value
+
+    def CountCommand(command_name, duration):
+        # For tapiriik.database's CommandMonitor
+        SyncTrace.Count("mongo.round_trips")
+        SyncTrace.Count("mongo.seconds", duration)
+
+    def _record(self, name, service, activity, start, end):
+        with self._lock:
+            if len(self.Spans) >= SyncTrace.MaxSpans:
+                self.Counters["dropped_spans"] = self.Counters.get("dropped_spans", 0) + 1
+                return
+            self.Spans.append((name, service, activity, start - self._start, end - start, threading.get_ident()))
+
+    def Totals(self):
+        # {(name, service): (count, seconds)} - nested spans are each counted in full, so these don't add up to the sync's duration
+        totals = {}
+        with self._lock:
+            for name, service, activity, start, duration, thread in self.Spans:
+                count, seconds = totals.get((name, service), (0, 0))
+                totals[(name, service)] = (count + 1, seconds + duration)
+        return totals
+
+    def Export(self, path):
+        # In the Chrome trace event format - so chrome://tracing (or anything else that reads it) can show it
+        with self._lock:
+            events = [{"name": name, "cat": service or "", "ph": "X", "ts": int(start * 1000000), "dur": int(duration * 1000000), "pid": os.getpid(), "tid": thread, "args": {"service": service, "activity": activity}} for name, service, activity, start, duration, thread in self.Spans]
+            counters = dict(self.Counters)
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "otherData": {"start": self._start, "counters": counters}}, trace_file)
+
+class _Span:
+    def __init__(self, trace, name, service, activity):
+        self._trace = trace
+        self._name = name
+        self._service = service
+        self._activity = activity
+
+    def __enter__(self):
+        if len(_current.spans):
+            parent = _current.spans[-1]
+            self._service = self._service or parent._service
+            self._activity = self._activity or parent._activity
+        _current.spans.append(self)
+        self._start = time.time()
+
+    def __exit__(self, *args):
+        _current.spans.pop()
+        self._trace._record(self._name, self._service, self._activity, self._start, time.time())
+
+class _NullSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+_nullSpan = _NullSpan()
@@ -0,0 +1,139 @@
+from tapiriik.services.interchange import ActivityType
+from datetime import timedelta
+
+class ActivityMatcher:
+    # Finds which already-listed activity (if any) a newly-listed activity duplicates.
+    # The rules are the same ones that used to be evaluated against every activity within +/- 38 hours -
+    #  but the activities are bucketed so only those that could possibly match get looked at.
+
+    # Yep, abs() works on timedeltas
+    StartLeeway = timedelta(minutes=3)
+    StartTZOffsetLeeway = timedelta(minutes=1)
+    # 14 hours because Kiribati, and later, 38 hours because of some really terrible import code that existed on a service that shall not be named.
+    TimezoneErrorPeriod = timedelta(hours=38)
+
+    def __init__(self, activities=[]):
+        self._buckets = {"UID": {}, "NaiveMinute": {}, "NaiveDateMinute": {}, "UTCMinute": {}}
+        self._indexed = {}
+        self._sequence = 0
+        # Matches are resolved in the order the activities would appear in the (most-recent-first) list - so earlier list entries need to win ties.
+        for act in reversed(activities):
+            self.Add(act)
+
+    def IsSameActivity(x, act):
+        # x is the extant activity, act is the new one
+        if x.StartTime is None or act.StartTime is None:
+            return x.UID == act.UID
+        xNaive = x.StartTime.replace(tzinfo=None)
+        actNaive = act.StartTime.replace(tzinfo=None)
+        if abs(actNaive - xNaive) > ActivityMatcher.TimezoneErrorPeriod:
+            return False # These wouldn't even have been considered
+        return (
+                    (
+                        # Identical
+                        x.UID == act.UID
+                        or
+                        # Check to see if the activities are reasonably close together to be considered duplicate
+                        ((act.StartTime.tzinfo is not None) == (x.StartTime.tzinfo is not None) and
+                         abs(act.StartTime - x.StartTime) < ActivityMatcher.StartLeeway
+                        )
+                        or
+                        # Try comparing the time as if it were TZ-aware and in the expected TZ (this won't actually change the value of the times being compared)
+                        ((act.StartTime.tzinfo is not None) != (x.StartTime.tzinfo is not None) and
+                         abs(actNaive - xNaive) < ActivityMatcher.StartLeeway
+                        )
+                        or
+                        # Sometimes wacky stuff happens and we get two activities with the same mm:ss but different hh, because of a TZ issue somewhere along the line.
+                        # So, we check for any activities within the error period that have the same minutes and seconds values.
+                        # There's a very low chance that two activities in this period would intersect and be merged together.
+                        # But, given the fact that most users have maybe 0.05 activities per this period, it's an acceptable tradeoff.
+                        (abs(actNaive - xNaive) < ActivityMatcher.TimezoneErrorPeriod and
+                         abs(actNaive.replace(hour=0) - xNaive.replace(hour=0)) < ActivityMatcher.StartTZOffsetLeeway
+                        )
+                        or
+                        # Similarly, for half-hour time zones (there are a handful of quarter-hour ones, but I've got to draw a line somewhere, even if I revise it several times)
+                        (abs(actNaive - xNaive) < ActivityMatcher.TimezoneErrorPeriod and
+                         abs(actNaive.replace(hour=0) - xNaive.replace(hour=0)) > timedelta(minutes=30) - (ActivityMatcher.StartTZOffsetLeeway / 2) and
+                         abs(actNaive.replace(hour=0) - xNaive.replace(hour=0)) < timedelta(minutes=30) + (ActivityMatcher.StartTZOffsetLeeway / 2)
+                        )
+                    )
+                    and
+                    # Prevents closely-spaced activities of known different type from being lumped together - esp. important for manually-enetered ones
+                    (x.Type == ActivityType.Other or act.Type == ActivityType.Other or x.Type == act.Type or ActivityType.AreVariants([act.Type, x.Type]))
+               )
+
+    def _minuteOf(dt):
+        # Minutes since 0001-01-01 - cheaper to hash and step through than datetimes
+        return dt.toordinal() * 1440 + dt.hour * 60 + dt.minute
+
+    def _utcMinuteOf(dt):
+        return ActivityMatcher._minuteOf((dt - dt.utcoffset()).replace(tzinfo=None))
+
+    def _bucketKeys(act):
+        keys = [("UID", act.UID)]
+        if act.StartTime is not None:
+            naive = act.StartTime.replace(tzinfo=None)
+            keys.append(("NaiveMinute", ActivityMatcher._minuteOf(naive)))
+            keys.append(("NaiveDateMinute", naive.toordinal() * 60 + naive.minute))
+            if act.StartTime.tzinfo is not None:
+                keys.append(("UTCMinute", ActivityMatcher._utcMinuteOf(act.StartTime)))
+        return keys
+
+    def _probeKeys(act):
+        keys = [("UID", act.UID)]
+        if act.StartTime is not None:
+            naive = act.StartTime.replace(tzinfo=None)
+            # Anything within StartLeeway, wall-clock wise
+            naiveMinute = ActivityMatcher._minuteOf(naive)
+            keys += [("NaiveMinute", minute) for minute in range(naiveMinute - 3, naiveMinute + 4)]
+            # Anything on the same day with the same mm:ss, or mm:ss 30 minutes off
+            # (replace(hour=0) keeps the date, so a different day is always at least 23 hours out)
+            dateMinute = naive.toordinal() * 60
+            for minute in list(range(naive.minute - 1, naive.minute + 2)) + list(range(naive.minute - 31, naive.minute - 28)) + list(range(naive.minute + 29, naive.minute + 32)):
+                if 0 <= minute < 60:
+                    keys.append(("NaiveDateMinute", dateMinute + minute))
+            # Anything within StartLeeway in absolute terms
+            if act.StartTime.tzinfo is not None:
+                utcMinute = ActivityMatcher._utcMinuteOf(act.StartTime)
+                keys += [("UTCMinute", minute) for minute in range(utcMinute - 3, utcMinute + 4)]
+        return keys
+
+    def Add(self, act, sequence=None):
+        if sequence is None:
+            self._sequence += 1
+            sequence = self._sequence
+        keys = ActivityMatcher._bucketKeys(act)
+        for index, key in keys:
+            self._buckets[index].setdefault(key, []).append(act)
+        self._indexed[id(act)] = (sequence, keys)
+
+    def Remove(self, act):
+        sequence, keys = self._indexed.pop(id(act))
+        for index, key in keys:
+            bucket = self._buckets[index]
+            bucket[key] = [x for x in bucket[key] if x is not act]
+            if not len(bucket[key]):
+                del bucket[key]
+        return sequence
+
+    def Update(self, act):
+        # Call this after changing an indexed activity's StartTime or UID - it keeps its place in line
+        self.Add(act, sequence=self.Remove(act))
+
+    def FindMatch(self, act):
+        best = None
+        bestOrder = None
+        seen = set()
+        for index, key in ActivityMatcher._probeKeys(act):
+            for candidate in self._buckets[index].get(key, []):
+                if id(candidate) in seen:
+                    continue
+                seen.add(id(candidate))
+                if not ActivityMatcher.IsSameActivity(candidate, act):
+                    continue
+                # Most recent first, then most recently added first - the same order bisect.insort_left leaves the activity list in
+                order = (candidate.StartTime.replace(tzinfo=None), self._indexed[id(candidate)][0])
+                if best is None or order > bestOrder:
+                    best = candidate
+                    bestOrder = order
+        return best
@@ -0,0 +1,125 @@
+from tapiriik.database import db
+from tapiriik.services import Service
+from tapiriik.services.ratelimiting import RateLimit, ApiUsage
+from tapiriik.settings import SYNC_BUDGET_TRIGGER_RESERVE, SYNC_BUDGET_DEFAULT_REQUESTS_PER_SYNC
+from tapiriik.sync.sync import Sync
+from datetime import datetime, timedelta
+import math
+import logging
+logger = logging.getLogger(__name__)
+
+class ApiBudget:
+    # Spreads the quota of services with GlobalRateLimits over the whole day, instead of letting whoever happens to be due first spend it all and starving everyone after.
+    # Periodic (and exhaustive) syncs involving those services are metered out by sync_scheduler at the limits' sustained rate, less SYNC_BUDGET_TRIGGER_RESERVE -
+    #  triggered and user-initiated syncs aren't paced at all, that reserve is theirs.
+    # How many requests a sync takes is learned from the requests actually made (ApiUsage) vs. the syncs dispatched.
+
+    PacedLanes = ["periodic", "exhaustive"]
+
+    def __init__(self):
+        self._dispatchLimits = {}
+        self._forecasts = {}
+        self._forecastHour = None
+
+    def _pacedServices():
+        return [x for x in Service.List() if len(x.GlobalRateLimits)]
+
+    def _sustainedRate(limits):
+        # Requests/hour that can be kept up indefinitely - the tightest of the limits
+        return min(count / span.total_seconds() * 3600 for span, count in limits)
+
+    def RequestsPerSync(service):
+        # Over the last day, so there's a decent sample
+        dispatched = ApiUsage.Total(service.ID, hours=24, kind="dispatch")
+        if dispatched < 10:
+            return SYNC_BUDGET_DEFAULT_REQUESTS_PER_SYNC
+        return max(1, ApiUsage.Total(service.ID, hours=24) / dispatched)
+
+    def Forecast(services, horizon=timedelta(hours=1)):
+        # {service ID: users with it connected who'll be due within the horizon (or are overdue)}, not counting those already queued
+        # All the services in one pass, ranging over the NextSynchronization/ConnectedServices.Service index sync_scheduler keeps
+        service_ids = [x.ID for x in services]
+        counts = db.users.aggregate([
+            {"$match": {"NextSynchronization": {"$lte": datetime.utcnow() + horizon}, "ConnectedServices.Service": {"$in": service_ids}, "QueuedAt": {"$exists": False}}},
+            {"$unwind": "$ConnectedServices"},
+            {"$match": {"ConnectedServices.Service": {"$in": service_ids}}},
+            {"$group": {"_id": "$ConnectedServices.Service", "Count": {"$sum": 1}}}
+        ])
+        return dict((x["_id"], x["Count"]) for x in counts)
+
+    def DispatchLimits(syncs_per_hour, forecast_syncs):
+        # Let out about 5 minutes' worth at a time, so they go out steadily instead of in one lump at the top of the hour
+        # ...unless the forecast leaves some of the hour's syncs spare, in which case that many can go as soon as they're due - it's the same rate either way, just less waiting
+        burst = max(math.ceil(syncs_per_hour / 12), math.floor(syncs_per_hour - forecast_syncs))
+        return [(timedelta(hours=burst / syncs_per_hour), burst)]
+
+    def Plan(self):
+        # Works out the pacing for each service, and records the forecast alongside what's actually been used so far this hour (so the two can be compared after the fact)
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        services = ApiBudget._pacedServices()
+        if self._forecastHour != hour:
+            # Once an hour is plenty - that's what the stats compare against, and what the hour's pacing is planned around
+            self._forecasts = ApiBudget.Forecast(services) if len(services) else {}
+            self._forecastHour = hour
+        dispatch_limits = {}
+        for service in services:
+            budget = ApiBudget._sustainedRate(service.GlobalRateLimits)
+            allowance = budget * (1 - SYNC_BUDGET_TRIGGER_RESERVE)
+            requests_per_sync = ApiBudget.RequestsPerSync(service)
+            forecast_syncs = self._forecasts.get(service.ID, 0)
+            # Syncs/hour that'd use exactly the allowance
+            syncs_per_hour = max(allowance / requests_per_sync, 1)
+            dispatch_limits[service.ID] = ApiBudget.DispatchLimits(syncs_per_hour, forecast_syncs)
+
+            logger.info("%s budget %d/hr, allowance %d/hr at %.1f requests/sync, forecast %d syncs (%d requests) in the next hour" % (service.ID, budget, allowance, requests_per_sync, forecast_syncs, forecast_syncs * requests_per_sync))
+            db.api_budget_stats.update({"Service": service.ID, "Hour": hour}, {
+                "$setOnInsert": {
+                    # Whatever was predicted at the start of the hour
+                    "ForecastSyncs": forecast_syncs,
+                    "ForecastRequests": forecast_syncs * requests_per_sync
+                },
+                "$set": {
+                    "Timestamp": datetime.utcnow(),
+                    "Budget": budget,
+                    "Allowance": allowance,
+                    "RequestsPerSync": requests_per_sync,
+                    "ActualRequests": ApiUsage.Total(service.ID),
+                    "DispatchedSyncs": ApiUsage.Total(service.ID, kind="dispatch")
+                }
+            }, upsert=True)
+        self._dispatchLimits = dispatch_limits
+
+    def Pace(self, users):
+        # Splits users into those that can be dispatched now, and (user, when) pairs for the rest - staggered, so they don't all come due again in the same instant
+        dispatch = []
+        deferred = []
+        backlog = {}
+        now = datetime.utcnow()
+        for user in users:
+            services = set(x["Service"] for x in user.get("ConnectedServices", []) if x["Service"] in self._dispatchLimits) if Sync.QueueLane(user) in ApiBudget.PacedLanes else set()
+            wait = 0
+            for service_id in services:
+                limits = self._dispatchLimits[service_id]
+                service_wait = RateLimit.Wait("dispatch:%s" % service_id, limits)
+                if service_wait > 0:
+                    span, count = limits[0]
+                    service_wait += backlog.get(service_id, 0) * span.total_seconds() / count
+                    backlog[service_id] = backlog.get(service_id, 0) + 1
+                wait = max(wait, service_wait)
+            if wait > 0:
+                deferred.append((user, now + timedelta(seconds=wait)))
+                continue
+            for service_id in services:
+                RateLimit.Acquire("dispatch:%s" % service_id, self._dispatchLimits[service_id])
+            dispatch.append(user)
+        return dispatch, deferred
+
+    def Dispatched(users):
+        # For RequestsPerSync - every sync counts, paced or not, since they all make requests
+        counts = {}
+        for user in users:
+            for service_id in set(x["Service"] for x in user.get("ConnectedServices", [])):
+                counts[service_id] = counts.get(service_id, 0) + 1
+        for service in ApiBudget._pacedServices():
+            if service.ID in counts:
+                ApiUsage.Record(service.ID, kind="dispatch", count=counts[service.ID])
@@ -0,0 +1,22 @@
+class LaneSelector:
+    # Picks which sync queue lane a worker should serve next - each lane gets its weight's share of the users, interleaved rather than in bursts.
+    # (the smooth weighted round-robin nginx uses)
+    # Lanes with nothing waiting are skipped without being charged for it, so nobody sits idle while there's work in a quieter lane.
+
+    def __init__(self, weights):
+        self._weights = weights
+        self._current = dict((lane, 0) for lane in weights)
+
+    def Order(self):
+        # Every lane, whoever's turn it is first
+        return sorted(self._weights.keys(), key=lambda lane: (-(self._current[lane] + self._weights[lane]), -self._weights[lane]))
+
+    def Served(self, lane, idle_lanes=[]):
+        # idle_lanes are those that were found empty along the way - they don't get to bank credit for while they had nothing to do
+        #  (otherwise they'd hog the workers for a good while once something did turn up)
+        for other_lane, weight in self._weights.items():
+            if other_lane in idle_lanes:
+                self._current[other_lane] = 0
+            else:
+                self._current[other_lane] += weight
+        self._current[lane] -= sum(weight for other_lane, weight in self._weights.items() if other_lane not in idle_lanes)
@@ -0,0 +1,153 @@
+from tapiriik.database import db, redis
+from tapiriik.settings import SYNC_LEASE_TTL, SYNC_LEASE_STALL_TIMEOUT, SYNC_LEASE_STEP_STALL_TIMEOUTS
+from .schedule import SyncSchedule
+from datetime import datetime
+from bson.objectid import ObjectId
+import os
+import signal
+import socket
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+class SyncLease:
+    # Each user being synced is leased to the worker doing it, for SYNC_LEASE_TTL seconds at a time.
+    # The worker's keeper thread renews its leases for as long as the syncs are alive and heartbeating - if the worker dies, or a sync stops heartbeating for too long, the lease runs out
+    #  and sync_scheduler puts the user straight back in the queue (Reap).
+    # The leases are a Redis sorted set of user IDs, scored by expiry - with the details (holder, generation, last heartbeat) alongside in a hash per user.
+    # Without Redis, none of this happens - and sync_watchdog/sync_global_watchdog pick up the slack like they used to.
+
+    _key = "sync-leases"
+
+    def _detailsKey(user_id):
+        return "sync-lease:%s" % user_id
+
+    def Enabled():
+        return redis is not None
+
+    # What this process holds - {user ID: process actually doing the sync}
+    _held = {}
+    _heldLock = threading.Lock()
+    _keeper = None
+
+    # Only lets go if it's still the lease this host took for this generation - if it was reaped in the meantime, it may already be someone else's
+    # (not the process - a forked sync heartbeats with its own)
+    _releaseScript = redis.register_script("""
+    local details = redis.call("HMGET", KEYS[2], "Host", "Generation")
+    if details[1] ~= ARGV[2] or details[2] ~= ARGV[3] then
+        return 0
+    end
+    if redis.call("ZREM", KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    redis.call("DEL", KEYS[2])
+    return 1
+    """) if redis else None
+
+    def Acquire(user_id, generation, process=None):
+        # False if someone else already has it (or had it, and it hasn't been reaped yet)
+        if not SyncLease.Enabled():
+            return True
+        user_id = str(user_id)
+        if not redis.execute_command("ZADD", SyncLease._key, "NX", time.time() + SYNC_LEASE_TTL, user_id):
+            return False
+        redis.hmset(SyncLease._detailsKey(user_id), {"Host": socket.gethostname(), "Process": process or os.getpid(), "Generation": generation or "", "Heartbeat": time.time(), "Step": "startup"})
+        with SyncLease._heldLock:
+            SyncLease._held[user_id] = process or os.getpid()
+        return True
+
+    def Heartbeat(user_id, step, process=None):
+        # Safe to call from a forked sync process - it's all in Redis
+        if not SyncLease.Enabled():
+            return
+        redis.hmset(SyncLease._detailsKey(user_id), {"Heartbeat": time.time(), "Step": step, "Process": process or os.getpid()})
+
+    def Release(user_id, generation=None):
+        # With the generation it was acquired for, only releases it if it's still held - False if it was lost along the way
+        # Without, it goes regardless (for the diagnostics dashboard's unlock)
+        if not SyncLease.Enabled():
+            return True
+        user_id = str(user_id)
+        with SyncLease._heldLock:
+            SyncLease._held.pop(user_id, None)
+        if generation is not None:
+            return bool(SyncLease._releaseScript(keys=[SyncLease._key, SyncLease._detailsKey(user_id)], args=[user_id, socket.gethostname(), generation]))
+        pipeline = redis.pipeline()
+        pipeline.zrem(SyncLease._key, user_id)
+        pipeline.delete(SyncLease._detailsKey(user_id))
+        pipeline.execute()
+        return True
+
+    def Get(user_id):
+        # For the diagnostics dashboard - None if nobody holds it
+        if not SyncLease.Enabled():
+            return None
+        expiry = redis.zscore(SyncLease._key, str(user_id))
+        if expiry is None:
+            return None
+        details = dict((k.decode("UTF-8"), v.decode("UTF-8")) for k, v in redis.hgetall(SyncLease._detailsKey(user_id)).items())
+        details["Expires"] = datetime.utcfromtimestamp(expiry)
+        return details
+
+    def _stallTimeout(step):
+        return SYNC_LEASE_STEP_STALL_TIMEOUTS.get(step, SYNC_LEASE_STALL_TIMEOUT)
+
+    def _keep():
+        while True:
+            time.sleep(SYNC_LEASE_TTL / 3)
+            with SyncLease._heldLock:
+                held = dict(SyncLease._held)
+            for user_id, process in held.items():
+                try:
+                    details = redis.hmget(SyncLease._detailsKey(user_id), "Heartbeat", "Step", "Process")
+                    heartbeat = float(details[0] or 0)
+                    step = (details[1] or b"").decode("UTF-8")
+                    process = int(details[2] or process)
+                    if time.time() - heartbeat > SyncLease._stallTimeout(step):
+                        logger.error("Sync for %s stalled in %s since %s - abandoning it" % (user_id, step, datetime.utcfromtimestamp(heartbeat)))
+                    # Only renews what's still there - if it isn't, it's been reaped and may already be syncing elsewhere
+                    elif redis.execute_command("ZADD", SyncLease._key, "XX", "CH", time.time() + SYNC_LEASE_TTL, user_id):
+                        continue
+                    else:
+                        logger.error("Lost lease on %s - abandoning sync" % user_id)
+                except Exception:
+                    # Redis going away for a bit shouldn't take the syncs with it - if it's gone long enough for the leases to run out, they'll be reaped once it's back
+                    logger.exception("Could not renew lease on %s" % user_id)
+                    continue
+                # Expire it now, so it doesn't wait for the TTL to run out before being reaped
+                redis.execute_command("ZADD", SyncLease._key, "XX", 0, user_id)
+                # The hung sync has to go, or it'll carry on alongside whoever picks the user up next - if it's in this process, everything in this process goes with it, as the watchdog used to do
+                os.kill(process, signal.SIGKILL)
+
+    def StartKeeper():
+        if not SyncLease.Enabled() or SyncLease._keeper:
+            return
+        SyncLease._keeper = threading.Thread(target=SyncLease._keep, name="sync-lease-keeper", daemon=True)
+        SyncLease._keeper.start()
+
+    def NextExpiry():
+        head = redis.zrange(SyncLease._key, 0, 0, withscores=True)
+        return datetime.utcfromtimestamp(head[0][1]) if len(head) else None
+
+    def Reap():
+        # Requeues the users whose leases have run out - returns how many
+        reaped = 0
+        for user_id in redis.zrangebyscore(SyncLease._key, "-inf", time.time()):
+            user_id = user_id.decode("UTF-8")
+            if not redis.zrem(SyncLease._key, user_id):
+                continue # Released (or reaped) in the meantime
+            details = SyncLease._detailsKey(user_id)
+            generation = redis.hget(details, "Generation")
+            redis.delete(details)
+            query = {"_id": ObjectId(user_id)}
+            if generation:
+                # If it's been queued again since, that'll take care of it
+                query["QueuedGeneration"] = generation.decode("UTF-8")
+            now = datetime.utcnow()
+            result = db.users.update(query, {"$set": {"NextSynchronization": now}, "$unset": {"QueuedAt": True, "SynchronizationWorker": True}})
+            if result["n"]:
+                SyncSchedule.Notify([ObjectId(user_id)], now)
+            logger.info("Reaped expired lease on %s" % user_id)
+            reaped += 1
+        return reaped
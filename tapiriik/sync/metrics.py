@@ -0,0 +1,137 @@
+from tapiriik.database import db
+from datetime import datetime, timedelta
+import threading
+import time
+
+class SyncMetrics:
+    # Counters, gauges and histograms from the sync workers and scheduler, rolled up as they're reported into a document per BucketSize in db.sync_metrics
+    #  (plus a running total of the counters in the "total" document) - so the dashboards only ever read a handful of small documents, however much history there is.
+    # Each reporter accumulates its own, then Flushes them in a single upsert - once per sync, for the workers.
+
+    BucketSize = timedelta(minutes=10)
+    Retention = timedelta(days=7)
+    # Upper bounds of the histograms' buckets, in seconds - anything past the last goes in "inf"
+    HistogramBounds = [1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600]
+
+    def __init__(self):
+        self._lock = threading.Lock() # The upload threads report in too
+        self._counters = {}
+        self._gauges = {}
+
+    def Count(self, name, value=1):
+        # Names can be dotted, e.g. uploads.strava - they end up as nested fields
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def Gauge(self, name, value):
+        # Last one in the bucket wins
+        with self._lock:
+            self._gauges[name] = value
+
+    def Observe(self, name, value):
+        bound = next((str(x) for x in SyncMetrics.HistogramBounds if value <= x), "inf")
+        with self._lock:
+            for field, increment in ((bound, 1), ("count", 1), ("sum", value)):
+                key = "%s.%s" % (name, field)
+                self._counters[key] = self._counters.get(key, 0) + increment
+
+    def Time(self, name):
+        # with metrics.Time("step.list"): ...
+        return _MetricTimer(self, name)
+
+    def _bucket(when):
+        size = SyncMetrics.BucketSize.total_seconds()
+        return datetime(1970, 1, 1) + timedelta(seconds=(when - datetime(1970, 1, 1)).total_seconds() // size * size)
+
+    def Flush(self):
+        with self._lock:
+            counters, gauges = self._counters, self._gauges
+            self._counters, self._gauges = {}, {}
+        if not len(counters) and not len(gauges):
+            return
+        bucket = SyncMetrics._bucket(datetime.utcnow())
+        update = {"$setOnInsert": {"Expires": bucket + SyncMetrics.Retention}}
+        if len(counters):
+            update["$inc"] = dict(("Metrics.%s" % k, v) for k, v in counters.items())
+        if len(gauges):
+            update["$set"] = dict(("Gauges.%s" % k, v) for k, v in gauges.items())
+        db.sync_metrics.update({"_id": bucket}, update, upsert=True)
+        if len(counters):
+            db.sync_metrics.update({"_id": "total"}, {"$inc": update["$inc"]}, upsert=True)
+
+    def Buckets(since):
+        # (the "total" document's _id is a string, so it's never in range)
+        return list(db.sync_metrics.find({"_id": {"$gte": SyncMetrics._bucket(since)}}).sort("_id", 1))
+
+    def _field(bucket, name, default=0):
+        value = bucket
+        for part in name.split("."):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+    def Sum(buckets, name):
+        return sum(SyncMetrics._field(x, "Metrics.%s" % name) for x in buckets)
+
+    def Mean(buckets, name):
+        count = SyncMetrics.Sum(buckets, "%s.count" % name)
+        return SyncMetrics.Sum(buckets, "%s.sum" % name) / count if count else None
+
+    def Percentile(buckets, name, percentile):
+        # Only as precise as HistogramBounds - returns the bound the percentile falls under (None past the last)
+        count = SyncMetrics.Sum(buckets, "%s.count" % name)
+        if not count:
+            return None
+        seen = 0
+        for bound in SyncMetrics.HistogramBounds:
+            seen += SyncMetrics.Sum(buckets, "%s.%s" % (name, bound))
+            if seen >= count * percentile / 100:
+                return bound
+        return None
+
+    def LatestGauge(buckets, name):
+        for bucket in reversed(buckets):
+            value = SyncMetrics._field(bucket, "Gauges.%s" % name, None)
+            if value is not None:
+                return value
+        return None
+
+    _summaryCache = None
+    _summaryCacheExpiry = 0
+
+    def Summary(max_age=60):
+        # What stats_cron used to put in db.stats (same names, so the templates don't care), worked out from the buckets - and cached, since it's on every page
+        if SyncMetrics._summaryCache and time.time() < SyncMetrics._summaryCacheExpiry:
+            return SyncMetrics._summaryCache
+        now = datetime.utcnow()
+        day = SyncMetrics.Buckets(now - timedelta(hours=24))
+        hour = [x for x in day if x["_id"] >= SyncMetrics._bucket(now - timedelta(hours=1))]
+        total = db.sync_metrics.find_one({"_id": "total"}) or {}
+        syncs = SyncMetrics.Sum(hour, "sync_duration.count")
+        summary = {
+            "TotalDistanceSynced": SyncMetrics._field(total, "Metrics.distance") + SyncMetrics._field(total, "Metrics.distance_before_metrics"),
+            "LastDayDistanceSynced": SyncMetrics.Sum(day, "distance"),
+            "LastHourDistanceSynced": SyncMetrics.Sum(hour, "distance"),
+            "QueueHeadTime": SyncMetrics.Mean(hour, "queue_wait") or 0,
+            "EnqueueTime": SyncMetrics.Mean(hour, "enqueue_wait") or 0,
+            "TotalSyncTimeUsed": SyncMetrics.Sum(hour, "sync_duration.sum"),
+            "AverageSyncDuration": SyncMetrics.Mean(hour, "sync_duration") or 0,
+            "AverageSyncCPU": SyncMetrics.Sum(hour, "cpu_time") / syncs if syncs else 0,
+            "LastHourSynchronizationCount": syncs,
+            "Updated": day[-1]["_id"] if len(day) else None
+        }
+        SyncMetrics._summaryCache = summary
+        SyncMetrics._summaryCacheExpiry = time.time() + max_age
+        return summary
+
+class _MetricTimer:
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.time()
+
+    def __exit__(self, *args):
+        self._metrics.Observe(self._name, time.time() - self._start)
@@ -0,0 +1,94 @@
+from tapiriik.settings import SYNC_PRERENDER_MEMORY_BUDGET_MB
+from tapiriik.services.tcx import TCXIO
+from tapiriik.services.gpx import GPXIO
+from tapiriik.services.pwx import PWXIO
+from tapiriik.services.fit import FITIO
+from tapiriik.services.tracing import SyncTrace
+from collections import OrderedDict
+import threading
+
+class PrerenderCache:
+    # Stands in for Activity.PrerenderedFormats once an activity's been downloaded - the destinations' services say which formats they'll upload (ServiceBase.PrerenderFormats),
+    #  and each of those is rendered the first time any of them asks for it, then handed to the rest instead of each one dumping its own copy.
+    # A render's let go as soon as the last destination wanting it has it. Until then it counts against the worker's SYNC_PRERENDER_MEMORY_BUDGET_MB, which is shared by every activity in
+    #  every sync's upload pipeline - past that, the least recently used renders are dropped, and rendered again if they're asked for.
+    # The services only ever do `if "fit" in activity.PrerenderedFormats: ...activity.PrerenderedFormats["fit"]`, so they work the same with the plain dict outside of a sync.
+
+    Renderers = {
+        "tcx": TCXIO.Dump,
+        "gpx": GPXIO.Dump,
+        "pwx": PWXIO.Dump,
+        "fit": FITIO.Dump,
+        "fit_drop_pauses": lambda activity: FITIO.Dump(activity, drop_pauses=True), # Strava's
+    }
+
+    MemoryBudget = SYNC_PRERENDER_MEMORY_BUDGET_MB * 1024 * 1024
+
+    _budgetLock = threading.Lock()
+    _retained = OrderedDict() # (PrerenderCache, format) -> size, least recently used first
+    _retainedSize = 0
+
+    def __init__(self, activity, destination_formats):
+        # destination_formats being what each destination's PrerenderFormats returned
+        self._activity = activity
+        self._remaining = {} # Format -> how many destinations have yet to ask for it
+        for formats in destination_formats:
+            for format in set(formats):
+                if format in PrerenderCache.Renderers:
+                    self._remaining[format] = self._remaining.get(format, 0) + 1
+        self._renders = {}
+        # So destinations uploading at the same time wait on the one render, rather than each doing their own
+        self._formatLocks = dict((x, threading.Lock()) for x in self._remaining)
+
+    def __contains__(self, format):
+        return format in self._remaining
+
+    def __getitem__(self, format):
+        if format not in self._remaining:
+            raise KeyError(format)
+        with self._formatLocks[format]:
+            data = self._renders.get(format)
+            if data is None:
+                SyncTrace.Count("prerender.renders")
+                data = PrerenderCache.Renderers[format](self._activity)
+            else:
+                SyncTrace.Count("prerender.reuses")
+            self._remaining[format] -= 1
+            if self._remaining[format] > 0:
+                self._retain(format, data)
+            else:
+                self._release(format)
+        return data
+
+    def _retain(self, format, data):
+        key = (self, format)
+        size = len(data) # (near enough, for the str ones)
+        with PrerenderCache._budgetLock:
+            if key in PrerenderCache._retained:
+                PrerenderCache._retained.move_to_end(key)
+                return
+            if size > PrerenderCache.MemoryBudget:
+                return # Not going to fit, whatever else goes
+            while PrerenderCache._retainedSize + size > PrerenderCache.MemoryBudget:
+                (owner, evicted_format), evicted_size = PrerenderCache._retained.popitem(last=False)
+                owner._renders.pop(evicted_format, None)
+                PrerenderCache._retainedSize -= evicted_size
+                SyncTrace.Count("prerender.evictions")
+            PrerenderCache._retained[key] = size
+            PrerenderCache._retainedSize += size
+            self._renders[format] = data
+
+    def _release(self, format):
+        with PrerenderCache._budgetLock:
+            size = PrerenderCache._retained.pop((self, format), None)
+            if size is not None:
+                PrerenderCache._retainedSize -= size
+            self._renders.pop(format, None)
+
+    def Release(self):
+        # Once the activity's uploads are done with - for destinations that never got around to asking for theirs
+        for format in self._remaining:
+            self._release(format)
+
+    def RetainedSize():
+        return PrerenderCache._retainedSize
@@ -0,0 +1,64 @@
+from tapiriik.database import db, redis
+from tapiriik.settings import SYNC_PROGRESS_UPDATE_INTERVAL, SYNC_PROGRESS_REDIS
+from datetime import datetime, timedelta
+import json
+
+class SyncProgressReporter:
+    # Coalesces a sync's progress and heartbeat updates so they're written at most once per SYNC_PROGRESS_UPDATE_INTERVAL.
+    # Changes of step always go out immediately, since the watchdog's timeouts depend on the step.
+    # Which is also why the interval needs to stay well under those timeouts.
+
+    def __init__(self, user, heartbeat_callback=None, interval=timedelta(seconds=SYNC_PROGRESS_UPDATE_INTERVAL)):
+        self.user = user
+        self.Interval = interval
+        self._heartbeatCallback = heartbeat_callback
+        self._lastHeartbeat = None
+        self._lastHeartbeatStep = None
+        self._lastProgressWrite = None
+        self._writtenProgress = None
+        self._pendingProgress = None
+
+    def _redisKey(user):
+        return "sync-progress:%s" % user["_id"]
+
+    def Heartbeat(self, step):
+        if not self._heartbeatCallback:
+            return
+        if step == self._lastHeartbeatStep and self._lastHeartbeat and datetime.utcnow() - self._lastHeartbeat < self.Interval:
+            return
+        self._heartbeatCallback(step)
+        self._lastHeartbeat = datetime.utcnow()
+        self._lastHeartbeatStep = step
+
+    def Progress(self, step, progress, force=False):
+        self._pendingProgress = (step, progress)
+        if self._pendingProgress == self._writtenProgress:
+            return
+        if not force and self._writtenProgress and step == self._writtenProgress[0] and datetime.utcnow() - self._lastProgressWrite < self.Interval:
+            return
+        self.Flush()
+
+    def Flush(self):
+        if self._pendingProgress is None or self._pendingProgress == self._writtenProgress:
+            return
+        step, progress = self._pendingProgress
+        if SYNC_PROGRESS_REDIS and redis:
+            # The TTL is just so abandoned syncs don't leave these lying around
+            redis.set(SyncProgressReporter._redisKey(self.user), json.dumps({"SynchronizationProgress": progress, "SynchronizationStep": step}), ex=60 * 60 * 6)
+        else:
+            db.users.update({"_id": self.user["_id"]}, {"$set": {"SynchronizationProgress": progress, "SynchronizationStep": step}})
+        self._writtenProgress = self._pendingProgress
+        self._lastProgressWrite = datetime.utcnow()
+
+    def Clear(self):
+        if SYNC_PROGRESS_REDIS and redis:
+            redis.delete(SyncProgressReporter._redisKey(self.user))
+
+    def Get(user):
+        # Returns (progress, step) for the web's sync status, wherever it's being kept
+        if SYNC_PROGRESS_REDIS and redis:
+            progress = redis.get(SyncProgressReporter._redisKey(user))
+            if progress:
+                progress = json.loads(progress.decode("UTF-8"))
+                return progress["SynchronizationProgress"], progress["SynchronizationStep"]
+        return user.get("SynchronizationProgress", None), user.get("SynchronizationStep", None)
@@ -0,0 +1,137 @@
+from tapiriik.database import db, redis
+from tapiriik.settings import SYNC_SCHEDULE_REDIS, SYNC_SCHEDULE_RECONCILE_INTERVAL
+from pymongo.read_preferences import ReadPreference
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+import calendar
+import uuid
+import logging
+logger = logging.getLogger(__name__)
+
+class SyncSchedule:
+    # A Redis sorted set shadowing users' NextSynchronization, so sync_scheduler can sleep until exactly when the next user is due
+    #  instead of range-scanning db.users every second.
+    # db.users stays authoritative - anything that sets NextSynchronization should Notify here afterwards, but the scheduler reconciles against the DB every so often too,
+    #  and double-checks everything it pulls out of here before queueing it.
+
+    _key = "sync-schedule"
+    _wakeKey = "sync-schedule-wake"
+
+    def Enabled():
+        return SYNC_SCHEDULE_REDIS and redis is not None
+
+    def _score(when):
+        return calendar.timegm(when.utctimetuple()) + when.microsecond / 1000000
+
+    def _add(pipeline, due):
+        # (user ID, NextSynchronization) pairs - ZADD directly, since redis-py has changed its zadd signature more than once
+        due = list(due)
+        for idx in range(0, len(due), 1000):
+            args = []
+            for user_id, when in due[idx:idx + 1000]:
+                args += [SyncSchedule._score(when), str(user_id)]
+            pipeline.execute_command("ZADD", SyncSchedule._key, *args)
+
+    def Notify(user_ids, next_sync):
+        if not SyncSchedule.Enabled() or not len(user_ids):
+            return
+        pipeline = redis.pipeline()
+        if next_sync is None:
+            pipeline.zrem(SyncSchedule._key, *[str(x) for x in user_ids])
+        else:
+            SyncSchedule._add(pipeline, ((x, next_sync) for x in user_ids))
+        # Kick the scheduler in case this is sooner than whatever it's waiting on - one pending kick is as good as several
+        pipeline.lpush(SyncSchedule._wakeKey, 1)
+        pipeline.ltrim(SyncSchedule._wakeKey, 0, 0)
+        pipeline.execute()
+
+    def NotifyMatching(query, next_sync):
+        # For the bulk updates that don't know who they've touched - which set NextSynchronization to next_sync, so only those due by then (and not already queued) can have been
+        if not SyncSchedule.Enabled():
+            return
+        query = dict(query)
+        query.update({"NextSynchronization": {"$lte": next_sync}, "QueuedAt": {"$exists": False}})
+        users = list(db.users.find(query, {"_id": True, "NextSynchronization": True}))
+        if not len(users):
+            return
+        pipeline = redis.pipeline()
+        SyncSchedule._add(pipeline, ((x["_id"], x["NextSynchronization"]) for x in users))
+        pipeline.lpush(SyncSchedule._wakeKey, 1)
+        pipeline.ltrim(SyncSchedule._wakeKey, 0, 0)
+        pipeline.execute()
+
+    def Reconcile():
+        # Picks up anyone whose NextSynchronization was set without a Notify (or before the schedule was switched on)
+        # Only those due before the next Reconcile (with time to spare), so it's a range on the NextSynchronization index rather than every user - anyone later is picked up nearer the time
+        # Stale entries are left for ClaimDue to sort out
+        users = db.users.with_options(read_preference=ReadPreference.PRIMARY).find(
+                {
+                    "NextSynchronization": {"$lte": datetime.utcnow() + timedelta(seconds=SYNC_SCHEDULE_RECONCILE_INTERVAL * 2)},
+                    "QueuedAt": {"$exists": False}
+                },
+                {
+                    "_id": True,
+                    "NextSynchronization": True
+                }
+            )
+        pipeline = redis.pipeline()
+        due = [(x["_id"], x["NextSynchronization"]) for x in users]
+        SyncSchedule._add(pipeline, due)
+        pipeline.execute()
+        return len(due)
+
+    def NextDue():
+        head = redis.zrange(SyncSchedule._key, 0, 0, withscores=True)
+        return datetime.utcfromtimestamp(head[0][1]) if len(head) else None
+
+    def Wait(timeout):
+        # Returns early if something's been Notify'd in the meantime
+        redis.blpop([SyncSchedule._wakeKey], timeout=max(0.05, timeout))
+        redis.delete(SyncSchedule._wakeKey)
+
+    def ClaimDue(limit):
+        # Marks up to limit due users as queued, and returns them along with the queue generation (None if nobody was due)
+        # Some of those due per the index may turn out not to be, so there can be fewer than limit even when there's more to come
+        now = datetime.utcnow()
+        candidate_ids = [x.decode("UTF-8") for x in redis.zrangebyscore(SyncSchedule._key, "-inf", SyncSchedule._score(now), start=0, num=limit)]
+        if not len(candidate_ids):
+            return [], None
+        candidate_ids = [ObjectId(x) for x in candidate_ids]
+
+        # Out of the index before touching the DB - anything Notify'd after this point stays in, and anything before will be visible in the re-read below
+        redis.zrem(SyncSchedule._key, *[str(x) for x in candidate_ids])
+
+        generation = str(uuid.uuid4())
+        db.users.update(
+            {
+                "_id": {"$in": candidate_ids},
+                "NextSynchronization": {"$lte": now},
+                "QueuedAt": {"$exists": False}
+            }, {
+                "$set": {"QueuedAt": now, "QueuedGeneration": generation},
+                "$unset": {"NextSynchronization": True}
+            }, multi=True)
+
+        claimed = []
+        rescheduled = []
+        for user in db.users.with_options(read_preference=ReadPreference.PRIMARY).find({"_id": {"$in": candidate_ids}}, {"_id": True, "SynchronizationHostRestriction": True, "NextSyncLane": True, "NextSyncIsExhaustive": True, "ConnectedServices.Service": True, "NextSynchronization": True, "QueuedAt": True, "QueuedGeneration": True}):
+            if user.get("QueuedGeneration") == generation:
+                claimed.append(user)
+            elif user.get("NextSynchronization") and not user.get("QueuedAt"):
+                # Pushed back since it was indexed
+                rescheduled.append((user["_id"], user["NextSynchronization"]))
+        if len(rescheduled):
+            pipeline = redis.pipeline()
+            SyncSchedule._add(pipeline, rescheduled)
+            pipeline.execute()
+        return claimed, generation
+
+    def Release(deferrals, generation):
+        # Hands claimed users back to the schedule unqueued, to come due again later - (user, NextSynchronization) pairs
+        # This works without the index too, it's just the DB then
+        for user, next_sync in deferrals:
+            db.users.update({"_id": user["_id"], "QueuedGeneration": generation}, {"$set": {"NextSynchronization": next_sync}, "$unset": {"QueuedAt": True, "QueuedGeneration": True}})
+        if SyncSchedule.Enabled() and len(deferrals):
+            pipeline = redis.pipeline()
+            SyncSchedule._add(pipeline, ((user["_id"], next_sync) for user, next_sync in deferrals))
+            pipeline.execute()
@@ -1,10 +1,25 @@
-from tapiriik.database import db, cachedb, redis
+from tapiriik.database import db, cachedb, redis, close_connections
 from tapiriik.messagequeue import mq
 from tapiriik.services import Service, ServiceRecord, APIExcludeActivity, ServiceException, ServiceExceptionScope, ServiceWarning, UserException, UserExceptionType
-from tapiriik.settings import USER_SYNC_LOGS, DISABLED_SERVICES, WITHDRAWN_SERVICES
+from tapiriik.services.interchange import ActivityStatisticUnit
+from tapiriik.services.cpu_budget import CPUBudget
+from tapiriik.services.tracing import SyncTrace
+from tapiriik.settings import SYNC_TRACE_FILES, SYNC_PROFILE_SAMPLE_RATE, USER_SYNC_LOGS, DISABLED_SERVICES, WITHDRAWN_SERVICES, SYNC_LISTING_CONCURRENCY, SYNC_UPLOAD_PIPELINE_DEPTH, SYNC_WRITE_CHECKPOINT_INTERVAL, SYNC_EXHAUSTIVE_WINDOW_DAYS, SYNC_WORKER_MEMORY_TARGET_MB, SYNC_WORKER_CONCURRENT_USERS, SYNC_QUEUE_LANE_WEIGHTS, SYNC_QUEUE_POLL_INTERVAL, SYNC_RATE_LIMIT_HEADROOM
 from .activity_record import ActivityRecord, ActivityServicePrescence
+from .activity_matcher import ActivityMatcher
+from .write_buffer import WriteBehindBuffer
+from .progress import SyncProgressReporter
+from .schedule import SyncSchedule
+from .lease import SyncLease
+from .metrics import SyncMetrics
+from .lanes import LaneSelector
+from .prerender import PrerenderCache
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import deque
+from functools import partial
 from datetime import datetime, timedelta
 import sys
+import threading
 import os
 import io
 import socket
@@ -18,6 +33,13 @@ import pytz
 import kombu
 import json
 import bisect
+import resource
+import gc
+import pickle
+import queue
+import time
+import cProfile
+import pstats
 
 # Set this up separate from the logger used in this scope, so services logging messages are caught and logged into user's files.
 _global_logger = logging.getLogger("tapiriik")
@@ -34,6 +56,17 @@ if hasattr(sys.stdout, "buffer"):
 
 logger = logging.getLogger("tapiriik.sync.worker")
 
+# Which SynchronizationTask the current thread is working for - so, when several syncs share the process, each user's log only gets their own sync's messages
+_logContext = threading.local()
+
+class _UserLogFilter(logging.Filter):
+    def __init__(self, task):
+        super().__init__()
+        self._task = task
+
+    def filter(self, record):
+        return getattr(_logContext, "task", None) is self._task
+
 def _formatExc():
     try:
         exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -56,6 +89,29 @@ def _formatExc():
 def _isWarning(exc):
     return issubclass(exc.__class__, ServiceWarning)
 
+def _peakMemoryUsage():
+    # In MB - ru_maxrss is in KB (on Linux, anyways)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _logMemoryUsage(context):
+    peak = _peakMemoryUsage()
+    if peak > SYNC_WORKER_MEMORY_TARGET_MB:
+        logger.warning("Peak RSS %dMB after %s exceeds target of %dMB" % (peak, context, SYNC_WORKER_MEMORY_TARGET_MB))
+    else:
+        logger.info("Peak RSS %dMB after %s (target %dMB)" % (peak, context, SYNC_WORKER_MEMORY_TARGET_MB))
+
+# Shared between every sync task in the process, so ListingConcurrencyLimit holds regardless of how many tasks are listing at once
+_listingSemaphores = {}
+_listingSemaphoresLock = threading.Lock()
+
+def _listingSemaphore(svc):
+    if not svc.ListingConcurrencyLimit:
+        return None
+    with _listingSemaphoresLock:
+        if svc.ID not in _listingSemaphores:
+            _listingSemaphores[svc.ID] = threading.BoundedSemaphore(svc.ListingConcurrencyLimit)
+        return _listingSemaphores[svc.ID]
+
 # It's practically an ORM!
 
 def _packServiceException(step, e):
@@ -88,12 +144,47 @@ class Sync:
     SyncIntervalJitter = timedelta(minutes=5)
     MinimumSyncInterval = timedelta(seconds=30)
     MaximumIntervalBeforeExhaustiveSync = timedelta(days=14)  # Based on the general page size of 50 activites, this would be >3/day...
+    # Most periodic syncs find nothing new - so for users who've been quiet for a while, the interval doubles every so many syncs, up to what their services allow (MaximumSyncInterval by default)
+    # Anything new turning up puts them straight back to SyncInterval
+    MaximumSyncInterval = timedelta(hours=8)
+    IdleSyncsBeforeBackoff = 3
+
+    # Users are queued in one of these, depending on why they're being synced - workers split their time between them per SYNC_QUEUE_LANE_WEIGHTS
+    # "periodic" is the original tapiriik-users queue
+    Lanes = ["immediate", "triggered", "periodic", "exhaustive"]
+
+    # With fork_per_user, what does the forking (see _SyncSpawner)
+    _spawner = None
 
     def ScheduleImmediateSync(user, exhaustive=None):
         if exhaustive is None:
-            db.users.update({"_id": user["_id"]}, {"$set": {"NextSynchronization": datetime.utcnow()}})
+            db.users.update({"_id": user["_id"]}, {"$set": {"NextSynchronization": datetime.utcnow(), "NextSyncLane": "immediate"}})
         else:
-            db.users.update({"_id": user["_id"]}, {"$set": {"NextSynchronization": datetime.utcnow(), "NextSyncIsExhaustive": exhaustive}})
+            db.users.update({"_id": user["_id"]}, {"$set": {"NextSynchronization": datetime.utcnow(), "NextSyncIsExhaustive": exhaustive, "NextSyncLane": "immediate"}})
+        SyncSchedule.Notify([user["_id"]], datetime.utcnow())
+
+    def QueueLane(user):
+        # The user record needs NextSyncLane and NextSyncIsExhaustive for this
+        if user.get("NextSyncLane", None) in Sync.Lanes:
+            return user["NextSyncLane"]
+        if user.get("NextSyncIsExhaustive", False):
+            return "exhaustive"
+        return "periodic"
+
+    def QueueRoutingKey(user):
+        # Host restrictions trump lanes - there's a single queue for each host
+        if user.get("SynchronizationHostRestriction", None):
+            return user["SynchronizationHostRestriction"]
+        lane = Sync.QueueLane(user)
+        return "" if lane == "periodic" else lane
+
+    def PeriodicSyncInterval(user, idle_sync_count):
+        if user.get("NonblockingSyncErrorCount", 0) > 0:
+            return Sync.SyncInterval # Keep retrying whatever failed at the usual pace
+        # Whichever service needs checking on most often sets the limit
+        services = [Service.FromID(conn["Service"]) for conn in user.get("ConnectedServices", [])]
+        maximum = min([svc.MaximumSyncInterval or Sync.MaximumSyncInterval for svc in services] or [Sync.MaximumSyncInterval])
+        return max(Sync.SyncInterval, min(maximum, Sync.SyncInterval * (2 ** min(16, idle_sync_count // Sync.IdleSyncsBeforeBackoff)))) # Long past any sensible maximum by 2^16
 
     def SetNextSyncIsExhaustive(user, exhaustive=False):
         db.users.update({"_id": user["_id"]}, {"$set": {"NextSyncIsExhaustive": exhaustive}})
@@ -102,53 +193,206 @@ class Sync:
         Sync._channel = mq.channel()
         Sync._exchange = kombu.Exchange("tapiriik-users", type="direct")(Sync._channel)
         Sync._exchange.declare()
-        Sync._global_queue = kombu.Queue("tapiriik-users")(Sync._channel)
+        # Workers weighing a lane more heavily (SYNC_QUEUE_LANE_WEIGHTS) get first call on its users - the broker prefers higher-priority consumers, while they've room
+        Sync._global_queue = kombu.Queue("tapiriik-users", consumer_arguments={"x-priority": SYNC_QUEUE_LANE_WEIGHTS["periodic"]})(Sync._channel)
         Sync._host_queue = kombu.Queue("tapiriik-users-%s" % socket.gethostname())(Sync._channel)
         Sync._global_queue.declare()
         Sync._host_queue.declare()
         # Bind to worker-specific and general routing keys
         Sync._global_queue.bind_to(exchange="tapiriik-users", routing_key="")
         Sync._host_queue.bind_to(exchange="tapiriik-users", routing_key=socket.gethostname())
+        Sync._lane_queues = {"periodic": Sync._global_queue}
+        for lane in Sync.Lanes:
+            if lane == "periodic":
+                continue
+            Sync._lane_queues[lane] = kombu.Queue("tapiriik-users-%s" % lane, consumer_arguments={"x-priority": SYNC_QUEUE_LANE_WEIGHTS[lane]})(Sync._channel)
+            Sync._lane_queues[lane].declare()
+            Sync._lane_queues[lane].bind_to(exchange="tapiriik-users", routing_key=lane)
+        Sync._lane_selector = LaneSelector(SYNC_QUEUE_LANE_WEIGHTS)
+        # Only the workers consume - see _startConsuming
+        Sync._consumers = None
+
+    def QueueDepths():
+        # How many users are waiting in each lane, per the broker (host-restricted users aside)
+        return dict((lane, queue.queue_declare(passive=True).message_count) for lane, queue in Sync._lane_queues.items())
+
+    def _startConsuming():
+        # A consumer on each lane (and this host's queue), each allowed one unacked message - so while the worker's looking for a user, the broker pushes it the head of
+        #  every lane that has anyone waiting, and _fetchSyncTask picks between them by the lanes' weights.
+        # The channel as a whole is limited to what's being synced plus one per consumer (_limitPrefetch), so nothing's pushed here that'll sit waiting on a busy worker.
+        Sync._deliveries = dict((lane, deque()) for lane in ["host"] + list(Sync._lane_queues.keys()))
+        Sync._prefetchLimit = None
+        Sync._channel.basic_qos(0, 1, False)
+        Sync._consumers = []
+        for lane, lane_queue in [("host", Sync._host_queue)] + list(Sync._lane_queues.items()):
+            consumer = kombu.Consumer(Sync._channel, queues=[lane_queue], no_ack=False, auto_declare=False, on_message=Sync._deliveries[lane].append)
+            consumer.consume()
+            Sync._consumers.append(consumer)
+
+    def _limitPrefetch(count):
+        if count != Sync._prefetchLimit:
+            Sync._channel.basic_qos(0, count, True)
+            Sync._prefetchLimit = count
+
+    def _receiveDeliveries(timeout):
+        # Waits up to timeout seconds for the broker to push something, then takes whatever else it already has
+        wait = max(timeout, 0.01)
+        while True:
+            try:
+                mq.drain_events(timeout=wait)
+            except socket.timeout:
+                return
+            wait = 0.01
+
+    def _pickDelivery():
+        # Anything restricted to this host comes first, then the lanes by weight
+        if len(Sync._deliveries["host"]):
+            return Sync._deliveries["host"].popleft()
+        idle_lanes = []
+        for lane in Sync._lane_selector.Order():
+            if len(Sync._deliveries[lane]):
+                Sync._lane_selector.Served(lane, idle_lanes)
+                return Sync._deliveries[lane].popleft()
+            idle_lanes.append(lane)
+        return None
 
-    def PerformGlobalSync(heartbeat_callback=None, version=None, max_users=None):
-        def _callback(body, message):
-            Sync._consumeSyncTask(body, message, heartbeat_callback, version)
+    def _requeueDeliveries():
+        # Back to the head of their queues, for whichever worker's free next
+        for deliveries in Sync._deliveries.values():
+            while len(deliveries):
+                deliveries.popleft().requeue()
+
+    def _fetchSyncTask(in_flight=0, timeout=0):
+        # Returns the next user's message, or None if nobody turned up within timeout seconds
+        # in_flight being how many messages this worker's still holding on to, i.e. syncs in progress
+        if Sync._consumers is None:
+            Sync._startConsuming()
+        Sync._limitPrefetch(in_flight + len(Sync._consumers))
+        Sync._receiveDeliveries(timeout)
+        message = Sync._pickDelivery()
+        if message:
+            # Nothing more until this one's acked - and the rest go back to the queues
+            Sync._limitPrefetch(in_flight + 1)
+            Sync._receiveDeliveries(0)
+            Sync._requeueDeliveries()
+        return message
+
+    def PerformGlobalSync(heartbeat_callback=None, version=None, max_users=None, fork_per_user=False, concurrent_users=1):
+        if concurrent_users > 1:
+            if fork_per_user:
+                raise ValueError("Concurrent syncs can't be combined with forking per user")
+            return Sync._performConcurrentGlobalSync(heartbeat_callback, version, max_users, concurrent_users)
+
+        if fork_per_user and not Sync._spawner:
+            # Before the lease keeper (or anything else) gets a thread going
+            Sync._spawner = _SyncSpawner(heartbeat_callback)
+        SyncLease.StartKeeper()
+        handled_users = 0
+        while max_users is None or handled_users < max_users:
+            message = Sync._fetchSyncTask(timeout=SYNC_QUEUE_POLL_INTERVAL)
+            if message is None:
+                continue
 
-        Sync._consumer = kombu.Consumer(
-            channel=Sync._channel,
-            queues=[Sync._host_queue, Sync._global_queue],
-            callbacks=[_callback],
-            auto_declare=False
-        )
+            Sync._consumeSyncTask(message.payload, message, heartbeat_callback, version, fork_per_user=fork_per_user)
+            handled_users += 1
 
-        Sync._consumer.qos(prefetch_count=1, apply_global=False)
+            # Python won't give the memory back, so the only way down is a fresh process
+            if _peakMemoryUsage() > SYNC_WORKER_MEMORY_TARGET_MB:
+                logger.info("Peak RSS %dMB exceeds target of %dMB - recycling worker" % (_peakMemoryUsage(), SYNC_WORKER_MEMORY_TARGET_MB))
+                break
+
+    def _performConcurrentGlobalSync(heartbeat_callback, version, max_users, concurrent_users):
+        # Syncs spend most of their time waiting on remote APIs, so several can share a worker instead of each sitting on its own.
+        # The channel isn't thread-safe, so only this thread touches it - the syncs hand their messages back here to be acked once they're done.
+        completed_messages = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=concurrent_users)
+        pending_syncs = set()
+        failed_syncs = []
+        started_users = 0
+        SyncLease.StartKeeper()
+
+        consuming = True
+        try:
+            while consuming or len(pending_syncs):
+                message = None
+                # Only take as many users as we can start on right away - the rest stay in the queue for other workers
+                if consuming and len(pending_syncs) < concurrent_users:
+                    # Not too long, so finished syncs get acked in good time
+                    message = Sync._fetchSyncTask(in_flight=len(pending_syncs), timeout=0.25)
+                    if message:
+                        started_users += 1
+                        pending_syncs.add(executor.submit(Sync._consumeSyncTask, message.payload, message, heartbeat_callback, version, ack=completed_messages.put))
+                else:
+                    # Nothing to start, so wait for something to finish
+                    try:
+                        completed_messages.get(timeout=SYNC_QUEUE_POLL_INTERVAL).ack()
+                    except queue.Empty:
+                        pass
 
-        Sync._consumer.consume()
+                while not completed_messages.empty():
+                    completed_messages.get().ack()
 
-        for _ in kombu.eventloop(mq, limit=max_users):
-            pass
+                for future in [x for x in pending_syncs if x.done()]:
+                    pending_syncs.remove(future)
+                    if future.exception():
+                        # Its message is never acked, so it goes back in the queue when this worker exits - as it would have in the single-user mode
+                        logger.error("Concurrent sync failed: %s" % future.exception())
+                        failed_syncs.append(future.exception())
+
+                if not consuming:
+                    continue
+                if len(failed_syncs):
+                    logger.info("Sync failed - finishing %d in-progress syncs before exiting" % len(pending_syncs))
+                elif max_users and started_users >= max_users:
+                    pass
+                elif _peakMemoryUsage() > SYNC_WORKER_MEMORY_TARGET_MB:
+                    logger.info("Peak RSS %dMB exceeds target of %dMB - recycling worker after %d in-progress syncs" % (_peakMemoryUsage(), SYNC_WORKER_MEMORY_TARGET_MB, len(pending_syncs)))
+                else:
+                    continue
+                # Stop taking new users, but let the ones we have finish
+                consuming = False
+        finally:
+            executor.shutdown(wait=True)
+            while not completed_messages.empty():
+                completed_messages.get().ack()
+
+        if len(failed_syncs):
+            raise failed_syncs[0]
+
+    def _consumeSyncTask(body, message, heartbeat_callback_direct, version, fork_per_user=False, ack=None):
+        # With concurrent syncs, acking has to be left to the thread that owns the channel
+        ack = ack or (lambda message: message.ack())
 
-    def _consumeSyncTask(body, message, heartbeat_callback_direct, version):
         from tapiriik.auth import User
 
         user_id = body["user_id"]
         user = User.Get(user_id)
         if user is None:
             logger.warning("Could not find user %s - bailing" % user_id)
-            message.ack() # Otherwise the entire thing grinds to a halt
+            ack(message) # Otherwise the entire thing grinds to a halt
             return
         if body["generation"] != user.get("QueuedGeneration", None):
             # QueuedGeneration being different means they've gone through sync_scheduler since this particular message was queued
             # So, discard this and wait for that message to surface
             # Should only happen when I manually requeue people
             logger.warning("Queue generation mismatch for %s - bailing" % user_id)
-            message.ack()
+            ack(message)
+            return
+        if not SyncLease.Acquire(user["_id"], body["generation"]):
+            # Whoever has it will reschedule them when they're done (or the scheduler will, if they died)
+            logger.warning("%s is leased to another sync - bailing" % user_id)
+            ack(message)
             return
 
-        def heartbeat_callback(state):
-            heartbeat_callback_direct(state, user_id)
+        heartbeat_callback = Sync._heartbeatCallback(user_id, heartbeat_callback_direct)
 
         syncStart = datetime.utcnow()
+        metrics = SyncMetrics()
+        if user.get("QueuedAt"):
+            metrics.Observe("queue_wait", (syncStart - user["QueuedAt"]).total_seconds())
+        metrics.Count("syncs.%s" % Sync.QueueLane(user))
+        # With concurrent syncs, this is the whole process's CPU time while this one was running - so they'll overlap
+        cpuStart, throttledStart = CPUBudget.Usage()
 
         # Always to an exhaustive sync if there were errors
         #   Sometimes services report that uploads failed even when they succeeded.
@@ -166,31 +410,46 @@ class Sync:
 
         result = None
         try:
-            result = Sync.PerformUserSync(user, exhaustive, heartbeat_callback=heartbeat_callback)
+            if fork_per_user:
+                result = Sync._performForkedUserSync(user, exhaustive)
+            else:
+                result = Sync.PerformUserSync(user, exhaustive, heartbeat_callback=heartbeat_callback)
         finally:
             nextSync = None
+            # How many syncs in a row have had nothing to do (a failed sync doesn't count either way)
+            idleSyncCount = user.get("IdleSyncCount", 0)
+            if result:
+                idleSyncCount = 0 if result.SynchronizedActivityCount else idleSyncCount + 1
             if User.HasActivePayment(user):
                 if User.GetConfiguration(user)["suppress_auto_sync"]:
                     logger.info("Not scheduling auto sync for paid user")
                 else:
-                    nextSync = datetime.utcnow() + Sync.SyncInterval + timedelta(seconds=random.randint(-Sync.SyncIntervalJitter.total_seconds(), Sync.SyncIntervalJitter.total_seconds()))
+                    nextSync = datetime.utcnow() + Sync.PeriodicSyncInterval(user, idleSyncCount) + timedelta(seconds=random.randint(-Sync.SyncIntervalJitter.total_seconds(), Sync.SyncIntervalJitter.total_seconds()))
             if result:
                 if result.ForceNextSync:
                     logger.info("Forcing next sync at %s" % result.ForceNextSync)
                     nextSync = result.ForceNextSync
-            scheduling_result = db.users.update(
-                {
-                    "_id": user["_id"]
-                }, {
-                    "$set": {
-                        "NextSynchronization": nextSync,
-                        "LastSynchronization": datetime.utcnow(),
-                        "LastSynchronizationVersion": version
-                    }, "$unset": {
-                        "NextSyncIsExhaustive": None,
-                        "QueuedAt": None # Set by sync_scheduler when the record enters the MQ
-                    }
-                })
+            # If the lease was lost along the way, the user's been requeued (and may be syncing elsewhere already) - so the rescheduling's theirs to do, not ours
+            if SyncLease.Release(user["_id"], body["generation"] or ""):
+                scheduling_result = db.users.update(
+                    {
+                        "_id": user["_id"]
+                    }, {
+                        "$set": {
+                            "NextSynchronization": nextSync,
+                            "LastSynchronization": datetime.utcnow(),
+                            "LastSynchronizationVersion": version,
+                            "IdleSyncCount": idleSyncCount
+                        }, "$unset": {
+                            "NextSyncIsExhaustive": None,
+                            "NextSyncLane": None,
+                            "QueuedAt": None # Set by sync_scheduler when the record enters the MQ
+                        }
+                    })
+                SyncSchedule.Notify([user["_id"]], nextSync)
+            else:
+                logger.warning("Lost lease on %s before the sync finished - not rescheduling" % user_id)
+                scheduling_result = None
             reschedule_confirm_message = "User reschedule for %s returned %s" % (nextSync, scheduling_result)
 
             # Tack this on the end of the log file since otherwise it's lost for good (blegh, but nicer than moving logging out of the sync task?)
@@ -200,13 +459,117 @@ class Sync:
 
             logger.debug(reschedule_confirm_message)
             syncTime = (datetime.utcnow() - syncStart).total_seconds()
-            db.sync_worker_stats.insert({"Timestamp": datetime.utcnow(), "Worker": os.getpid(), "Host": socket.gethostname(), "TimeTaken": syncTime})
-
-        message.ack()
+            cpuEnd, throttledEnd = CPUBudget.Usage()
+            logger.info("Sync for %s took %.1fs, %.1fs CPU (%.1fs throttled)" % (user_id, syncTime, cpuEnd - cpuStart, throttledEnd - throttledStart))
+            metrics.Observe("sync_duration", syncTime)
+            metrics.Count("cpu_time", cpuEnd - cpuStart)
+            metrics.Count("throttled_time", throttledEnd - throttledStart)
+            if not result:
+                metrics.Count("sync_failures")
+            metrics.Flush()
+
+        ack(message)
+
+    def _heartbeatCallback(user_id, heartbeat_callback_direct):
+        def heartbeat_callback(state):
+            SyncLease.Heartbeat(user_id, state)
+            if heartbeat_callback_direct:
+                heartbeat_callback_direct(state, user_id)
+        return heartbeat_callback
 
     def PerformUserSync(user, exhaustive=False, heartbeat_callback=None):
         return SynchronizationTask(user).Run(exhaustive=exhaustive, heartbeat_callback=heartbeat_callback)
 
+    def _performForkedUserSync(user, exhaustive=False):
+        # The sync runs in a child process, so whatever memory it accumulates goes away with it.
+        # Meanwhile this process keeps its imports, service setup, and MQ connection for the next user.
+        # Like PerformUserSync, None if the sync didn't complete - whatever happened to the child, it's only this user's sync that failed
+        error, result = Sync._spawner.Run(user, exhaustive)
+        if error:
+            logger.error("Forked sync for %s failed: %s" % (user["_id"], error))
+            return None
+        return result
+
+
+class _SyncSpawner:
+    # Forks the processes for Sync._performForkedUserSync.
+    # A forked child only gets the thread that forked it - any lock some other thread was holding at the time (the lease keeper's, pymongo's monitors', logging's...) stays held in the child for good.
+    # So this is forked off once, while the worker's still single-threaded, and does all the per-user forking from then on: it never starts a thread or touches the database itself,
+    #  so it's always in a fit state to fork - and the worker only has to drop its Mongo connections the once.
+
+    def __init__(self, heartbeat_callback_direct):
+        # pymongo isn't fork-safe - the worker reconnects on its own when it next needs to, and the syncs do the same in their processes
+        close_connections()
+        request_read_fd, request_write_fd = os.pipe()
+        result_read_fd, result_write_fd = os.pipe()
+        self._pid = os.fork()
+        if self._pid == 0:
+            os.close(request_write_fd)
+            os.close(result_read_fd)
+            exit_code = 1
+            try:
+                _SyncSpawner._serve(os.fdopen(request_read_fd, "rb"), os.fdopen(result_write_fd, "wb"), heartbeat_callback_direct)
+                exit_code = 0
+            except:
+                logger.exception("Sync spawner failed")
+            finally:
+                # Straight out - none of the worker's cleanup (atexit, MQ connection teardown, etc.) should happen here
+                logging.shutdown()
+                sys.stdout.flush()
+                os._exit(exit_code)
+        os.close(request_read_fd)
+        os.close(result_write_fd)
+        self._requests = os.fdopen(request_write_fd, "wb")
+        self._results = os.fdopen(result_read_fd, "rb")
+
+    def Run(self, user, exhaustive):
+        # Returns (what went wrong, None) or (None, the SynchronizationTaskResult)
+        try:
+            pickle.dump((user, exhaustive), self._requests)
+            self._requests.flush()
+            return pickle.load(self._results)
+        except (EOFError, BrokenPipeError):
+            # Nothing can be forked safely from here any more, so the worker has to go
+            raise ForkedSyncException("Sync spawner %d has exited" % self._pid)
+
+    def _serve(requests, results, heartbeat_callback_direct):
+        while True:
+            try:
+                user, exhaustive = pickle.load(requests)
+            except EOFError:
+                return # The worker's gone
+            pickle.dump(_SyncSpawner._sync(user, exhaustive, heartbeat_callback_direct), results)
+            results.flush()
+
+    def _sync(user, exhaustive, heartbeat_callback_direct):
+        result_read_fd, result_write_fd = os.pipe()
+        child_pid = os.fork()
+        if child_pid == 0:
+            os.close(result_read_fd)
+            exit_code = 1
+            result_data = b""
+            try:
+                result_data = pickle.dumps(Sync.PerformUserSync(user, exhaustive, heartbeat_callback=Sync._heartbeatCallback(user["_id"], heartbeat_callback_direct)))
+                exit_code = 0
+            except:
+                logger.exception("Forked sync failed")
+            finally:
+                with os.fdopen(result_write_fd, "wb") as result_pipe:
+                    result_pipe.write(result_data)
+                logging.shutdown()
+                sys.stdout.flush()
+                os._exit(exit_code)
+
+        os.close(result_write_fd)
+        with os.fdopen(result_read_fd, "rb") as result_pipe:
+            result_data = result_pipe.read()
+        _, exit_status = os.waitpid(child_pid, 0)
+        if os.WIFSIGNALED(exit_status):
+            return ("Sync process %d was killed by signal %d" % (child_pid, os.WTERMSIG(exit_status)), None)
+        if os.WEXITSTATUS(exit_status) != 0:
+            return ("Sync process %d exited with status %d" % (child_pid, os.WEXITSTATUS(exit_status)), None)
+        return (None, pickle.loads(result_data))
+
 
 class SynchronizationTask:
     _logFormat = '[%(levelname)-8s] %(asctime)s (%(name)s:%(lineno)d) %(message)s'
@@ -214,6 +577,39 @@ class SynchronizationTask:
 
     def __init__(self, user):
         self.user = user
+        self._writeBuffer = WriteBehindBuffer(checkpoint_interval=SYNC_WRITE_CHECKPOINT_INTERVAL)
+        self._synchronizedActivityCount = 0
+        self._metrics = SyncMetrics()
+        self._trace = SyncTrace()
+        # The upload threads (one per destination) all update the activity records, sync errors and excluded services - so anything doing that holds this
+        self._bookkeepingLock = threading.RLock()
+
+    # The duplicate matcher needs to be kept in step with whatever list of activities we're working on
+    @property
+    def _activities(self):
+        return self._activityList
+
+    @_activities.setter
+    def _activities(self, activities):
+        self._activityList = activities
+        self._activityMatcher = ActivityMatcher(activities)
+
+    # Likewise, the connection lookups - these get hit for every activity, and some users have tens of thousands of SynchronizedActivities
+    @property
+    def _serviceConnections(self):
+        return self._serviceConnectionList
+
+    @_serviceConnections.setter
+    def _serviceConnections(self, connections):
+        self._serviceConnectionList = connections
+        self._serviceConnectionsById = dict((conn._id, conn) for conn in connections)
+        self._synchronizedActivityUIDs = dict((conn._id, set(conn.SynchronizedActivities)) for conn in connections if hasattr(conn, "SynchronizedActivities"))
+
+    def _getServiceConnection(self, connId):
+        return self._serviceConnectionsById[connId]
+
+    def _isSynchronizedTo(self, conn, activity):
+        return conn._id in self._synchronizedActivityUIDs and not self._synchronizedActivityUIDs[conn._id].isdisjoint(activity.UIDs)
 
     def _lockUser(self):
         db.users.update({"_id": self.user["_id"]}, {"$set": {"SynchronizationWorker": os.getpid(), "SynchronizationHost": socket.gethostname(), "SynchronizationStartTime": datetime.utcnow()}})
@@ -228,24 +624,59 @@ class SynchronizationTask:
                 }
             })
         logger.debug("User unlock returned %s" % unlock_result)
+        self._progress.Clear()
 
     def _loadServiceData(self):
         self._connectedServiceIds = [x["ID"] for x in self.user["ConnectedServices"]]
         self._serviceConnections = [ServiceRecord(x) for x in db.connections.find({"_id": {"$in": self._connectedServiceIds}})]
 
     def _updateSyncProgress(self, step, progress):
-        db.users.update({"_id": self.user["_id"]}, {"$set": {"SynchronizationProgress": progress, "SynchronizationStep": step}})
+        if not hasattr(self, "_progress"):
+            self._progress = SyncProgressReporter(self.user) # Run sets this up properly
+        self._progress.Progress(step, progress)
 
     def _initializeUserLogging(self):
         self._logging_file_handler = logging.handlers.RotatingFileHandler(USER_SYNC_LOGS + str(self.user["_id"]) + ".log", maxBytes=0, backupCount=5, encoding="utf-8")
         self._logging_file_handler.setFormatter(logging.Formatter(self._logFormat, self._logDateFormat))
         self._logging_file_handler.doRollover()
+        self._logging_file_handler.addFilter(_UserLogFilter(self))
+        _logContext.task = self
+        self._trace.Activate()
         _global_logger.addHandler(self._logging_file_handler)
 
     def _closeUserLogging(self):
         _global_logger.removeHandler(self._logging_file_handler)
         self._logging_file_handler.flush()
         self._logging_file_handler.close()
+        _logContext.task = None
+        SyncTrace.Deactivate()
+
+    def _inLogContext(self, fn):
+        # For work handed off to other threads - their messages (and time) still belong to this user's sync
+        def _withLogContext(*args, **kwargs):
+            _logContext.task = self
+            self._trace.Activate()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _logContext.task = None
+                SyncTrace.Deactivate()
+        return _withLogContext
+
+    def _finishTrace(self, profiler):
+        # The totals go in with the rest of the metrics, so they add up across all the workers - the details, to files alongside the user's log
+        if profiler:
+            profiler.disable()
+            with open(USER_SYNC_LOGS + str(self.user["_id"]) + ".profile.txt", "w") as profile_file:
+                pstats.Stats(profiler, stream=profile_file).sort_stats("cumulative").print_stats(200)
+        for (name, service), (count, seconds) in self._trace.Totals().items():
+            key = "trace.%s.%s" % (name, service) if service else "trace.%s" % name
+            self._metrics.Count("%s.count" % key, count)
+            self._metrics.Count("%s.seconds" % key, seconds)
+        for name, value in list(self._trace.Counters.items()):
+            self._metrics.Count("trace.%s" % name, value)
+        if SYNC_TRACE_FILES:
+            self._trace.Export(USER_SYNC_LOGS + str(self.user["_id"]) + ".trace.json")
 
     def _loadExtendedAuthData(self):
         self._extendedAuthDetails = list(cachedb.extendedAuthDetails.find({"ID": {"$in": self._connectedServiceIds}}))
@@ -291,6 +722,8 @@ class SynchronizationTask:
                 update_values["$unset"] = {"TriggerPartialSync": None}
 
             db.connections.update({"_id": conn._id}, update_values)
+            for error in self._syncErrors[conn._id]:
+                self._metrics.Count("errors.%s" % (error["UserException"]["Type"] if error.get("UserException") else error["Step"]))
             nonblockingSyncErrorsCount += len([x for x in self._syncErrors[conn._id] if "Block" not in x or not x["Block"]])
             blockingSyncErrorsCount += len([x for x in self._syncErrors[conn._id] if "Block" in x and x["Block"]])
             forcingExhaustiveSyncErrorsCount += len([x for x in self._syncErrors[conn._id] if "Block" in x and x["Block"] and "TriggerExhaustive" in x and x["TriggerExhaustive"]])
@@ -307,9 +740,8 @@ class SynchronizationTask:
                     "Exception": _packUserException(presc.UserException)
                 }) for svcId, presc in prescences.items()])
 
-        self._activityRecords.sort(key=lambda x: x.StartTime.replace(tzinfo=None), reverse=True)
-        composed_records = [
-            {
+        def _composeRecord(x):
+            return {
                 "StartTime": x.StartTime,
                 "EndTime": x.EndTime,
                 "Type": x.Type,
@@ -323,8 +755,19 @@ class SynchronizationTask:
                 "Abscence": _activityPrescences(x.NotPresentOnServices),
                 "FailureCounts": x.FailureCounts
             }
-            for x in self._activityRecords
-        ]
+
+        if not self._activityRecordsRewrite:
+            # Only the records this sync has touched can have changed - so leave the rest of the (potentially very large) document be.
+            updated_records = dict(("Activities.%d" % x.StoredIndex, _composeRecord(x)) for x in self._activityRecords if x.Touched and x.StoredIndex is not None)
+            if len(updated_records):
+                db.activity_records.update({"UserID": self.user["_id"]}, {"$set": updated_records})
+            new_records = [_composeRecord(x) for x in self._activityRecords if x.StoredIndex is None]
+            if len(new_records):
+                db.activity_records.update({"UserID": self.user["_id"]}, {"$push": {"Activities": {"$each": new_records, "$sort": {"StartTime": -1}}}})
+            return
+
+        self._activityRecords.sort(key=lambda x: x.StartTime.replace(tzinfo=None), reverse=True)
+        composed_records = [_composeRecord(x) for x in self._activityRecords]
 
         db.activity_records.update(
             {"UserID": self.user["_id"]},
@@ -340,11 +783,14 @@ class SynchronizationTask:
     def _initializeActivityRecords(self):
         raw_records = db.activity_records.find_one({"UserID": self.user["_id"]})
         self._activityRecords = []
+        self._activityRecordsByUID = {}
+        # If there's no document yet, or records get dropped, it all gets written back at once
+        self._activityRecordsRewrite = not raw_records
         if not raw_records:
             return
         else:
             raw_records = raw_records["Activities"]
-            for raw_record in raw_records:
+            for stored_index, raw_record in enumerate(raw_records):
                 if "UIDs" not in raw_record:
                     continue # From the few days where this was rolled out without this key...
                 rec = ActivityRecord(raw_record)
@@ -357,29 +803,56 @@ class SynchronizationTask:
                 del rec.Prescence
                 del rec.Abscence
                 rec.Touched = False
-                self._activityRecords.append(rec)
+                rec.StoredIndex = stored_index # Where it lives in the activity_records document, for the write-back
+                self._addActivityRecord(rec)
+
+    def _addActivityRecord(self, record):
+        record.Sequence = len(self._activityRecords)
+        self._activityRecords.append(record)
+        self._indexActivityRecord(record)
+
+    def _indexActivityRecord(self, record):
+        # The first record (in list order) with a given UID is the one that gets used
+        for uid in record.UIDs:
+            if uid not in self._activityRecordsByUID:
+                self._activityRecordsByUID[uid] = record
 
     def _findOrCreateActivityRecord(self, activity):
-        for record in self._activityRecords:
-            if record.UIDs & activity.UIDs:
-                record.Touched = True
-                return record
+        candidates = [self._activityRecordsByUID[uid] for uid in activity.UIDs if uid in self._activityRecordsByUID]
+        if len(candidates):
+            record = min(candidates, key=lambda x: x.Sequence)
+            record.Touched = True
+            return record
         record = ActivityRecord.FromActivity(activity)
         record.Touched = True
-        self._activityRecords.append(record)
+        record.StoredIndex = None
+        self._addActivityRecord(record)
         return record
 
     def _dropUntouchedActivityRecords(self):
         self._activityRecords[:] = [x for x in self._activityRecords if x.Touched]
+        self._activityRecordsRewrite = True
 
     def _persistServiceTrigger(self, serviceRecord):
-        self._persistTriggerServices[serviceRecord._id] = True
+        with self._bookkeepingLock:
+            self._persistTriggerServices[serviceRecord._id] = True
 
     def _shouldPersistServiceTrigger(self, serviceRecord):
         return serviceRecord._id in self._persistTriggerServices
 
     def _excludeService(self, serviceRecord, userException):
-        self._excludedServices[serviceRecord._id] = userException if userException else None
+        with self._bookkeepingLock:
+            self._excludedServices[serviceRecord._id] = userException if userException else None
+
+    def _deferRateLimitedService(self, serviceRecord, wait=None):
+        # Nothing more is going to get through to this service until its rate limits reset - so leave it be until then, and come back when they do
+        if wait is None:
+            wait = serviceRecord.Service.GlobalRateLimitReset()
+        with self._bookkeepingLock:
+            self._excludeService(serviceRecord, UserException(UserExceptionType.RateLimited))
+            self._persistServiceTrigger(serviceRecord)
+            if wait:
+                self._rateLimitResumeTimes.append(datetime.utcnow() + timedelta(seconds=wait))
 
     def _isServiceExcluded(self, serviceRecord):
         return serviceRecord._id in self._excludedServices
@@ -396,7 +869,7 @@ class SynchronizationTask:
             if conn._id in activity.ServiceDataCollection:
                 # The activity record is updated earlier for these, blegh.
                 continue
-            elif hasattr(conn, "SynchronizedActivities") and len([x for x in activity.UIDs if x in conn.SynchronizedActivities]):
+            elif self._isSynchronizedTo(conn, activity):
                 continue
             elif activity.Type not in conn.Service.SupportedActivities:
                 logger.debug("\t...%s doesn't support type %s" % (conn.Service.ID, activity.Type))
@@ -425,10 +898,6 @@ class SynchronizationTask:
             return a
 
     def _accumulateActivities(self, conn, svcActivities, no_add=False):
-        # Yep, abs() works on timedeltas
-        activityStartLeeway = timedelta(minutes=3)
-        activityStartTZOffsetLeeway = timedelta(minutes=1)
-        timezoneErrorPeriod = timedelta(hours=38)
         from tapiriik.services.interchange import ActivityType
         for act in svcActivities:
             act.UIDs = set([act.UID])
@@ -440,59 +909,9 @@ class SynchronizationTask:
             if act.TZ and not hasattr(act.TZ, "localize"):
                 raise ValueError("Got activity with TZ type " + str(type(act.TZ)) + " instead of a pytz timezone")
             # Used to ensureTZ() right here - doubt it's needed any more?
-            # Binsearch to find which activities actually need individual attention.
+            # The matcher buckets the activities so only those that could plausibly be the same need individual attention.
             # Otherwise it's O(mn^2).
-            # self._activities is sorted most recent first
-            relevantActivitiesStart = bisect.bisect_left(self._activities, act.StartTime + timezoneErrorPeriod)
-            relevantActivitiesEnd = bisect.bisect_right(self._activities, act.StartTime - timezoneErrorPeriod, lo=relevantActivitiesStart)
-            extantActIter = (
-                              x for x in (self._activities[idx] for idx in range(relevantActivitiesStart, relevantActivitiesEnd)) if
-                              (
-                                  # Identical
-                                  x.UID == act.UID
-                                  or
-                                  # Check to see if the self._activities are reasonably close together to be considered duplicate
-                                  (x.StartTime is not None and
-                                   act.StartTime is not None and
-                                   (act.StartTime.tzinfo is not None) == (x.StartTime.tzinfo is not None) and
-                                   abs(act.StartTime-x.StartTime) < activityStartLeeway
-                                  )
-                                  or
-                                  # Try comparing the time as if it were TZ-aware and in the expected TZ (this won't actually change the value of the times being compared)
-                                  (x.StartTime is not None and
-                                   act.StartTime is not None and
-                                   (act.StartTime.tzinfo is not None) != (x.StartTime.tzinfo is not None) and
-                                   abs(act.StartTime.replace(tzinfo=None)-x.StartTime.replace(tzinfo=None)) < activityStartLeeway
-                                  )
-                                  or
-                                  # Sometimes wacky stuff happens and we get two activities with the same mm:ss but different hh, because of a TZ issue somewhere along the line.
-                                  # So, we check for any activities +/- 14, wait, 38 hours that have the same minutes and seconds values.
-                                  #  (14 hours because Kiribati, and later, 38 hours because of some really terrible import code that existed on a service that shall not be named).
-                                  # There's a very low chance that two activities in this period would intersect and be merged together.
-                                  # But, given the fact that most users have maybe 0.05 activities per this period, it's an acceptable tradeoff.
-                                  (x.StartTime is not None and
-                                   act.StartTime is not None and
-                                   abs(act.StartTime.replace(tzinfo=None)-x.StartTime.replace(tzinfo=None)) < timezoneErrorPeriod and
-                                   abs(act.StartTime.replace(tzinfo=None).replace(hour=0) - x.StartTime.replace(tzinfo=None).replace(hour=0)) < activityStartTZOffsetLeeway
-                                   )
-                                  or
-                                  # Similarly, for half-hour time zones (there are a handful of quarter-hour ones, but I've got to draw a line somewhere, even if I revise it several times)
-                                  (x.StartTime is not None and
-                                   act.StartTime is not None and
-                                   abs(act.StartTime.replace(tzinfo=None)-x.StartTime.replace(tzinfo=None)) < timezoneErrorPeriod and
-                                   abs(act.StartTime.replace(tzinfo=None).replace(hour=0) - x.StartTime.replace(tzinfo=None).replace(hour=0)) > timedelta(minutes=30) - (activityStartTZOffsetLeeway / 2) and
-                                   abs(act.StartTime.replace(tzinfo=None).replace(hour=0) - x.StartTime.replace(tzinfo=None).replace(hour=0)) < timedelta(minutes=30) + (activityStartTZOffsetLeeway / 2)
-                                   )
-                               )
-                                and
-                                # Prevents closely-spaced activities of known different type from being lumped together - esp. important for manually-enetered ones
-                                (x.Type == ActivityType.Other or act.Type == ActivityType.Other or x.Type == act.Type or ActivityType.AreVariants([act.Type, x.Type]))
-                              )
-
-            try:
-                existingActivity = next(extantActIter)
-            except StopIteration:
-                existingActivity = None
+            existingActivity = self._activityMatcher.FindMatch(act)
 
             if existingActivity:
                 # we don't merge the exclude values here, since at this stage the services have the option of just not returning those activities
@@ -531,9 +950,12 @@ class SynchronizationTask:
 
                 existingActivity.UIDs |= act.UIDs  # I think this is merited
                 act.UIDs = existingActivity.UIDs  # stop the circular inclusion, not that it matters
+                self._activityMatcher.Update(existingActivity) # The StartTime may have picked up a TZ
                 continue
             if not no_add:
+                # self._activities is sorted most recent first
                 bisect.insort_left(self._activities, act)
+                self._activityMatcher.Add(act)
 
     def _determineEligibleRecipientServices(self, activity, recipientServices):
         from tapiriik.auth import User
@@ -545,7 +967,7 @@ class SynchronizationTask:
                 continue  # we don't know for sure if it needs to be uploaded, hold off for now
             flowException = True
 
-            sources = [[y for y in self._serviceConnections if y._id == x][0] for x in activity.ServiceDataCollection.keys()]
+            sources = [self._getServiceConnection(x) for x in activity.ServiceDataCollection.keys()]
             for src in sources:
                 if src.Service.ID in WITHDRAWN_SERVICES:
                     continue # They can't see this service to change the configuration.
@@ -591,7 +1013,8 @@ class SynchronizationTask:
             if not identifier:
                 raise ValueError("Activity excluded with no identifying information")
             identifier = str(identifier).replace(".", "_")
-            self._syncExclusions[serviceRecord._id][identifier] = {"Message": exclusion.Message, "Activity": str(exclusion.Activity) if exclusion.Activity else None, "ExternalActivityID": exclusion.ExternalActivityID, "Permanent": exclusion.Permanent, "Effective": datetime.utcnow(), "UserException": _packUserException(exclusion.UserException)}
+            with self._bookkeepingLock:
+                self._syncExclusions[serviceRecord._id][identifier] = {"Message": exclusion.Message, "Activity": str(exclusion.Activity) if exclusion.Activity else None, "ExternalActivityID": exclusion.ExternalActivityID, "Permanent": exclusion.Permanent, "Effective": datetime.utcnow(), "UserException": _packUserException(exclusion.UserException)}
 
     def _ensurePartialSyncPollingSubscription(self, conn):
         if conn.Service.PartialSyncRequiresTrigger and not conn.PartialSyncTriggerSubscribed:
@@ -614,6 +1037,12 @@ class SynchronizationTask:
                 conn.ExtendedAuthorization = extAuthDetails[0]
 
     def _downloadActivityList(self, conn, exhaustive, no_add=False):
+        listing = self._retrieveActivityList(conn, exhaustive)
+        if listing:
+            self._accumulateActivityList(conn, listing, no_add=no_add)
+
+    def _retrieveActivityList(self, conn, exhaustive):
+        # This may run off the main thread (see _downloadActivityLists) - so it must only touch state keyed by this connection.
         svc = conn.Service
         # Bail out as appropriate for the entire account (_syncErrors contains only blocking errors at this point)
         if [x for x in self._syncErrors[conn._id] if x["Scope"] == ServiceExceptionScope.Account]:
@@ -636,9 +1065,17 @@ class SynchronizationTask:
                 self._excludeService(conn, UserException(UserExceptionType.MissingCredentials))
                 return
 
+        listing_semaphore = _listingSemaphore(svc)
         try:
             logger.info("\tRetrieving list from " + svc.ID)
-            svcActivities, svcExclusions = svc.DownloadActivityList(conn, exhaustive)
+            if listing_semaphore:
+                listing_semaphore.acquire()
+            try:
+                with SyncTrace.Span("list", service=svc.ID):
+                    svcActivities, svcExclusions = svc.DownloadActivityList(conn, exhaustive)
+            finally:
+                if listing_semaphore:
+                    listing_semaphore.release()
         except (ServiceException, ServiceWarning) as e:
             # Special-case rate limiting errors thrown during listing
             # Otherwise, things will melt down when the limit is reached
@@ -652,17 +1089,49 @@ class SynchronizationTask:
 
             if e.UserException and e.UserException.Type == UserExceptionType.RateLimited:
                 e.TriggerExhaustive = conn._id in self._hasTransientSyncErrors and self._hasTransientSyncErrors[conn._id]
-            self._syncErrors[conn._id].append(_packServiceException(SyncStep.List, e))
-            self._excludeService(conn, e.UserException)
+            with self._bookkeepingLock:
+                self._syncErrors[conn._id].append(_packServiceException(SyncStep.List, e))
+                self._excludeService(conn, e.UserException)
+                if e.UserException and e.UserException.Type == UserExceptionType.RateLimited:
+                    self._deferRateLimitedService(conn)
             if not _isWarning(e):
                 return
         except Exception as e:
-            self._syncErrors[conn._id].append(_packException(SyncStep.List))
-            self._excludeService(conn, UserException(UserExceptionType.ListingError))
+            with self._bookkeepingLock:
+                self._syncErrors[conn._id].append(_packException(SyncStep.List))
+                self._excludeService(conn, UserException(UserExceptionType.ListingError))
             return
+        return svcActivities, svcExclusions
+
+    def _accumulateActivityList(self, conn, listing, no_add=False):
+        svcActivities, svcExclusions = listing
         self._accumulateExclusions(conn, svcExclusions)
         self._accumulateActivities(conn, svcActivities, no_add=no_add)
 
+    def _downloadActivityLists(self, conns, exhaustive, heartbeat_callback=None):
+        # Listing is almost entirely spent waiting on remote APIs, so the lists are retrieved concurrently.
+        # They're still accumulated in connection order, so the deduplication/merging is the same no matter which finishes first.
+        if not len(conns):
+            return
+        executor = ThreadPoolExecutor(max_workers=max(1, min(SYNC_LISTING_CONCURRENCY, len(conns))))
+        try:
+            pending_listings = [(conn, executor.submit(self._inLogContext(self._retrieveActivityList), conn, exhaustive)) for conn in conns]
+            try:
+                for conn, pending_listing in pending_listings:
+                    if heartbeat_callback:
+                        heartbeat_callback(SyncStep.List)
+                    self._updateSyncProgress(SyncStep.List, conn.Service.ID)
+                    listing = pending_listing.result()
+                    if listing:
+                        self._accumulateActivityList(conn, listing)
+            except:
+                # Don't bother starting anything that hasn't already
+                for conn, pending_listing in pending_listings:
+                    pending_listing.cancel()
+                raise
+        finally:
+            executor.shutdown(wait=True)
+
     def _estimateFallbackTZ(self, activities):
         from collections import Counter
         # With the hope that the majority of the activity records returned will have TZs, and the user's current TZ will constitute the majority.
@@ -688,23 +1157,21 @@ class SynchronizationTask:
         #   Before, I had moved this under all the eligibility/recipient checks, but that could cause persistent duplicate self._activities when the user had already manually uploaded the same activity to multiple sites.
         updateServicesWithExistingActivity = False
         for serviceWithExistingActivityId in activity.ServiceDataCollection.keys():
-            serviceWithExistingActivity = [x for x in self._serviceConnections if x._id == serviceWithExistingActivityId][0]
-            if not hasattr(serviceWithExistingActivity, "SynchronizedActivities") or not (activity.UIDs <= set(serviceWithExistingActivity.SynchronizedActivities)):
+            if serviceWithExistingActivityId not in self._synchronizedActivityUIDs or not (activity.UIDs <= self._synchronizedActivityUIDs[serviceWithExistingActivityId]):
                 updateServicesWithExistingActivity = True
                 break
 
         if updateServicesWithExistingActivity:
             logger.debug("\t\tUpdating SynchronizedActivities")
-            db.connections.update({"_id": {"$in": list(activity.ServiceDataCollection.keys())}},
-                                  {"$addToSet": {"SynchronizedActivities": {"$each": list(activity.UIDs)}}},
-                                  multi=True)
+            self._writeBuffer.Update(db.connections, {"_id": {"$in": list(activity.ServiceDataCollection.keys())}},
+                                     {"$addToSet": {"SynchronizedActivities": {"$each": list(activity.UIDs)}}},
+                                     multi=True)
 
     def _updateActivityRecordInitialPrescence(self, activity):
         for connWithExistingActivityId in activity.ServiceDataCollection.keys():
-            connWithExistingActivity = [x for x in self._serviceConnections if x._id == connWithExistingActivityId][0]
-            activity.Record.MarkAsPresentOn(connWithExistingActivity)
+            activity.Record.MarkAsPresentOn(self._getServiceConnection(connWithExistingActivityId))
         for conn in self._serviceConnections:
-            if hasattr(conn, "SynchronizedActivities") and len([x for x in activity.UIDs if x in conn.SynchronizedActivities]):
+            if self._isSynchronizedTo(conn, activity):
                 activity.Record.MarkAsPresentOn(conn)
 
     def _syncActivityRedisKey(user):
@@ -721,7 +1188,7 @@ class SynchronizationTask:
     def _downloadActivity(self, activity):
         act = None
         actAvailableFromSvcIds = activity.ServiceDataCollection.keys()
-        actAvailableFromSvcs = [[x for x in self._serviceConnections if x._id == dlSvcRecId][0] for dlSvcRecId in actAvailableFromSvcIds]
+        actAvailableFromSvcs = [self._getServiceConnection(dlSvcRecId) for dlSvcRecId in actAvailableFromSvcIds]
 
         servicePriorityList = Service.PreferredDownloadPriorityList()
         actAvailableFromSvcs.sort(key=lambda x: servicePriorityList.index(x.Service))
@@ -755,23 +1222,27 @@ class SynchronizationTask:
             # Load in the service data in the same place they left it.
             workingCopy.ServiceData = workingCopy.ServiceDataCollection[dlSvcRecord._id] if dlSvcRecord._id in workingCopy.ServiceDataCollection else None
             try:
-                workingCopy = dlSvc.DownloadActivity(dlSvcRecord, workingCopy)
+                with SyncTrace.Span("download", service=dlSvc.ID, activity=activity.UID):
+                    workingCopy = dlSvc.DownloadActivity(dlSvcRecord, workingCopy)
             except (ServiceException, ServiceWarning) as e:
-                if not _isWarning(e):
-                    # Persist the exception if we just exceeded the failure count
-                    # (but not if a more useful blocking exception was provided)
-                    activity.Record.IncrementFailureCount(dlSvcRecord)
-                    if activity.Record.GetFailureCount(dlSvcRecord) >= dlSvc.DownloadRetryCount and not e.Block and (not e.UserException or e.UserException.Type != UserExceptionType.RateLimited):
-                        e.Block = True
-                        e.Scope = ServiceExceptionScope.Activity
-
-                self._syncErrors[dlSvcRecord._id].append(_packServiceException(SyncStep.Download, e))
-
-                if e.Block and e.Scope == ServiceExceptionScope.Service: # I can't imagine why the same would happen at the account level, so there's no behaviour to immediately abort the sync in that case.
-                    self._excludeService(dlSvcRecord, e.UserException)
-                if not _isWarning(e):
-                    activity.Record.MarkAsNotPresentOtherwise(e.UserException)
-                    continue
+                with self._bookkeepingLock:
+                    if not _isWarning(e):
+                        # Persist the exception if we just exceeded the failure count
+                        # (but not if a more useful blocking exception was provided)
+                        activity.Record.IncrementFailureCount(dlSvcRecord)
+                        if activity.Record.GetFailureCount(dlSvcRecord) >= dlSvc.DownloadRetryCount and not e.Block and (not e.UserException or e.UserException.Type != UserExceptionType.RateLimited):
+                            e.Block = True
+                            e.Scope = ServiceExceptionScope.Activity
+
+                    self._syncErrors[dlSvcRecord._id].append(_packServiceException(SyncStep.Download, e))
+
+                    if e.Block and e.Scope == ServiceExceptionScope.Service: # I can't imagine why the same would happen at the account level, so there's no behaviour to immediately abort the sync in that case.
+                        self._excludeService(dlSvcRecord, e.UserException)
+                    if e.UserException and e.UserException.Type == UserExceptionType.RateLimited:
+                        self._deferRateLimitedService(dlSvcRecord)
+                    if not _isWarning(e):
+                        activity.Record.MarkAsNotPresentOtherwise(e.UserException)
+                        continue
             except APIExcludeActivity as e:
                 logger.info("\t\texcluded by service: %s" % e.Message)
                 e.Activity = workingCopy
@@ -781,14 +1252,15 @@ class SynchronizationTask:
             except Exception as e:
                 packed_exc = _packException(SyncStep.Download)
 
-                activity.Record.IncrementFailureCount(dlSvcRecord)
-                if activity.Record.GetFailureCount(dlSvcRecord) >= dlSvc.DownloadRetryCount:
-                    # Blegh, should just make packServiceException work with this
-                    packed_exc["Block"] = True
-                    packed_exc["Scope"] = ServiceExceptionScope.Activity
+                with self._bookkeepingLock:
+                    activity.Record.IncrementFailureCount(dlSvcRecord)
+                    if activity.Record.GetFailureCount(dlSvcRecord) >= dlSvc.DownloadRetryCount:
+                        # Blegh, should just make packServiceException work with this
+                        packed_exc["Block"] = True
+                        packed_exc["Scope"] = ServiceExceptionScope.Activity
 
-                self._syncErrors[dlSvcRecord._id].append(packed_exc)
-                activity.Record.MarkAsNotPresentOtherwise(UserException(UserExceptionType.DownloadError))
+                    self._syncErrors[dlSvcRecord._id].append(packed_exc)
+                    activity.Record.MarkAsNotPresentOtherwise(UserException(UserExceptionType.DownloadError))
                 continue
 
             activity.Record.ResetFailureCount(dlSvcRecord)
@@ -815,39 +1287,149 @@ class SynchronizationTask:
         destSvc = destinationServiceRec.Service
 
         try:
-            return destSvc.UploadActivity(destinationServiceRec, activity)
+            with SyncTrace.Span("upload", service=destSvc.ID, activity=activity.UID):
+                return destSvc.UploadActivity(destinationServiceRec, activity)
         except (ServiceException, ServiceWarning) as e:
-            if not _isWarning(e):
-                activity.Record.IncrementFailureCount(destinationServiceRec)
-                # The rate-limiting special case here is so that users don't get stranded due to rate limiting issues outside of their control
-                if activity.Record.GetFailureCount(destinationServiceRec) >= destSvc.UploadRetryCount and not e.Block and (not e.UserException or e.UserException.Type != UserExceptionType.RateLimited):
-                    e.Block = True
-                    e.Scope = ServiceExceptionScope.Activity
+            with self._bookkeepingLock:
+                if not _isWarning(e):
+                    activity.Record.IncrementFailureCount(destinationServiceRec)
+                    # The rate-limiting special case here is so that users don't get stranded due to rate limiting issues outside of their control
+                    if activity.Record.GetFailureCount(destinationServiceRec) >= destSvc.UploadRetryCount and not e.Block and (not e.UserException or e.UserException.Type != UserExceptionType.RateLimited):
+                        e.Block = True
+                        e.Scope = ServiceExceptionScope.Activity
 
-            self._syncErrors[destinationServiceRec._id].append(_packServiceException(SyncStep.Upload, e))
+                self._syncErrors[destinationServiceRec._id].append(_packServiceException(SyncStep.Upload, e))
 
-            if e.Block and e.Scope == ServiceExceptionScope.Service: # Similarly, no behaviour to immediately abort the sync if an account-level exception is raised
-                self._excludeService(destinationServiceRec, e.UserException)
-            if not _isWarning(e):
-                activity.Record.MarkAsNotPresentOn(destinationServiceRec, e.UserException if e.UserException else UserException(UserExceptionType.UploadError))
-                raise UploadException()
+                if e.Block and e.Scope == ServiceExceptionScope.Service: # Similarly, no behaviour to immediately abort the sync if an account-level exception is raised
+                    self._excludeService(destinationServiceRec, e.UserException)
+                if e.UserException and e.UserException.Type == UserExceptionType.RateLimited:
+                    self._deferRateLimitedService(destinationServiceRec)
+                if not _isWarning(e):
+                    activity.Record.MarkAsNotPresentOn(destinationServiceRec, e.UserException if e.UserException else UserException(UserExceptionType.UploadError))
+                    raise UploadException()
         except Exception as e:
             packed_exc = _packException(SyncStep.Upload)
 
-            activity.Record.IncrementFailureCount(destinationServiceRec)
-            if activity.Record.GetFailureCount(destinationServiceRec) >= destSvc.UploadRetryCount:
-                packed_exc["Block"] = True
-                packed_exc["Scope"] = ServiceExceptionScope.Activity
+            with self._bookkeepingLock:
+                activity.Record.IncrementFailureCount(destinationServiceRec)
+                if activity.Record.GetFailureCount(destinationServiceRec) >= destSvc.UploadRetryCount:
+                    packed_exc["Block"] = True
+                    packed_exc["Scope"] = ServiceExceptionScope.Activity
 
-            self._syncErrors[destinationServiceRec._id].append(packed_exc)
-            activity.Record.MarkAsNotPresentOn(destinationServiceRec, UserException(UserExceptionType.UploadError))
+                self._syncErrors[destinationServiceRec._id].append(packed_exc)
+                activity.Record.MarkAsNotPresentOn(destinationServiceRec, UserException(UserExceptionType.UploadError))
             raise UploadException()
 
-        activity.Record.ResetFailureCount(destinationServiceRec)
+        with self._bookkeepingLock:
+            activity.Record.ResetFailureCount(destinationServiceRec)
+
+    def _initializeUploadPipeline(self):
+        # Uploads run on a thread per destination, so a slow destination (e.g. Strava polling for upload completion) holds up neither the next download nor the other destinations.
+        # Each destination still receives its uploads one at a time, in the order they were queued.
+        self._uploadExecutors = {}
+        self._pendingUploads = deque()
+
+    def _queueActivityUploads(self, activity, full_activity, activitySource, destinations):
+        # Each format the destinations want is rendered once, when the first of them gets to it
+        full_activity.PrerenderedFormats = PrerenderCache(full_activity, [x.Service.PrerenderFormats(x, full_activity) for x in destinations])
+        pending_uploads = []
+        for destinationSvcRecord in destinations:
+            if destinationSvcRecord._id not in self._uploadExecutors:
+                self._uploadExecutors[destinationSvcRecord._id] = ThreadPoolExecutor(max_workers=1)
+            pending_uploads.append(self._uploadExecutors[destinationSvcRecord._id].submit(self._inLogContext(self._uploadActivityToDestination), activity, full_activity, activitySource, destinationSvcRecord))
+        self._pendingUploads.append((full_activity, pending_uploads))
+
+    def _drainUploadPipeline(self, max_pending=0, heartbeat_callback=None):
+        # Waits on the oldest queued activities until no more than max_pending remain - each one is holding a fully downloaded activity in memory.
+        while len(self._pendingUploads) > max_pending:
+            full_activity, pending_uploads = self._pendingUploads.popleft()
+            while True:
+                if heartbeat_callback:
+                    heartbeat_callback(SyncStep.Upload)
+                if not len(wait(pending_uploads, timeout=30).not_done):
+                    break
+            full_activity.PrerenderedFormats.Release()
+            # This will re-raise anything unexpected from the upload threads
+            successful_destination_service_ids = [x.result() for x in pending_uploads if x.result()]
+            for service_id in successful_destination_service_ids:
+                self._metrics.Count("uploads.%s" % service_id)
+            if len(successful_destination_service_ids):
+                self._synchronizedActivityCount += 1
+                if full_activity.Stats.Distance.Value is not None:
+                    self._metrics.Count("distance", full_activity.Stats.Distance.asUnits(ActivityStatisticUnit.Meters).Value)
+                # Not until the uploads are on the record, though
+                self._writeBuffer.AfterFlush(partial(self._pushRecentSyncActivity, full_activity, successful_destination_service_ids))
+
+    def _shutdownUploadPipeline(self):
+        for executor in self._uploadExecutors.values():
+            executor.shutdown(wait=True)
+        self._uploadExecutors = {}
+        for full_activity, pending_uploads in self._pendingUploads:
+            full_activity.PrerenderedFormats.Release()
+        self._pendingUploads.clear()
+
+    def _uploadActivityToDestination(self, activity, full_activity, activitySource, destinationSvcRecord):
+        # Runs on the destination's upload thread - returns the service ID if the upload succeeded.
+        destSvc = destinationSvcRecord.Service
+        # An upload queued before this one may have gotten the destination excluded in the meantime.
+        with self._bookkeepingLock:
+            if self._isServiceExcluded(destinationSvcRecord):
+                logger.info("\t  %s became excluded before upload of %s" % (destSvc.ID, activity.UID[:3]))
+                activity.Record.MarkAsNotPresentOn(destinationSvcRecord, self._getServiceExclusionUserException(destinationSvcRecord))
+                return None
+
+        uploaded_external_id = None
+        logger.info("\t  Uploading %s to %s" % (activity.UID[:3], destSvc.ID))
+        try:
+            uploaded_external_id = self._uploadActivity(full_activity, destinationSvcRecord)
+        except UploadException:
+            return None # At this point it's already been added to the error collection, so we can just bail.
+        logger.info("\t  Uploaded %s to %s" % (activity.UID[:3], destSvc.ID))
+
+        with self._bookkeepingLock:
+            activity.Record.MarkAsSynchronizedTo(destinationSvcRecord)
+
+        if uploaded_external_id:
+            # record external ID, for posterity (and later debugging)
+            self._writeBuffer.Insert(db.uploaded_activities, {"ExternalID": uploaded_external_id, "Service": destSvc.ID, "UserExternalID": destinationSvcRecord.ExternalID, "Timestamp": datetime.utcnow()})
+        # flag as successful
+        self._writeBuffer.Update(db.connections, {"_id": destinationSvcRecord._id},
+                                 {"$addToSet": {"SynchronizedActivities": {"$each": list(activity.UIDs)}}})
+
+        self._writeBuffer.Update(db.sync_stats, {"ActivityID": activity.UID}, {"$addToSet": {"DestinationServices": destSvc.ID, "SourceServices": activitySource.ID}, "$set": {"Distance": activity.Stats.Distance.asUnits(ActivityStatisticUnit.Meters).Value, "Timestamp": datetime.utcnow()}}, upsert=True)
+        return destSvc.ID
+
+    def _iterateActivityWindows(self, windowed, heartbeat_callback=None):
+        # Exhaustive syncs can cover thousands of activities, with everything that came along with their listings.
+        # So, they're dealt with in windows (by start time) and each window is let go of once it's done - memory use stays flat regardless of the size of the account.
+        # self._activities keeps including the current window, so deferred listings still get merged into those activities.
+        if not windowed:
+            for activity in self._activities:
+                yield activity
+            return
+        windowPeriod = timedelta(days=SYNC_EXHAUSTIVE_WINDOW_DAYS)
+        remaining = self._activities
+        while len(remaining):
+            # self._activities is sorted most recent first
+            windowEnd = remaining[0].StartTime.replace(tzinfo=None) - windowPeriod
+            windowLength = next((idx for idx, act in enumerate(remaining) if act.StartTime.replace(tzinfo=None) <= windowEnd), len(remaining))
+            window = remaining[:windowLength]
+            remaining = remaining[windowLength:]
+            logger.info("Processing %d activities from %s back" % (len(window), window[0].StartTime))
+            for activity in window:
+                yield activity
+            del activity
+            del window
+
+            # Everything from this window has to be out of the way before it can be released
+            self._drainUploadPipeline(heartbeat_callback=heartbeat_callback)
+            self._writeBuffer.Flush()
+            self._activities = remaining
+            gc.collect()
+            _logMemoryUsage("activity window")
 
     def Run(self, exhaustive=False, null_next_sync_on_unlock=False, heartbeat_callback=None):
         from tapiriik.auth import User
-        from tapiriik.services.interchange import ActivityStatisticUnit
 
         if len(self.user["ConnectedServices"]) <= 1:
             return # Done and done!
@@ -859,11 +1441,26 @@ class SynchronizationTask:
         # Mark this user as in-progress.
         self._lockUser()
 
+        # Progress and heartbeats are reported at most every so often, rather than every time they're touched
+        self._progress = SyncProgressReporter(self.user, heartbeat_callback=heartbeat_callback)
+        heartbeat_callback = self._progress.Heartbeat
+
         # Reset their progress
-        self._updateSyncProgress(SyncStep.List, 0)
+        self._progress.Progress(SyncStep.List, 0, force=True)
 
         self._initializeUserLogging()
 
+        profiler = None
+        if self.user.get("SyncProfile") or random.random() < SYNC_PROFILE_SAMPLE_RATE:
+            # This only sees the sync's own thread - time on the listing & upload threads shows up as waiting for them
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Newer Pythons only allow one at a time - some other sync in this worker has it
+                logger.info("Could not profile sync, another is being profiled")
+                profiler = None
+
         logger.info("Beginning sync for " + str(self.user["_id"]) + "(exhaustive: " + str(exhaustive) + ")")
 
         # Sets up serviceConnections
@@ -875,13 +1472,18 @@ class SynchronizationTask:
         self._excludedServices = {}
         self._deferredServices = []
         self._persistTriggerServices = {}
+        self._rateLimitResumeTimes = []
 
         self._initializePersistedSyncErrorsAndExclusions()
 
         self._initializeActivityRecords()
 
+        self._initializeUploadPipeline()
+
+        activitiesStart = None
         try:
             try:
+                listConnections = []
                 for conn in self._serviceConnections:
                     # If we're not going to be doing anything anyways, stop now
                     if len(self._serviceConnections) - len(self._excludedServices) <= 1:
@@ -897,11 +1499,23 @@ class SynchronizationTask:
                         self._deferredServices.append(conn._id)
                         continue
 
-                    if heartbeat_callback:
-                        heartbeat_callback(SyncStep.List)
+                    # No point starting on a service we'd run out of requests for partway through
+                    # (after the trigger check - one that wasn't going to be listed anyways shouldn't bring the user back at the reset)
+                    if conn.Service.GlobalRateLimitWait(SYNC_RATE_LIMIT_HEADROOM):
+                        rateLimitWait = conn.Service.GlobalRateLimitReset(SYNC_RATE_LIMIT_HEADROOM)
+                        logger.info("Service %s is rate limited for another %d seconds" % (conn.Service.ID, rateLimitWait))
+                        self._deferRateLimitedService(conn, wait=rateLimitWait)
+                        continue
 
-                    self._updateSyncProgress(SyncStep.List, conn.Service.ID)
-                    self._downloadActivityList(conn, exhaustive)
+                    listConnections.append(conn)
+
+                with self._metrics.Time("step.list"):
+                    self._downloadActivityLists(listConnections, exhaustive, heartbeat_callback=heartbeat_callback)
+                activitiesStart = time.time()
+
+                # Same as above, now that listing may have excluded some services
+                if len(self._serviceConnections) - len(self._excludedServices) <= 1:
+                    raise SynchronizationCompleteException()
 
                 self._applyFallbackTZ()
 
@@ -911,8 +1525,8 @@ class SynchronizationTask:
                 totalActivities = len(self._activities)
                 processedActivities = 0
 
-                for activity in self._activities:
-                    logger.info(str(activity) + " " + str(activity.UID[:3]) + " from " + str([[y.Service.ID for y in self._serviceConnections if y._id == x][0] for x in activity.ServiceDataCollection.keys()]))
+                for activity in self._iterateActivityWindows(exhaustive, heartbeat_callback=heartbeat_callback):
+                    logger.info(str(activity) + " " + str(activity.UID[:3]) + " from " + str([self._getServiceConnection(x).Service.ID for x in activity.ServiceDataCollection.keys()]))
                     logger.info(" Name: %s Notes: %s Distance: %s%s" % (activity.Name[:15] if activity.Name else "", activity.Notes[:15] if activity.Notes else "", activity.Stats.Distance.Value, activity.Stats.Distance.Units))
                     try:
                         activity.Record = self._findOrCreateActivityRecord(activity) # Make it a member of the activity, to avoid passing it around as a seperate parameter everywhere.
@@ -921,7 +1535,7 @@ class SynchronizationTask:
                         self._updateActivityRecordInitialPrescence(activity)
 
                         actAvailableFromConnIds = activity.ServiceDataCollection.keys()
-                        actAvailableFromConns = [[x for x in self._serviceConnections if x._id == dlSvcRecId][0] for dlSvcRecId in actAvailableFromConnIds]
+                        actAvailableFromConns = [self._getServiceConnection(dlSvcRecId) for dlSvcRecId in actAvailableFromConnIds]
 
                         # Check if this is too soon to synchronize
                         if self._user_config["sync_upload_delay"]:
@@ -1019,7 +1633,9 @@ class SynchronizationTask:
                         logger.info("\t\t...to " + str([x.Service.ID for x in recipientServices]))
 
                         # Download the full activity record
-                        full_activity, activitySource = self._downloadActivity(activity)
+                        with self._metrics.Time("step.download"):
+                            full_activity, activitySource = self._downloadActivity(activity)
+                        self._metrics.Count("activities")
 
                         if full_activity is None:  # couldn't download it from anywhere, or the places that had it said it was broken
                             # The activity record gets updated in _downloadActivity
@@ -1048,14 +1664,13 @@ class SynchronizationTask:
                             # raise ActivityShouldNotSynchronizeException()
 
                         activity.Record.SetActivity(activity) # Update with whatever more accurate information we may have.
+                        self._indexActivityRecord(activity.Record) # ...which may include more UIDs
 
                         full_activity.Record = activity.Record # Some services don't return the same object, so this gets lost, which is meh, but...
 
-                        successful_destination_service_ids = []
+                        uploadDestinations = []
 
                         for destinationSvcRecord in eligibleServices:
-                            if heartbeat_callback:
-                                heartbeat_callback(SyncStep.Upload)
                             destSvc = destinationSvcRecord.Service
                             if not destSvc.ReceivesStationaryActivities and full_activity.Stationary:
                                 logger.info("\t\t...marked as stationary during download")
@@ -1066,40 +1681,41 @@ class SynchronizationTask:
                                     logger.info("\t\t...marked as non-GPS during download")
                                     activity.Record.MarkAsNotPresentOn(destinationSvcRecord, UserException(UserExceptionType.NonGPSUnsupported))
                                     continue
+                            uploadDestinations.append(destinationSvcRecord)
 
-                            uploaded_external_id = None
-                            logger.info("\t  Uploading to " + destSvc.ID)
-                            try:
-                                uploaded_external_id = self._uploadActivity(full_activity, destinationSvcRecord)
-                            except UploadException:
-                                continue # At this point it's already been added to the error collection, so we can just bail.
-                            logger.info("\t  Uploaded")
-
-                            activity.Record.MarkAsSynchronizedTo(destinationSvcRecord)
-                            successful_destination_service_ids.append(destSvc.ID)
-
-                            if uploaded_external_id:
-                                # record external ID, for posterity (and later debugging)
-                                db.uploaded_activities.insert({"ExternalID": uploaded_external_id, "Service": destSvc.ID, "UserExternalID": destinationSvcRecord.ExternalID, "Timestamp": datetime.utcnow()})
-                            # flag as successful
-                            db.connections.update({"_id": destinationSvcRecord._id},
-                                                  {"$addToSet": {"SynchronizedActivities": {"$each": list(activity.UIDs)}}})
-
-                            db.sync_stats.update({"ActivityID": activity.UID}, {"$addToSet": {"DestinationServices": destSvc.ID, "SourceServices": activitySource.ID}, "$set": {"Distance": activity.Stats.Distance.asUnits(ActivityStatisticUnit.Meters).Value, "Timestamp": datetime.utcnow()}}, upsert=True)
-
-                        if len(successful_destination_service_ids):
-                            self._pushRecentSyncActivity(full_activity, successful_destination_service_ids)
+                        # The uploads proceed in the background while we move on to downloading the next activity
+                        self._queueActivityUploads(activity, full_activity, activitySource, uploadDestinations)
+                        self._drainUploadPipeline(max_pending=SYNC_UPLOAD_PIPELINE_DEPTH, heartbeat_callback=heartbeat_callback)
                         del full_activity
                         processedActivities += 1
                     except ActivityShouldNotSynchronizeException:
                         continue
                     finally:
                         del activity
+                        self._writeBuffer.Checkpoint()
 
             except SynchronizationCompleteException:
                 # This gets thrown when there is obviously nothing left to do - but we still need to clean things up.
                 logger.info("SynchronizationCompleteException thrown")
 
+            logger.info("Waiting on remaining uploads")
+            self._drainUploadPipeline(heartbeat_callback=heartbeat_callback)
+            if activitiesStart:
+                self._metrics.Observe("step.activities", time.time() - activitiesStart)
+            finalizeStart = time.time()
+
+            if len(self._rateLimitResumeTimes):
+                # Come back as soon as there's room again - unless they'd be synced sooner anyways
+                # Jittered, so everyone who ran into the limit doesn't come back at the same instant and run straight into it again
+                resume_at = max(min(self._rateLimitResumeTimes), datetime.utcnow() + Sync.MinimumSyncInterval) + timedelta(seconds=random.randint(0, int(Sync.SyncIntervalJitter.total_seconds())))
+                if resume_at - datetime.utcnow() < Sync.SyncInterval:
+                    logger.info("Rescheduling for rate limit reset at %s" % resume_at)
+                    sync_result.ForceScheduleNextSyncOnOrBefore(resume_at)
+
+            # Before anything below records these activities as synchronized
+            logger.info("Flushing sync bookkeeping")
+            self._writeBuffer.Flush()
+
             logger.info("Writing back service data")
             self._writeBackSyncErrorsAndExclusions()
 
@@ -1116,8 +1732,10 @@ class SynchronizationTask:
             self._destroyExtendedAuthData()
 
             logger.info("Unlocking user")
+            self._progress.Flush()
             # Unlock the user.
             self._unlockUser()
+            self._metrics.Observe("step.finalize", time.time() - finalizeStart)
 
         except:
             # oops.
@@ -1125,20 +1743,41 @@ class SynchronizationTask:
             raise
         else:
             logger.info("Finished sync for %s (worker %d)" % (self.user["_id"], os.getpid()))
+            _logMemoryUsage("sync")
         finally:
+            self._shutdownUploadPipeline()
+            if self._writeBuffer.PendingCount():
+                # Otherwise the uploads that did complete would be repeated next time around
+                try:
+                    self._writeBuffer.Flush()
+                except:
+                    logger.exception("Could not flush sync bookkeeping")
+            try:
+                self._finishTrace(profiler)
+            except:
+                logger.exception("Could not record sync trace")
+            try:
+                self._metrics.Flush()
+            except:
+                logger.exception("Could not record sync metrics")
             self._closeUserLogging()
 
+        sync_result.SynchronizedActivityCount = self._synchronizedActivityCount
         return sync_result
 
 
 class SynchronizationTaskResult:
     def __init__(self, force_next_sync=None):
         self.ForceNextSync = force_next_sync
+        self.SynchronizedActivityCount = 0 # Activities uploaded anywhere
 
     def ForceScheduleNextSyncOnOrBefore(self, next_sync):
         self.ForceNextSync = self.ForceNextSync if self.ForceNextSync and self.ForceNextSync < next_sync else next_sync
 
 
+class ForkedSyncException(Exception):
+    pass
+
 class UploadException(Exception):
     pass
 
@@ -0,0 +1,89 @@
+from pymongo import InsertOne, UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    # Collects the sync's bookkeeping writes and sends them to the DB in bulk_write batches at checkpoints, instead of a round-trip apiece.
+    # Anything that announces an activity as synchronized (the recent sync list, the activity records) has to happen after the writes backing it are stored -
+    #  use AfterFlush for the former, and Flush before the latter.
+
+    def __init__(self, checkpoint_interval=25, max_age=timedelta(seconds=30)):
+        self.CheckpointInterval = checkpoint_interval
+        self.MaxAge = max_age
+        self._lock = threading.Lock() # Uploads queue their writes from their own threads
+        self._operations = []
+        self._afterFlush = []
+        self._checkpoints = 0
+        self._oldestOperation = None
+
+    def _queue(self, collection, operation):
+        with self._lock:
+            if not len(self._operations):
+                self._oldestOperation = datetime.utcnow()
+            self._operations.append((collection, operation))
+
+    def Insert(self, collection, document):
+        self._queue(collection, InsertOne(document))
+
+    def Update(self, collection, spec, document, upsert=False, multi=False):
+        self._queue(collection, (UpdateMany if multi else UpdateOne)(spec, document, upsert=upsert))
+
+    def AfterFlush(self, callback):
+        # The callback runs once everything queued before it has been written
+        with self._lock:
+            self._afterFlush.append(callback)
+
+    def PendingCount(self):
+        return len(self._operations)
+
+    def Checkpoint(self):
+        self._checkpoints += 1
+        if self._checkpoints >= self.CheckpointInterval or (self._oldestOperation and datetime.utcnow() - self._oldestOperation > self.MaxAge):
+            self.Flush()
+
+    def Flush(self):
+        # Whatever doesn't get written stays queued (with the callbacks waiting on it) for the next Flush - and the error's raised, so the sync knows its bookkeeping is behind
+        with self._lock:
+            operations = list(self._operations)
+            callbacks = list(self._afterFlush)
+
+        batches = OrderedDict()
+        for entry in operations:
+            collection = entry[0]
+            if collection.full_name not in batches:
+                batches[collection.full_name] = (collection, [])
+            batches[collection.full_name][1].append(entry)
+
+        written = []
+        try:
+            # Ordered, since e.g. the sync_stats upserts for the same activity can't race each other
+            for full_name, (collection, batch) in batches.items():
+                try:
+                    collection.bulk_write([x[1] for x in batch], ordered=True)
+                except BulkWriteError as e:
+                    # Being ordered, everything before the one that failed went through - and mustn't be repeated
+                    failed_at = e.details["writeErrors"][0]["index"] if e.details.get("writeErrors") else 0
+                    written += batch[:failed_at]
+                    raise
+                written += batch
+        except:
+            logger.exception("Failed writing %d of %d operations" % (len(operations) - len(written), len(operations)))
+            raise
+        finally:
+            written_ids = set(id(x) for x in written)
+            with self._lock:
+                self._operations = [x for x in self._operations if id(x) not in written_ids]
+                if not len(self._operations):
+                    self._oldestOperation = None
+
+        with self._lock:
+            self._afterFlush = self._afterFlush[len(callbacks):]
+            self._checkpoints = 0
+        logger.debug("Flushed %d operations in %d batches" % (len(operations), len(batches)))
+
+        for callback in callbacks:
+            callback()
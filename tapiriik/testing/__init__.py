@@ -1,4 +1,7 @@
 from .sync import *
 from .interchange import *
 from .gpx import *
+from .tcx import *
+from .fit import *
 from .statistics import *
+from .ratelimiting import *
@@ -0,0 +1,57 @@
+# These aren't part of the test suite - run them with python -m tapiriik.testing.benchmarks
+from tapiriik.testing.testtools import TestTools
+
+from tapiriik.sync import SynchronizationTask
+from tapiriik.sync.activity_matcher import ActivityMatcher
+
+import bisect
+import time
+
+
+def _timed(name, fn):
+    start = time.time()
+    result = fn()
+    print("%-40s %8.3fs" % (name, time.time() - start))
+    return result
+
+
+def benchmark_activity_matching(count=10000):
+    ''' listing accumulation for an account with count activities on each of three services '''
+    svcA, svcB = TestTools.create_mock_services()
+    svcC = TestTools.create_mock_service("mockC")
+    records, lists = TestTools.create_synthetic_activity_lists([svcA, svcB, svcC], count, seed=1)
+
+    def accumulate():
+        s = SynchronizationTask(None)
+        s._activities = []
+        for record, svcList in zip(records, lists):
+            s._accumulateActivities(record, svcList)
+        return len(s._activities)
+
+    def scan():
+        # What _accumulateActivities used to do - check every activity within the window, one by one
+        activities = []
+        for svcList in lists:
+            for act in svcList:
+                lo = bisect.bisect_left(activities, act.StartTime + ActivityMatcher.TimezoneErrorPeriod)
+                hi = bisect.bisect_right(activities, act.StartTime - ActivityMatcher.TimezoneErrorPeriod, lo=lo)
+                if not next((x for x in activities[lo:hi] if ActivityMatcher.IsSameActivity(x, act)), None):
+                    bisect.insort_left(activities, act)
+        return len(activities)
+
+    def match():
+        matcher = ActivityMatcher()
+        for svcList in lists:
+            for act in svcList:
+                if not matcher.FindMatch(act):
+                    matcher.Add(act)
+
+    print("%d listed activities" % sum(len(x) for x in lists))
+    _timed("window scan (matching only)", scan)
+    _timed("ActivityMatcher (matching only)", match)
+    merged = _timed("_accumulateActivities", accumulate)
+    print("%d distinct activities" % merged)
+
+
+if __name__ == "__main__":
+    benchmark_activity_matching()
@@ -0,0 +1,108 @@
+from tapiriik.testing.testtools import TestTools, TapiriikTestCase
+from tapiriik.services.fit import FITIO, FITMessageDecoder
+from tapiriik.services.interchange import ActivityType, WaypointType
+
+from datetime import datetime, timedelta
+import struct
+import pytz
+
+def _fitFile(data):
+    return struct.pack("<BBHI4s", 12, 16, 810, len(data), b".FIT") + data + b"\0\0" # Parse doesn't check the CRC
+
+_epoch = datetime(1989, 12, 31, tzinfo=pytz.utc)
+
+# Bits of FIT the encoder doesn't produce - a big-endian definition, a developer field, compressed timestamps and a message we don't know
+_records = b"".join([
+    struct.pack("<BBBHB3B", 0x40, 0, 0, 0, 1, 0, 1, 0x00), # file_id
+    struct.pack("<BB", 0x00, 4),
+    struct.pack("<BBBHB12B", 0x41, 0, 0, 206, 4, 0, 1, 0x02, 1, 1, 0x02, 2, 1, 0x02, 3, 8, 0x07), # field_description
+    struct.pack("<BBBB8s", 0x01, 0, 0, 0x84, b"Stryd"),
+    struct.pack(">BBBHB12BB3B", 0x62, 0, 1, 20, 4, 253, 4, 0x86, 3, 1, 0x02, 0, 4, 0x85, 1, 4, 0x85, 1, 0, 2, 0), # record, big-endian, with the developer field
+    struct.pack(">BIBiiH", 0x02, 1000000030, 120, 2 ** 29, -2 ** 29, 250),
+    struct.pack("<BBBHB3B", 0x43, 0, 0, 20, 1, 3, 1, 0x02), # record, HR only
+    struct.pack("<BB", 0x80 | (3 << 5) | 31, 125),
+    struct.pack("<BB", 0x80 | (3 << 5) | 18, 0xFF), # Rolls over to the next 32 seconds
+    struct.pack("<BBBHB3B", 0x44, 0, 0, 999, 1, 0, 2, 0x84), # Something we don't know
+    struct.pack("<BH", 0x04, 1234),
+])
+
+
+class FITTests(TapiriikTestCase):
+    def test_round_trip(self):
+        ''' what Dump writes, Parse reads back '''
+        svc, other = TestTools.create_mock_services()
+        svc.SupportsHR = svc.SupportsPower = svc.SupportsTemp = svc.SupportsCalories = svc.SupportsCadence = True
+        act = TestTools.create_random_activity(svc, ActivityType.Cycling, tz=True)
+        parsed = FITIO.Parse(FITIO.Dump(act))
+        self.assertEqual(parsed.Type, ActivityType.Cycling)
+        self.assertEqual((parsed.StartTime, parsed.EndTime), (act.StartTime, act.EndTime))
+        self.assertEqual(parsed.FallbackTZ.utcoffset(None), act.StartTime.utcoffset())
+        self.assertEqual([(x.StartTime, x.EndTime) for x in parsed.Laps], [(x.StartTime, x.EndTime) for x in act.Laps])
+        self.assertAlmostEqual(parsed.Stats.Distance.Value, act.Stats.Distance.Value, places=1)
+        self.assertTrue(parsed.GPS)
+        for original, wp in zip(act.GetFlatWaypoints(), parsed.GetFlatWaypoints()):
+            self.assertEqual(wp.Timestamp, original.Timestamp)
+            if wp.Type not in (WaypointType.Start, WaypointType.End):
+                self.assertEqual(wp.Type, original.Type)
+            self.assertAlmostEqual(wp.Location.Latitude, original.Location.Latitude, places=6)
+            self.assertAlmostEqual(wp.Location.Altitude, original.Location.Altitude, places=0)
+            self.assertEqual((wp.HR, wp.Power, wp.Temp, wp.Calories, wp.Cadence), (original.HR, original.Power, original.Temp, original.Calories, original.Cadence))
+
+    def test_run_cadence(self):
+        ''' FIT's cadence goes back into RunCadence for runs '''
+        svc, other = TestTools.create_mock_services()
+        svc.SupportsCadence = True
+        act = TestTools.create_random_activity(svc, ActivityType.Running, tz=True)
+        parsed = FITIO.Parse(FITIO.Dump(act))
+        self.assertEqual([x.RunCadence for x in parsed.GetFlatWaypoints()], [x.Cadence for x in act.GetFlatWaypoints()])
+        self.assertEqual(set(x.Cadence for x in parsed.GetFlatWaypoints()), set([None]))
+
+    def test_compressed_timestamps(self):
+        ''' records can be written with compressed timestamps, even when the low local message types are already taken '''
+        svc, other = TestTools.create_mock_services()
+        svc.SupportsHR = True
+        act = TestTools.create_random_activity(svc, ActivityType.Cycling, tz=True, withPauses=False)
+        act.GetFlatWaypoints()[1].Type = WaypointType.Pause # So the event message gets in first
+        act.GetFlatWaypoints()[2].Type = WaypointType.Resume
+        compressed = FITIO.Dump(act, compress_timestamps=True)
+        self.assertLess(len(compressed), len(FITIO.Dump(act)))
+        parsed = FITIO.Parse(compressed)
+        self.assertEqual([(x.Timestamp, x.HR) for x in parsed.GetFlatWaypoints()], [(x.Timestamp, x.HR) for x in act.GetFlatWaypoints()])
+        self.assertEqual([x.Type for x in parsed.GetFlatWaypoints()][1:3], [WaypointType.Pause, WaypointType.Resume])
+
+    def test_crc(self):
+        ''' FIT's CRC-16 matches the standard check value '''
+        self.assertEqual(FITIO._calculateCRC(b"123456789"), 0xBB3D)
+
+    def test_decode(self):
+        ''' big-endian definitions, developer fields and compressed timestamps '''
+        messages = list(FITMessageDecoder().Decode(_records))
+        self.assertEqual([(name, count) for name, columns, count in messages], [("file_id", 1), ("field_description", 1), ("record", 1), ("record", 2)])
+        record = messages[2][1]
+        self.assertEqual(record["timestamp"], [_epoch + timedelta(seconds=1000000030)])
+        self.assertEqual(record["position_lat"], [45])
+        self.assertEqual(record["position_long"], [-45])
+        self.assertEqual(record["Stryd"], [250])
+        compressed = messages[3][1]
+        self.assertEqual(compressed["timestamp"], [_epoch + timedelta(seconds=1000000031), _epoch + timedelta(seconds=1000000050)])
+        self.assertEqual(compressed["heart_rate"], [125, None])
+
+    def test_parse(self):
+        ''' records without laps or a session still make an activity '''
+        act = FITIO.Parse(_fitFile(_records))
+        self.assertEqual(act.Type, ActivityType.Other)
+        self.assertEqual(len(act.Laps), 1)
+        self.assertEqual([x.HR for x in act.GetFlatWaypoints()], [120, 125, None])
+        self.assertEqual(act.StartTime, _epoch + timedelta(seconds=1000000030))
+        self.assertEqual(act.EndTime, _epoch + timedelta(seconds=1000000050))
+        self.assertTrue(act.GPS)
+
+    def test_parse_invalid(self):
+        ''' things that aren't FIT activities are ValueErrors '''
+        self.assertRaises(ValueError, FITIO.Parse, b"<gpx></gpx>")
+        self.assertRaises(ValueError, FITIO.Parse, _fitFile(_records[:-5]))
+        self.assertRaises(ValueError, FITIO.Parse, _fitFile(struct.pack("<BBBHB3B", 0x40, 0, 0, 0, 1, 0, 1, 0x00) + struct.pack("<BB", 0x00, 6)))
+        self.assertRaises(ValueError, FITIO.Parse, _fitFile(struct.pack("<BB", 0x05, 1)))
+        # A field_description without the fields that make it one
+        self.assertRaises(ValueError, FITIO.Parse, _fitFile(_records[:11] + struct.pack("<BBBHB3B", 0x41, 0, 0, 206, 1, 3, 8, 0x07) + struct.pack("<B8s", 0x01, b"Stryd")))
+
@@ -19,3 +19,22 @@ class GPXTests(TapiriikTestCase):
         act.Stats.Distance = act2.Stats.Distance = None  # same here
 
         self.assertActivitiesEqual(act2, act)
+
+    def test_parse_summary_only(self):
+        ''' summary_only gives the same start/end times (and so UID) as a full parse, with only the first waypoint '''
+        svcA, other = TestTools.create_mock_services()
+        act = TestTools.create_random_activity(svcA, tz=True, withPauses=True)
+        data = bytes(GPXIO.Dump(act), "UTF-8")
+
+        full = GPXIO.Parse(data)
+        summary = GPXIO.Parse(data, summary_only=True)
+        self.assertEqual(summary.UID, full.UID)
+        self.assertEqual((summary.StartTime, summary.EndTime), (full.StartTime, full.EndTime))
+        self.assertEqual([(x.StartTime, x.EndTime) for x in summary.Laps], [(x.StartTime, x.EndTime) for x in full.Laps])
+        self.assertEqual(summary.CountTotalWaypoints(), 1)
+        self.assertEqual(summary.GetFirstWaypointWithLocation().Latitude, full.GetFirstWaypointWithLocation().Latitude)
+
+    def test_parse_invalid(self):
+        ''' files without a track, or with empty segments, are still rejected '''
+        self.assertRaises(ValueError, GPXIO.Parse, b'<gpx xmlns="http://www.topografix.com/GPX/1/1"><metadata/></gpx>')
+        self.assertRaises(ValueError, GPXIO.Parse, b'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg/></trk></gpx>')
@@ -0,0 +1,134 @@
+from tapiriik.testing.testtools import TestTools, TapiriikTestCase
+
+from tapiriik.services.ratelimiting import RateLimit, RateLimitExceededException, _LocalWindows
+from tapiriik.sync.budget import ApiBudget
+from tapiriik.database import db
+
+from datetime import datetime, timedelta
+import random
+import time
+
+
+class RateLimitTests(TapiriikTestCase):
+
+    def setUp(self):
+        self._backend = RateLimit.Backend
+        RateLimit.Backend = _LocalWindows()
+
+    def tearDown(self):
+        RateLimit.Backend = self._backend
+
+    def test_limit_exhaustion(self):
+        ''' Limit allows a full window's worth of requests, then refuses without waiting '''
+        limits = [(timedelta(hours=1), 5)]
+        for x in range(5):
+            RateLimit.Limit("test", limits)
+        start = time.time()
+        self.assertRaises(RateLimitExceededException, RateLimit.Limit, "test", limits)
+        self.assertTrue(time.time() - start < 0.1)
+        # Other keys have their own logs
+        RateLimit.Limit("other", limits)
+
+    def test_limit_all_windows(self):
+        ''' the tightest of several limits applies, and a refused request doesn't use up the others '''
+        limits = [(timedelta(hours=1), 2), (timedelta(days=1), 10)]
+        RateLimit.Limit("test", limits)
+        RateLimit.Limit("test", limits)
+        self.assertRaises(RateLimitExceededException, RateLimit.Limit, "test", limits)
+        RateLimit.Limit("test", [(timedelta(days=1), 10)])
+
+    def test_acquire_waits(self):
+        ''' Acquire waits for a token when one is due before the timeout '''
+        limits = [(timedelta(seconds=0.2), 1)]
+        RateLimit.Acquire("test", limits)
+        start = time.time()
+        RateLimit.Acquire("test", limits, timeout=1)
+        self.assertTrue(time.time() - start >= 0.15)
+        self.assertRaises(RateLimitExceededException, RateLimit.Acquire, "test", limits, timeout=0.05)
+
+    def test_wait(self):
+        ''' Wait reports when there'll be room for a number of requests, without using any up '''
+        limits = [(timedelta(seconds=100), 10)]
+        self.assertEqual(RateLimit.Wait("test", limits, count=10), 0)
+        for x in range(5):
+            RateLimit.Limit("test", limits)
+        self.assertEqual(RateLimit.Wait("test", limits), 0)
+        # Not until the first five have aged out of the window
+        self.assertAlmostEqual(RateLimit.Wait("test", limits, count=10), 100, delta=1)
+        # More than the limit would ever allow at once
+        self.assertAlmostEqual(RateLimit.Wait("test", limits, count=20), 100, delta=1)
+        self.assertEqual(RateLimit.Wait("test", []), 0)
+
+    def test_limit_sliding_window(self):
+        ''' no timespan-long stretch ever gets more than max-count requests, however they're spread out - while a steady stream still gets the full allowance '''
+        clock = [0]
+        RateLimit.Backend = _LocalWindows(clock=lambda: clock[0])
+        limits = [(timedelta(seconds=100), 10)]
+        admitted = []
+        # Trying every couple of seconds for a few windows' worth, starting off with a burst
+        for attempt in list(range(10)) + list(range(10, 400, 2)):
+            clock[0] = attempt
+            try:
+                RateLimit.Limit("test", limits)
+            except RateLimitExceededException:
+                continue
+            admitted.append(attempt)
+        for start in range(400):
+            self.assertTrue(len([x for x in admitted if start <= x < start + 100]) <= 10)
+        # ...a burst's worth as each one ages out
+        self.assertEqual(len(admitted), 40)
+        self.assertEqual(RateLimit.Wait("test", limits), admitted[-10] + 100 - clock[0])
+
+    def test_aligned_reset(self):
+        ''' services whose provider resets its windows at fixed times aren't retried before the next reset, even if it wasn't our count that ran out '''
+        svc, _ = TestTools.create_mock_services()
+        svc.GlobalRateLimits = [(timedelta(minutes=15), 2), (timedelta(days=1), 100)]
+        self.assertEqual(svc.GlobalRateLimitReset(), 0)
+        svc.GlobalRateLimitsAligned = True
+        try:
+            wait = svc.GlobalRateLimitReset()
+            self.assertTrue(0 < wait <= 900)
+            self.assertAlmostEqual((time.time() + wait) % 900, 0, delta=1)
+            # Our own count still has the last word, when it's what ran out
+            RateLimit.Limit(svc.ID, svc.GlobalRateLimits)
+            RateLimit.Limit(svc.ID, svc.GlobalRateLimits)
+            self.assertAlmostEqual(svc.GlobalRateLimitReset(), 900, delta=1)
+        finally:
+            del svc.GlobalRateLimits
+            del svc.GlobalRateLimitsAligned
+
+    def test_budget_forecast(self):
+        ''' the forecast counts users due within the hour per service, and any of the hour's syncs it leaves spare can go out straight away '''
+        now = datetime.utcnow()
+        marker = "forecast-%d" % random.randint(1, 100000)
+        db.users.insert({"Marker": marker, "NextSynchronization": now - timedelta(minutes=5), "ConnectedServices": [{"Service": "forecast-a"}, {"Service": "forecast-b"}]})
+        db.users.insert({"Marker": marker, "NextSynchronization": now + timedelta(minutes=30), "ConnectedServices": [{"Service": "forecast-a"}]})
+        db.users.insert({"Marker": marker, "NextSynchronization": now + timedelta(hours=3), "ConnectedServices": [{"Service": "forecast-a"}]})
+        db.users.insert({"Marker": marker, "NextSynchronization": now, "QueuedAt": now, "ConnectedServices": [{"Service": "forecast-b"}]})
+        try:
+            services = [type("ForecastService", (), {"ID": x})() for x in ("forecast-a", "forecast-b", "forecast-c")]
+            self.assertEqual(ApiBudget.Forecast(services), {"forecast-a": 2, "forecast-b": 1})
+        finally:
+            db.users.remove({"Marker": marker})
+
+        # Fully booked, so 5 minutes' worth at a time
+        self.assertEqual(ApiBudget.DispatchLimits(120, 500), [(timedelta(minutes=5), 10)])
+        # 90 of the 120 spare - same rate, but they needn't wait
+        self.assertEqual(ApiBudget.DispatchLimits(120, 30), [(timedelta(minutes=45), 90)])
+
+    def test_budget_pacing(self):
+        ''' periodic syncs are let out at the budgeted pace and the rest staggered, while other lanes and services go straight through '''
+        budget = ApiBudget()
+        budget._dispatchLimits = {"paced": [(timedelta(minutes=10), 2)]}
+        users = [{"_id": x, "ConnectedServices": [{"Service": "paced"}, {"Service": "other"}]} for x in range(5)]
+        users.append({"_id": 5, "ConnectedServices": [{"Service": "paced"}], "NextSyncLane": "triggered"})
+        users.append({"_id": 6, "ConnectedServices": [{"Service": "other"}]})
+
+        dispatch, deferred = budget.Pace(users)
+        self.assertEqual([x["_id"] for x in dispatch], [0, 1, 5, 6])
+        self.assertEqual([x[0]["_id"] for x in deferred], [2, 3, 4])
+        # Once the first two have aged out of the 10 minutes, one every 5 minutes from there on
+        resume_times = [x[1] for x in deferred]
+        self.assertAlmostEqual((resume_times[1] - resume_times[0]).total_seconds(), 300, delta=1)
+        self.assertAlmostEqual((resume_times[2] - resume_times[1]).total_seconds(), 300, delta=1)
+        self.assertTrue(timedelta(minutes=9) < resume_times[0] - datetime.utcnow() <= timedelta(minutes=10))
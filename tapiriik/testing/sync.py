@@ -1,15 +1,27 @@
 from tapiriik.testing.testtools import TestTools, TapiriikTestCase
 
-from tapiriik.sync import SynchronizationTask
+from tapiriik.sync import Sync, SynchronizationTask, SyncStep
+from tapiriik.sync.progress import SyncProgressReporter
 from tapiriik.sync.activity_record import ActivityRecord
+from tapiriik.sync.activity_matcher import ActivityMatcher
+from tapiriik.sync.write_buffer import WriteBehindBuffer
+from tapiriik.sync.lanes import LaneSelector
 from tapiriik.services import UserException, UserExceptionType
 from tapiriik.services.api import APIExcludeActivity
 from tapiriik.services.interchange import Activity, ActivityType
 from tapiriik.auth import User
+from tapiriik.database import db
+from pymongo.errors import AutoReconnect
 
 from datetime import datetime, timedelta, tzinfo
+from collections import deque
 import pytz
 import copy
+import bisect
+import random
+import time
+import logging
+import threading
 
 
 class UTC(tzinfo):
@@ -256,6 +268,221 @@ class SyncTests(TapiriikTestCase):
         s._syncExclusions = {}
         self.assertRaises(ValueError, s._accumulateExclusions, recA, [exc4])
 
+    def test_concurrent_listing_order(self):
+        ''' ensure that activity lists retrieved concurrently are still merged in connection order '''
+        svcA, svcB = TestTools.create_mock_services()
+        recA = TestTools.create_mock_svc_record(svcA)
+        recB = TestTools.create_mock_svc_record(svcB)
+
+        actA = Activity()
+        actA.StartTime = datetime(1, 2, 3, 4, 5, 6, 7)
+        actA.Name = "From A"
+        actA.ServiceDataCollection = TestTools.create_mock_servicedatacollection(svcA, record=recA)
+        actB = Activity()
+        actB.StartTime = actA.StartTime
+        actB.Name = "From B"
+        actB.ServiceDataCollection = TestTools.create_mock_servicedatacollection(svcB, record=recB)
+        actA.CalculateUID()
+        actB.CalculateUID()
+
+        def slowListing(conn, exhaustive):
+            time.sleep(0.25)  # So B finishes first
+            return [actA], []
+        svcA.DownloadActivityList = slowListing
+        svcB.DownloadActivityList = lambda conn, exhaustive: ([actB], [])
+
+        s = SynchronizationTask(None)
+        s.user = TestTools.create_mock_user()
+        s._activities = []
+        s._excludedServices = {}
+        s._syncErrors = {recA._id: [], recB._id: []}
+        s._syncExclusions = {recA._id: {}, recB._id: {}}
+        s._hasTransientSyncErrors = {recA._id: False, recB._id: False}
+
+        s._downloadActivityLists([recA, recB], False)
+
+        self.assertEqual(len(s._activities), 1)
+        self.assertEqual(s._activities[0].Name, "From A")
+        self.assertTrue(recA._id in s._activities[0].ServiceDataCollection)
+        self.assertTrue(recB._id in s._activities[0].ServiceDataCollection)
+
+    def test_upload_pipeline_excluded_destination(self):
+        ''' ensure that queued uploads aren't attempted to a destination that became excluded in the meantime '''
+        svcA, svcB = TestTools.create_mock_services()
+        recA = TestTools.create_mock_svc_record(svcA)
+        recB = TestTools.create_mock_svc_record(svcB)
+
+        act = TestTools.create_blank_activity(svcA, record=recA)
+        act.Record = ActivityRecord()
+        uploads = []
+        svcB.UploadActivity = lambda conn, activity: uploads.append(activity)
+
+        s = SynchronizationTask(None)
+        s._excludedServices = {}
+        s._initializeUploadPipeline()
+        s._excludeService(recB, UserException(UserExceptionType.Other))
+        s._queueActivityUploads(act, act, svcA, [recB])
+        s._drainUploadPipeline()
+        s._shutdownUploadPipeline()
+
+        self.assertEqual(len(uploads), 0)
+        self.assertTrue(svcB.ID in act.Record.NotPresentOnServices)
+        self.assertEqual(act.Record.NotPresentOnServices[svcB.ID].UserException.Type, UserExceptionType.Other)
+
+    def test_activity_matcher_equivalence(self):
+        ''' ensure that the bucketed duplicate matcher finds the same activities as checking everything in the window would '''
+        svcA, svcB = TestTools.create_mock_services()
+        records, lists = TestTools.create_synthetic_activity_lists([svcA, svcB], 1000, seed=42)
+
+        activities = []
+        matcher = ActivityMatcher()
+        matches = 0
+        for act in lists[0] + lists[1]:
+            # self._activities is sorted most recent first - the first in the window to qualify wins
+            lo = bisect.bisect_left(activities, act.StartTime + ActivityMatcher.TimezoneErrorPeriod)
+            hi = bisect.bisect_right(activities, act.StartTime - ActivityMatcher.TimezoneErrorPeriod, lo=lo)
+            expected = next((x for x in activities[lo:hi] if ActivityMatcher.IsSameActivity(x, act)), None)
+            self.assertIs(matcher.FindMatch(act), expected)
+            if expected:
+                matches += 1
+            else:
+                bisect.insort_left(activities, act)
+                matcher.Add(act)
+
+        self.assertTrue(matches > 0)
+
+    def test_activity_record_incremental_writeback(self):
+        ''' ensure that only the activity records touched during the sync are written back, and new ones are added in order '''
+        svcA, svcB = TestTools.create_mock_services()
+        user = TestTools.create_mock_user()
+
+        actOld = TestTools.create_blank_activity(svcA)
+        actOld.StartTime = datetime(2010, 1, 1)
+        actOld.CalculateUID()
+        actOld.UIDs = set([actOld.UID])
+        actTouched = TestTools.create_blank_activity(svcA)
+        actTouched.StartTime = datetime(2011, 1, 1)
+        actTouched.CalculateUID()
+        actTouched.UIDs = set([actTouched.UID])
+        actNew = TestTools.create_blank_activity(svcA)
+        actNew.StartTime = datetime(2012, 1, 1)
+        actNew.CalculateUID()
+        actNew.UIDs = set([actNew.UID])
+
+        s = SynchronizationTask(user)
+        s._initializeActivityRecords()
+        s._findOrCreateActivityRecord(actTouched)
+        s._findOrCreateActivityRecord(actOld)
+        s._writeBackActivityRecords()
+
+        s = SynchronizationTask(user)
+        s._initializeActivityRecords()
+        self.assertEqual(len(s._activityRecords), 2)
+        self.assertIs(s._findOrCreateActivityRecord(actTouched), s._activityRecords[0])
+        s._activityRecords[0].Name = "Touched"
+        s._activityRecords[1].Name = "Not touched"
+        s._findOrCreateActivityRecord(actNew)
+        s._writeBackActivityRecords()
+
+        stored = db.activity_records.find_one({"UserID": user["_id"]})["Activities"]
+        self.assertEqual([x["UIDs"] for x in stored], [[actNew.UID], [actTouched.UID], [actOld.UID]])
+        self.assertEqual(stored[1]["Name"], "Touched")
+        self.assertEqual(stored[2]["Name"], None)
+
+    def test_write_buffer_checkpoints(self):
+        ''' ensure that buffered bookkeeping writes are only stored (and announced) once a checkpoint flushes them '''
+        buffer = WriteBehindBuffer(checkpoint_interval=2)
+        flushed = []
+        marker = str(random.randint(1, 100000))
+
+        buffer.Insert(db.sync_stats, {"Marker": marker, "Count": 0})
+        buffer.Update(db.sync_stats, {"Marker": marker}, {"$inc": {"Count": 1}})
+        buffer.AfterFlush(lambda: flushed.append(db.sync_stats.find_one({"Marker": marker})["Count"]))
+        buffer.Checkpoint()
+
+        self.assertEqual(db.sync_stats.find({"Marker": marker}).count(), 0)
+        self.assertEqual(len(flushed), 0)
+
+        buffer.Checkpoint()
+
+        self.assertEqual(buffer.PendingCount(), 0)
+        self.assertEqual(flushed, [1])
+
+    def test_write_buffer_failure(self):
+        ''' ensure that writes which fail stay buffered (and unannounced) for the next flush, while those that went through aren't repeated '''
+        class FlakyCollection:
+            def __init__(self, full_name, failures):
+                self.full_name = full_name
+                self.failures = failures
+                self.written = []
+
+            def bulk_write(self, operations, ordered=True):
+                if self.failures:
+                    self.failures -= 1
+                    raise AutoReconnect("Gone")
+                self.written += operations
+
+        good = FlakyCollection("tapiriik.good", 0)
+        flaky = FlakyCollection("tapiriik.flaky", 1)
+        buffer = WriteBehindBuffer()
+        flushed = []
+        buffer.Insert(good, {"Good": 1})
+        buffer.Insert(flaky, {"Flaky": 1})
+        buffer.AfterFlush(lambda: flushed.append(True))
+
+        self.assertRaises(AutoReconnect, buffer.Flush)
+        self.assertEqual(len(good.written), 1)
+        self.assertEqual(buffer.PendingCount(), 1)
+        self.assertEqual(flushed, [])
+
+        buffer.Flush()
+        self.assertEqual(len(good.written), 1)
+        self.assertEqual(len(flaky.written), 1)
+        self.assertEqual(buffer.PendingCount(), 0)
+        self.assertEqual(flushed, [True])
+
+    def test_progress_coalescing(self):
+        ''' ensure that heartbeats and progress are only written once per interval, but changes of step go out immediately '''
+        user = TestTools.create_mock_user()
+        db.users.insert(user)
+        heartbeats = []
+        reporter = SyncProgressReporter(user, heartbeat_callback=heartbeats.append, interval=timedelta(hours=1))
+
+        reporter.Heartbeat(SyncStep.List)
+        reporter.Heartbeat(SyncStep.List)
+        reporter.Heartbeat(SyncStep.Download)
+        reporter.Heartbeat(SyncStep.Download)
+        self.assertEqual(heartbeats, [SyncStep.List, SyncStep.Download])
+
+        reporter.Progress(SyncStep.Download, 0.1)
+        reporter.Progress(SyncStep.Download, 0.2)
+        self.assertEqual(db.users.find_one({"_id": user["_id"]})["SynchronizationProgress"], 0.1)
+        reporter.Flush()
+        self.assertEqual(db.users.find_one({"_id": user["_id"]})["SynchronizationProgress"], 0.2)
+
+    def test_activity_windows(self):
+        ''' ensure that windowed processing visits every activity in order, and lets go of each window once it's done '''
+        svcA, svcB = TestTools.create_mock_services()
+        activities = []
+        for day in range(200):
+            act = TestTools.create_blank_activity(svcA)
+            act.StartTime = datetime(2014, 1, 1) - timedelta(days=day)
+            activities.append(act)
+
+        s = SynchronizationTask(None)
+        s._activities = list(activities)
+        s._initializeUploadPipeline()
+        visited = []
+        heldCounts = set()
+        for act in s._iterateActivityWindows(True):
+            self.assertIn(act, s._activities)
+            heldCounts.add(len(s._activities))
+            visited.append(act)
+
+        self.assertEqual(visited, activities)
+        self.assertTrue(len(heldCounts) > 1) # i.e. earlier windows were let go of
+        self.assertEqual(len(s._activities), 0)
+
     def test_activity_deduplicate_normaltz(self):
         ''' ensure that we can't deduplicate activities with non-pytz timezones '''
         svcA, svcB = TestTools.create_mock_services()
@@ -604,3 +831,207 @@ class SyncTests(TapiriikTestCase):
         eligible = s._determineEligibleRecipientServices(act, recipientServices)
         self.assertTrue(recA in eligible)
         self.assertTrue(recB in eligible)
+
+    def test_user_log_isolation(self):
+        ''' concurrent syncs only log their own messages, including those from their worker threads '''
+        from tapiriik.sync.sync import _UserLogFilter, _logContext
+        test_logger = logging.getLogger("tapiriik.testing.isolation")
+        test_logger.setLevel(logging.DEBUG)
+
+        class CollectingHandler(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.messages = []
+
+            def emit(self, record):
+                self.messages.append(record.getMessage())
+
+        tasks = [SynchronizationTask(None) for x in range(2)]
+        handlers = []
+        for task in tasks:
+            handler = CollectingHandler()
+            handler.addFilter(_UserLogFilter(task))
+            test_logger.addHandler(handler)
+            handlers.append(handler)
+
+        def sync(task, name):
+            _logContext.task = task
+            test_logger.info("%s main" % name)
+            child = threading.Thread(target=task._inLogContext(lambda: test_logger.info("%s child" % name)))
+            child.start()
+            child.join()
+            _logContext.task = None
+
+        try:
+            threads = [threading.Thread(target=sync, args=(task, "task%d" % idx)) for idx, task in enumerate(tasks)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            test_logger.info("no task")
+        finally:
+            for handler in handlers:
+                test_logger.removeHandler(handler)
+
+        self.assertEqual(sorted(handlers[0].messages), ["task0 child", "task0 main"])
+        self.assertEqual(sorted(handlers[1].messages), ["task1 child", "task1 main"])
+
+    def test_sync_trace(self):
+        ''' spans are attributed to the service/activity they're nested in, and to their own sync even from its worker threads '''
+        from tapiriik.services.tracing import SyncTrace
+        tasks = [SynchronizationTask(None) for x in range(2)]
+
+        @SyncTrace.Traced("parse")
+        def parse():
+            SyncTrace.Count("http.requests")
+
+        def sync(task, service):
+            task._trace.Activate()
+            with SyncTrace.Span("download", service=service, activity="abc"):
+                parse()
+            child = threading.Thread(target=task._inLogContext(parse))
+            child.start()
+            child.join()
+            SyncTrace.Deactivate()
+
+        threads = [threading.Thread(target=sync, args=(task, "svc%d" % idx)) for idx, task in enumerate(tasks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        parse() # Outside any sync, so nowhere to go
+
+        for idx, task in enumerate(tasks):
+            totals = task._trace.Totals()
+            self.assertEqual(set(totals.keys()), set([("download", "svc%d" % idx), ("parse", "svc%d" % idx), ("parse", None)]))
+            self.assertEqual(totals[("parse", "svc%d" % idx)][0], 1)
+            self.assertEqual(task._trace.Counters["http.requests"], 2)
+            self.assertTrue(all(x[2] == "abc" for x in task._trace.Spans if x[1]))
+
+    def test_prerender_cache(self):
+        ''' each format is rendered once for all the destinations wanting it, let go after the last, and evicted past the memory budget '''
+        from tapiriik.sync.prerender import PrerenderCache
+        renders = []
+        def render(activity):
+            renders.append(activity)
+            return bytes(1000)
+        original_renderers, original_budget = PrerenderCache.Renderers, PrerenderCache.MemoryBudget
+        PrerenderCache.Renderers = {"fit": render, "tcx": render}
+        try:
+            actA, actB = Activity(), Activity()
+            cacheA = PrerenderCache(actA, [["fit"], ["fit", "tcx"], ["pwx"]])
+            self.assertIn("fit", cacheA)
+            self.assertNotIn("pwx", cacheA)
+            self.assertRaises(KeyError, lambda: cacheA["gpx"])
+
+            baseline = PrerenderCache.RetainedSize()
+            first = cacheA["fit"]
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline + 1000)
+            self.assertIs(cacheA["fit"], first)
+            self.assertEqual(len(renders), 1)
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline) # Nobody else wants it
+            cacheA["tcx"]
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline)
+
+            PrerenderCache.MemoryBudget = baseline + 1500
+            cacheA = PrerenderCache(actA, [["fit"], ["fit"]])
+            cacheB = PrerenderCache(actB, [["fit"], ["fit"]])
+            cacheA["fit"]
+            cacheB["fit"] # Pushes out A's
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline + 1000)
+            del renders[:]
+            cacheA["fit"]
+            cacheB["fit"]
+            self.assertEqual(renders, [actA])
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline)
+
+            cacheA = PrerenderCache(actA, [["fit"], ["fit"]])
+            cacheA["fit"]
+            cacheA.Release() # The second destination never got to it
+            self.assertEqual(PrerenderCache.RetainedSize(), baseline)
+        finally:
+            PrerenderCache.Renderers, PrerenderCache.MemoryBudget = original_renderers, original_budget
+
+    def test_lane_selector_weights(self):
+        ''' busy lanes are served in proportion to their weights, and empty lanes don't hold up the rest '''
+        weights = {"immediate": 8, "triggered": 4, "periodic": 2, "exhaustive": 1}
+        selector = LaneSelector(weights)
+        served = dict((lane, 0) for lane in weights)
+        for x in range(15 * 10):
+            lane = selector.Order()[0]
+            selector.Served(lane)
+            served[lane] += 1
+        self.assertEqual(served, dict((lane, weight * 10) for lane, weight in weights.items()))
+
+        # Only periodic and exhaustive have anyone waiting
+        served = dict((lane, 0) for lane in weights)
+        for x in range(3 * 10):
+            order = selector.Order()
+            lane = next(lane for lane in order if lane in ("periodic", "exhaustive"))
+            selector.Served(lane, order[:order.index(lane)])
+            served[lane] += 1
+        self.assertEqual(served, {"immediate": 0, "triggered": 0, "periodic": 20, "exhaustive": 10})
+
+        # ...and the others haven't banked that time for later
+        self.assertEqual(selector.Order()[0], "immediate")
+        selector.Served("immediate")
+        self.assertEqual(selector.Order()[0], "triggered")
+
+    def test_lane_delivery_pick(self):
+        ''' of the users pushed to a worker, host-restricted ones go first, then the lanes by weight - and the rest are handed back '''
+        class MockMessage:
+            def __init__(self, name):
+                self.name = name
+                self.requeued = False
+
+            def requeue(self):
+                self.requeued = True
+
+        original = (getattr(Sync, "_deliveries", None), getattr(Sync, "_lane_selector", None))
+        try:
+            Sync._lane_selector = LaneSelector({"immediate": 8, "triggered": 4, "periodic": 2, "exhaustive": 1})
+            Sync._deliveries = dict((lane, deque()) for lane in ["host", "immediate", "triggered", "periodic", "exhaustive"])
+            periodic, exhaustive, host = MockMessage("periodic"), MockMessage("exhaustive"), MockMessage("host")
+            Sync._deliveries["periodic"].append(periodic)
+            Sync._deliveries["exhaustive"].append(exhaustive)
+            self.assertEqual(Sync._pickDelivery(), periodic)
+            Sync._deliveries["host"].append(host)
+            self.assertEqual(Sync._pickDelivery(), host)
+            Sync._requeueDeliveries()
+            self.assertTrue(exhaustive.requeued)
+            self.assertFalse(periodic.requeued)
+            self.assertEqual(Sync._pickDelivery(), None)
+        finally:
+            Sync._deliveries, Sync._lane_selector = original
+
+    def test_periodic_sync_interval_backoff(self):
+        ''' quiet users are synced less often, within what their services allow '''
+        user = {"ConnectedServices": [{"Service": "strava"}, {"Service": "dropbox"}]}
+        self.assertEqual(Sync.PeriodicSyncInterval(user, 0), Sync.SyncInterval)
+        self.assertEqual(Sync.PeriodicSyncInterval(user, Sync.IdleSyncsBeforeBackoff - 1), Sync.SyncInterval)
+        self.assertEqual(Sync.PeriodicSyncInterval(user, Sync.IdleSyncsBeforeBackoff), Sync.SyncInterval * 2)
+        self.assertEqual(Sync.PeriodicSyncInterval(user, Sync.IdleSyncsBeforeBackoff * 100), Sync.MaximumSyncInterval)
+
+        # Both tell us when there's something new
+        user = {"ConnectedServices": [{"Service": "strava"}, {"Service": "endomondo"}]}
+        self.assertEqual(Sync.PeriodicSyncInterval(user, Sync.IdleSyncsBeforeBackoff * 100), timedelta(hours=24))
+
+        # Outstanding errors get retried at the usual pace
+        user["NonblockingSyncErrorCount"] = 1
+        self.assertEqual(Sync.PeriodicSyncInterval(user, Sync.IdleSyncsBeforeBackoff * 100), Sync.SyncInterval)
+
+    def test_rate_limited_service_deferral(self):
+        ''' rate limited services sit out the rest of the sync, without losing their trigger '''
+        svcA, svcB = TestTools.create_mock_services()
+        recA = TestTools.create_mock_svc_record(svcA)
+        s = SynchronizationTask(None)
+        s._excludedServices = {}
+        s._persistTriggerServices = {}
+        s._rateLimitResumeTimes = []
+
+        s._deferRateLimitedService(recA, wait=600)
+        self.assertTrue(s._isServiceExcluded(recA))
+        self.assertEqual(s._getServiceExclusionUserException(recA).Type, UserExceptionType.RateLimited)
+        self.assertTrue(s._shouldPersistServiceTrigger(recA))
+        self.assertEqual(len(s._rateLimitResumeTimes), 1)
+        self.assertTrue(timedelta(seconds=590) < s._rateLimitResumeTimes[0] - datetime.utcnow() <= timedelta(seconds=600))
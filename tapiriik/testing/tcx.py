@@ -0,0 +1,86 @@
+from tapiriik.testing.testtools import TapiriikTestCase
+from tapiriik.services.tcx import TCXIO
+from tapiriik.services.timestamps import parse_timestamp
+from tapiriik.services.interchange import ActivityType, ActivityStatisticUnit, WaypointType
+
+from datetime import datetime
+import dateutil.parser
+import pytz
+
+_tcx = '''<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2" xmlns:tpx="http://www.garmin.com/xmlschemas/ActivityExtension/v2">
+  <Activities>
+    <Activity Sport="Biking">
+      <Id>2014-03-21T09:15:00Z</Id>
+      <Lap StartTime="2014-03-21T09:15:00Z">
+        <TotalTimeSeconds>120</TotalTimeSeconds>
+        <DistanceMeters>500</DistanceMeters>
+        <Track>
+          <Trackpoint><Time>2014-03-21T09:15:00Z</Time><HeartRateBpm><Value>120</Value></HeartRateBpm></Trackpoint>
+          <Trackpoint><Time>2014-03-21T09:15:30Z</Time><Position><LatitudeDegrees>45.5</LatitudeDegrees><LongitudeDegrees>-73.5</LongitudeDegrees></Position><AltitudeMeters>20</AltitudeMeters></Trackpoint>
+          <Trackpoint><Time>2014-03-21T09:16:55.500Z</Time><Position><LatitudeDegrees>45.6</LatitudeDegrees><LongitudeDegrees>-73.6</LongitudeDegrees></Position><Extensions><tpx:TPX><tpx:Watts>250</tpx:Watts></tpx:TPX></Extensions></Trackpoint>
+        </Track>
+      </Lap>
+      <Lap StartTime="2014-03-21T09:17:00Z">
+        <TotalTimeSeconds>60</TotalTimeSeconds>
+        <DistanceMeters>250</DistanceMeters>
+        <Track>
+          <Trackpoint><Time>2014-03-21T09:17:00Z</Time><Position><LatitudeDegrees>45.7</LatitudeDegrees><LongitudeDegrees>-73.7</LongitudeDegrees></Position></Trackpoint>
+          <Trackpoint><Time>2014-03-21T09:17:50Z</Time><Cadence>90</Cadence></Trackpoint>
+        </Track>
+      </Lap>
+      <Notes>Morning ride
+with notes</Notes>
+    </Activity>
+  </Activities>
+  <Author><Name>tapiriik</Name></Author>
+</TrainingCenterDatabase>'''
+
+
+class TCXTests(TapiriikTestCase):
+    def test_parse(self):
+        ''' the streaming parser picks up laps, waypoints and the activity's details '''
+        act = TCXIO.Parse(_tcx.encode("UTF-8"))
+        self.assertEqual(act.Type, ActivityType.Cycling)
+        self.assertEqual(act.Name, "Morning ride")
+        self.assertEqual(act.Notes, "with notes")
+        self.assertTrue(act.OriginatedFromTapiriik)
+        self.assertTrue(act.GPS)
+        self.assertFalse(act.Stationary)
+        self.assertEqual(len(act.Laps), 2)
+        self.assertEqual([len(x.Waypoints) for x in act.Laps], [3, 2])
+        self.assertEqual(act.StartTime, datetime(2014, 3, 21, 9, 15, tzinfo=pytz.utc))
+        self.assertEqual(act.EndTime, datetime(2014, 3, 21, 9, 17, 50, tzinfo=pytz.utc))
+        self.assertEqual(act.Laps[0].EndTime, datetime(2014, 3, 21, 9, 16, 55, 500000, tzinfo=pytz.utc))
+        self.assertEqual(act.Stats.Distance.asUnits(ActivityStatisticUnit.Meters).Value, 750)
+        wps = act.GetFlatWaypoints()
+        self.assertEqual(wps[0].Type, WaypointType.Start)
+        self.assertEqual(wps[-1].Type, WaypointType.End)
+        self.assertEqual(wps[0].HR, 120)
+        self.assertIsNone(wps[0].Location)
+        self.assertEqual((wps[1].Location.Latitude, wps[1].Location.Longitude, wps[1].Location.Altitude), (45.5, -73.5, 20))
+        self.assertEqual(wps[2].Power, 250)
+        self.assertEqual(wps[4].Cadence, 90)
+
+    def test_parse_summary_only(self):
+        ''' summary_only gives the same times and stats, keeping only the waypoints needed to find the TZ '''
+        full = TCXIO.Parse(_tcx.encode("UTF-8"))
+        act = TCXIO.Parse(_tcx.encode("UTF-8"), summary_only=True)
+        self.assertEqual(act.UID, full.UID)
+        self.assertEqual((act.StartTime, act.EndTime), (full.StartTime, full.EndTime))
+        self.assertEqual([(x.StartTime, x.EndTime) for x in act.Laps], [(x.StartTime, x.EndTime) for x in full.Laps])
+        self.assertEqual(act.Stats.Distance, full.Stats.Distance)
+        self.assertFalse(act.Stationary)
+        self.assertTrue(act.GPS)
+        self.assertEqual(act.CountTotalWaypoints(), 2)
+        self.assertEqual(act.GetFirstWaypointWithLocation().Latitude, 45.5)
+
+    def test_parse_no_activity(self):
+        ''' files without an activity are still rejected '''
+        self.assertRaises(ValueError, TCXIO.Parse, b'<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"><Activities/></TrainingCenterDatabase>')
+
+    def test_timestamps(self):
+        ''' the fast path agrees with dateutil '''
+        for text in ["2014-03-21T09:15:02Z", "2014-03-21T09:15:02.25Z", "2014-03-21T09:15:02.1234567Z", "2014-03-21T09:15:02+01:00", "2014-03-21T09:15:02-0330", "2014-03-21T09:15:02", "2014-03-21 09:15:02Z", "21 March 2014 09:15"]:
+            self.assertEqual(parse_timestamp(text), dateutil.parser.parse(text))
+            self.assertEqual(parse_timestamp(text).utcoffset(), dateutil.parser.parse(text).utcoffset())
@@ -165,6 +165,39 @@ class TestTools:
 
         return act
 
+    def create_synthetic_activity_lists(svcs, count, seed=None):
+        ''' creates per-service activity listings (waypoint-less) of roughly count activities each, with the sort of overlap and TZ inconsistencies real accounts have '''
+        rng = random.Random(seed)
+        zones = [pytz.timezone(x) for x in ["America/Denver", "America/St_Johns", "Europe/London", "Asia/Kolkata", "Pacific/Auckland"]]
+        types = [ActivityType.Running, ActivityType.Cycling, ActivityType.MountainBiking, ActivityType.Walking, ActivityType.Swimming, ActivityType.Other]
+        records = [TestTools.create_mock_svc_record(svc) for svc in svcs]
+        lists = [[] for svc in svcs]
+        startTime = datetime(2010, 1, 1, 6)
+        for x in range(count):
+            # A handful a day, sometimes back-to-back
+            startTime += timedelta(minutes=rng.choice([5, 45, 90, 600, 1440]), seconds=rng.randint(0, 59))
+            tz = rng.choice(zones)
+            actType = rng.choice(types)
+            for record, svcList in zip(records, lists):
+                if rng.random() > 0.8:
+                    continue  # Not on this service
+                act = Activity()
+                act.Type = rng.choice([actType, ActivityType.Other])
+                localStart = startTime + timedelta(seconds=rng.randint(-30, 30))
+                style = rng.random()
+                if style < 0.5:
+                    act.StartTime = tz.localize(localStart)
+                    act.TZ = tz
+                elif style < 0.8:
+                    act.StartTime = localStart  # No TZ supplied
+                else:
+                    act.StartTime = pytz.utc.localize(localStart) + timedelta(hours=rng.choice([-5, 1, 7]))  # Wrong hour somewhere along the line
+                act.EndTime = act.StartTime + timedelta(minutes=rng.randint(10, 180))
+                act.ServiceDataCollection = {record._id: TestTools.create_mock_servicedata(record.Service, record=record)}
+                act.CalculateUID()
+                svcList.append(act)
+        return records, lists
+
     def create_mock_service(id):
         mock = MockServiceA()
         mock.ID = id
@@ -1,6 +1,7 @@
 from tapiriik.services import Service
 from tapiriik.auth import User
 from tapiriik.sync import Sync
+from tapiriik.sync.metrics import SyncMetrics
 from tapiriik.settings import SITE_VER, PP_WEBSCR, PP_BUTTON_ID, SOFT_LAUNCH_SERVICES, DISABLED_SERVICES, WITHDRAWN_SERVICES, CELEBRATION_MODES
 from tapiriik.database import db
 from datetime import datetime
@@ -64,7 +65,7 @@ def js_bridge(req):
 
 
 def stats(req):
-    return {"stats": db.stats.find_one()}
+    return {"stats": SyncMetrics.Summary()}
 
 def celebration_mode(req):
     active_config = None
@@ -3,6 +3,9 @@ from django.http import HttpResponse
 from tapiriik.settings import DIAG_AUTH_TOTP_SECRET, DIAG_AUTH_PASSWORD, SITE_VER
 from tapiriik.database import db
 from tapiriik.sync import Sync
+from tapiriik.sync.schedule import SyncSchedule
+from tapiriik.sync.lease import SyncLease
+from tapiriik.sync.metrics import SyncMetrics
 from tapiriik.auth import TOTP, DiagnosticsUser, User
 from bson.objectid import ObjectId
 import hashlib
@@ -25,7 +28,19 @@ def diag_dashboard(req):
 @diag_requireAuth
 def diag_queue_dashboard(req):
     context = {}
-    stats = db.stats.find_one()
+    stats = SyncMetrics.Summary()
+
+    # The last hour's worth of what the workers have reported
+    recent = SyncMetrics.Buckets(datetime.utcnow() - timedelta(hours=1))
+    context["syncDurationPercentiles"] = dict(("p%d" % x, SyncMetrics.Percentile(recent, "sync_duration", x)) for x in (50, 90, 99))
+    context["queueWaitPercentiles"] = dict(("p%d" % x, SyncMetrics.Percentile(recent, "queue_wait", x)) for x in (50, 90, 99))
+    context["stepDurations"] = dict((step, SyncMetrics.Mean(recent, "step.%s" % step)) for step in ("list", "download", "activities", "finalize"))
+    context["queueDepths"] = dict((lane, SyncMetrics.LatestGauge(recent, "queue.%s" % lane)) for lane in Sync.Lanes)
+    for name, metric in (("uploadCounts", "uploads"), ("errorCounts", "errors")):
+        # Whatever services/error types turned up
+        keys = set(key for bucket in recent for key in bucket.get("Metrics", {}).get(metric, {}))
+        context[name] = dict((key, SyncMetrics.Sum(recent, "%s.%s" % (metric, key))) for key in keys)
+    context["activityCount"] = SyncMetrics.Sum(recent, "activities")
 
     stall_timeout = timedelta(minutes=1)
 
@@ -34,6 +49,10 @@ def diag_queue_dashboard(req):
 
     context["lockedSyncUsers"] = list(db.users.find({"SynchronizationWorker": {"$ne": None}}))
     context["lockedSyncRecords"] = len(context["lockedSyncUsers"])
+    # With leases, those without one are the orphans (and they'll be requeued on their own)
+    context["leasesEnabled"] = SyncLease.Enabled()
+    for lockedUser in context["lockedSyncUsers"]:
+        lockedUser["Lease"] = SyncLease.Get(lockedUser["_id"])
     context["queuedUnlockedUsers"] = list(db.users.find({"SynchronizationWorker": {"$exists": False}, "QueuedAt": {"$ne": None}}))
 
     context["userCt"] = db.users.count()
@@ -51,7 +70,7 @@ def diag_queue_dashboard(req):
     context["hostWorkerCount"] = {host:len([1 for x in context["allWorkers"] if x["Host"] == host]) for host in set([x["Host"] for x in context["allWorkers"]])}
 
     # Each worker can be engaged for <= 60*60 seconds in an hour
-    if len(context["allWorkers"]) > 0 and stats:
+    if len(context["allWorkers"]) > 0:
         context["loadFactor"] = stats["TotalSyncTimeUsed"] / (len(context["allWorkers"]) * 60 * 60)
     else:
         context["loadFactor"] = 0
@@ -78,6 +97,7 @@ def diag_queue_dashboard(req):
         delta = True
     if "requeueQueued" in req.POST:
         db.users.update({"QueuedAt": {"$lt": datetime.utcnow()}, "$or": [{"SynchronizationWorker": {"$exists": False}}, {"SynchronizationWorker": None}]}, {"$set": {"NextSynchronization": datetime.utcnow(), "QueuedGeneration": "manual"}, "$unset": {"QueuedAt": True}}, multi=True)
+        SyncSchedule.NotifyMatching({"QueuedGeneration": "manual", "QueuedAt": {"$exists": False}}, datetime.utcnow())
 
     if delta:
         return redirect("diagnostics_queue_dashboard")
@@ -110,11 +130,37 @@ def diag_error(req, error):
 @diag_requireAuth
 def diag_graphs(req):
     context = {}
-    stats_series = list(db.sync_status_stats.find().sort("$natural", -1).limit(24 * 6)) # Last 24 hours (assuming 10 min intervals, monotonic timestamps)
-    for item in stats_series:
-        item["Timestamp"] = item["Timestamp"].strftime("%H:%M")
-        del item["_id"]
+    stats_series = []
+    for bucket in reversed(SyncMetrics.Buckets(datetime.utcnow() - timedelta(hours=24))): # Newest first
+        stats_series.append({
+            "Timestamp": bucket["_id"].strftime("%H:%M"),
+            "SyncQueueHeadTime": SyncMetrics.Mean([bucket], "queue_wait") or 0,
+            "Pending": sum(SyncMetrics.LatestGauge([bucket], "queue.%s" % lane) or 0 for lane in Sync.Lanes),
+            "Syncs": SyncMetrics.Sum([bucket], "sync_duration.count"),
+            "SyncTimeUsed": SyncMetrics.Sum([bucket], "sync_duration.sum"),
+            "SyncCPUUsed": SyncMetrics.Sum([bucket], "cpu_time"),
+            "SyncThrottledTime": SyncMetrics.Sum([bucket], "throttled_time"),
+            "Errors": sum(bucket.get("Metrics", {}).get("errors", {}).values())
+        })
     context["dataSeriesJSON"] = json.dumps(stats_series)
+    # Where the sync workers' time went over the last hour, per the sync traces
+    hour = SyncMetrics.Buckets(datetime.utcnow() - timedelta(hours=1))
+    steps = {}
+    for bucket in hour:
+        for name, spans in bucket.get("Metrics", {}).get("trace", {}).items():
+            if not isinstance(spans, dict):
+                continue
+            # Either the totals for the step itself, or for each service involved in it
+            for service, totals in ([(None, spans)] if "count" in spans else spans.items()):
+                if isinstance(totals, dict) and "count" in totals:
+                    step = steps.setdefault((name, service), {"Step": name, "Service": service, "Count": 0, "Seconds": 0})
+                    step["Count"] += totals["count"]
+                    step["Seconds"] += totals.get("seconds", 0)
+                    step["Mean"] = step["Seconds"] / step["Count"] if step["Count"] else 0
+    context["traceSteps"] = sorted(steps.values(), key=lambda x: -x["Seconds"])
+    context["traceCounters"] = dict((name, SyncMetrics.Sum(hour, "trace.%s" % name)) for name in ["http.requests", "http.bytes_sent", "http.bytes_received", "mongo.round_trips", "mongo.seconds", "dropped_spans", "prerender.renders", "prerender.reuses", "prerender.evictions"])
+    # Forecast vs. actual API usage for the paced services, per hour (per sync_scheduler's ApiBudget)
+    context["apiBudget"] = list(db.api_budget_stats.find({"Hour": {"$gte": datetime.utcnow() - timedelta(hours=24)}}).sort([("Service", 1), ("Hour", -1)]))
     return render(req, "diag/graphs.html", context)
 
 @diag_requireAuth
@@ -149,10 +195,16 @@ def diag_user(req, user):
         Sync.ScheduleImmediateSync(userRec, req.POST["sync"] == "Full")
     elif "unlock" in req.POST:
         db.users.update({"_id": ObjectId(user)}, {"$unset": {"SynchronizationWorker": None}})
+        SyncLease.Release(user)
     elif "lock" in req.POST:
         db.users.update({"_id": ObjectId(user)}, {"$set": {"SynchronizationWorker": 1}})
     elif "requeue" in req.POST:
         db.users.update({"_id": ObjectId(user)}, {"$unset": {"QueuedAt": None}})
+    elif "profile" in req.POST:
+        if req.POST["profile"] == "Profile on":
+            db.users.update({"_id": ObjectId(user)}, {"$set": {"SyncProfile": True}})
+        else:
+            db.users.update({"_id": ObjectId(user)}, {"$unset": {"SyncProfile": None}})
     elif "hostrestrict" in req.POST:
         host = req.POST["host"]
         if host:
@@ -4,6 +4,8 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from tapiriik.auth import User
 from tapiriik.sync import Sync, SynchronizationTask
+from tapiriik.sync.progress import SyncProgressReporter
+from tapiriik.sync.metrics import SyncMetrics
 from tapiriik.database import db
 from tapiriik.services import Service
 from tapiriik.settings import MONGO_FULL_WRITE_CONCERN
@@ -15,7 +17,7 @@ def sync_status(req):
     if not req.user:
         return HttpResponse(status=403)
 
-    stats = db.stats.find_one()
+    stats = SyncMetrics.Summary()
     syncHash = 1  # Just used to refresh the dashboard page, until I get on the Angular bandwagon.
     conns = User.GetConnectionRecordsByUser(req.user)
 
@@ -37,15 +39,17 @@ def sync_status(req):
     if "QueuedAt" in req.user and req.user["QueuedAt"]:
         pendingSyncTime = req.user["QueuedAt"]
 
+    syncProgress, syncStep = SyncProgressReporter.Get(req.user)
+
     sync_status_dict = {"NextSync": (pendingSyncTime.ctime() + " UTC") if pendingSyncTime else None,
                         "LastSync": (req.user["LastSynchronization"].ctime() + " UTC") if "LastSynchronization" in req.user and req.user["LastSynchronization"] is not None else None,
                         "Synchronizing": "SynchronizationWorker" in req.user,
-                        "SynchronizationProgress": req.user["SynchronizationProgress"] if "SynchronizationProgress" in req.user else None,
-                        "SynchronizationStep": req.user["SynchronizationStep"] if "SynchronizationStep" in req.user else None,
+                        "SynchronizationProgress": syncProgress,
+                        "SynchronizationStep": syncStep,
                         "SynchronizationWaitTime": None, # I wish.
                         "Hash": syncHash}
 
-    if stats and "QueueHeadTime" in stats:
+    if stats["QueueHeadTime"]:
         sync_status_dict["SynchronizationWaitTime"] = (stats["QueueHeadTime"] - (datetime.utcnow() - req.user["NextSynchronization"]).total_seconds()) if "NextSynchronization" in req.user and req.user["NextSynchronization"] is not None else None
 
     return HttpResponse(json.dumps(sync_status_dict), content_type="application/json")